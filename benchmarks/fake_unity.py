@@ -0,0 +1,149 @@
+import math
+import time
+import json
+import argparse
+import threading
+import dataclasses
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import chili
+
+
+class FakeUnityComms:
+    """
+    In-process stand-in for peaceful_pie's UnityComms, answering the RPCs HardwareInterface uses.
+    The sub integrates the last commanded velocity so the telemetry actually moves.
+    """
+    def __init__(self, rpc_delay: float = 0.0, combined: bool = True):
+        # Simulated round trip per RPC, 0 measures the bridge's own overhead
+        self.rpc_delay = rpc_delay
+        # False behaves like a game build without getSubState/setSubSetVelAndGetState/setSubState
+        self.combined = combined
+        self.position = [0.0, 0.0, 0.0]
+        self.rotation = [0.0, 0.0, 0.0]
+        self.velocity = [0.0] * 6
+        self.last_update = time.monotonic()
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def _rpc(self) -> None:
+        self.calls += 1
+        if self.rpc_delay:
+            time.sleep(self.rpc_delay)
+        now = time.monotonic()
+        dt = now - self.last_update
+        self.last_update = now
+        for i in range(3):
+            self.position[i] += self.velocity[i] * dt
+            self.rotation[i] = math.fmod(self.rotation[i] + self.velocity[3 + i] * dt, 360.0)
+
+    def _state(self) -> dict:
+        return {
+            "position": dict(zip(("x", "y", "z"), self.position)),
+            "rotation": dict(zip(("roll", "pitch", "yaw"), self.rotation)),
+            "velocity": dict(zip(("x", "y", "z", "roll", "pitch", "yaw"), self.velocity)),
+        }
+
+    def _set_velocity(self, subSetVel) -> None:
+        values = dataclasses.asdict(subSetVel) if dataclasses.is_dataclass(subSetVel) else subSetVel
+        self.velocity = [float(values[k]) for k in ("x", "y", "z", "roll", "pitch", "yaw")]
+
+    @staticmethod
+    def _result(result: dict, ResultClass=None):
+        return chili.init_dataclass(result, ResultClass) if ResultClass is not None else result
+
+    def _require_combined(self, method: str) -> None:
+        if not self.combined:
+            from peaceful_pie.unity_comms import CSException
+            raise CSException(f"Method not found: {method}")
+
+    def getSubPos(self, ResultClass=None):
+        self._rpc()
+        return self._result(self._state()["position"], ResultClass)
+
+    def getSubRot(self, ResultClass=None):
+        self._rpc()
+        return self._result(self._state()["rotation"], ResultClass)
+
+    def getSubMeasuredVel(self, ResultClass=None):
+        self._rpc()
+        return self._result(self._state()["velocity"], ResultClass)
+
+    def setSubSetVel(self, subSetVel=None):
+        self._rpc()
+        self._set_velocity(subSetVel)
+
+    def getSubState(self, ResultClass=None):
+        self._require_combined("getSubState")
+        self._rpc()
+        return self._result(self._state(), ResultClass)
+
+    def setSubSetVelAndGetState(self, subSetVel=None, ResultClass=None):
+        self._require_combined("setSubSetVelAndGetState")
+        self._rpc()
+        self._set_velocity(subSetVel)
+        return self._result(self._state(), ResultClass)
+
+    def setSubState(self, state=None):
+        self._require_combined("setSubState")
+        self._rpc()
+        values = dataclasses.asdict(state) if dataclasses.is_dataclass(state) else state
+        self.position = [float(values["position"][k]) for k in ("x", "y", "z")]
+        self.rotation = [float(values["rotation"][k]) for k in ("roll", "pitch", "yaw")]
+        self._set_velocity(values["velocity"])
+
+    def restartPosition(self):
+        self._rpc()
+        self.position = [0.0, 0.0, 0.0]
+        self.rotation = [0.0, 0.0, 0.0]
+
+
+def serve(port: int, host: str = "127.0.0.1", rpc_delay: float = 0.0, combined: bool = True) -> ThreadingHTTPServer:
+    """
+    @brief Serve a FakeUnityComms as JSON-RPC on http://host:port/jsonrpc, the endpoint UnityComms posts to,
+           so the bridge can run unchanged against it. Serves from a background thread.
+    @return The server, call shutdown() to stop it.
+    """
+    fake = FakeUnityComms(rpc_delay=rpc_delay, combined=combined)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            method = request.get("method", "")
+            params = request.get("params") or {}
+            response = {"jsonrpc": "2.0", "id": request.get("id")}
+            handler = getattr(fake, method, None) if not method.startswith("_") else None
+            try:
+                if handler is None:
+                    raise AttributeError(f"Method not found: {method}")
+                with fake.lock:
+                    response["result"] = handler(**params)
+            except Exception as e:
+                response["error"] = {"code": -32601, "message": str(e), "data": str(e)}
+            body = json.dumps(response).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="fake-unity", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="JSON-RPC stand-in for the Unity simulator")
+    parser.add_argument("--port", type=int, default=9999, help="Port UnityComms connects to (default: 9999)")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Host to bind to (default: 127.0.0.1)")
+    parser.add_argument("--rpc_delay", type=float, default=0.0, help="Extra seconds per RPC, e.g. a physics step (default: 0)")
+    parser.add_argument("--no_combined", action="store_true", help="Answer only the separate RPCs, like an older game build")
+    args = parser.parse_args()
+
+    serve(args.port, args.host, args.rpc_delay, not args.no_combined)
+    print(f"Fake Unity listening on http://{args.host}:{args.port}/jsonrpc")
+    while True:
+        time.sleep(1)
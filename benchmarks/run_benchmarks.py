@@ -0,0 +1,301 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'modules'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_unity
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Frame sizes of the Virtual_Cameras capture regions plus a 640x480 webcam
+CAMERAS = {
+    'virtual_cam1': (721, 405),
+    'virtual_cam2': (717, 404),
+    'virtual_cam3': (719, 408),
+    'webcam': (640, 480),
+}
+
+# Payloads the bridge and controller post, keyed by route
+PAYLOADS = {
+    'inputs': {'X': 0.1, 'Y': 0.0, 'Z': 0.0, 'Roll': 0.0, 'Pitch': 0.0, 'Yaw': 0.0, 'Arm': 1, 'S1': 0.0, 'S2': 0.0, 'S3': 0.0},
+    'position': {'X': 1.0, 'Y': 2.0, 'Z': 3.0},
+    'rotation': {'Roll': 0.0, 'Pitch': 0.0, 'Yaw': 90.0},
+    'velocity': {'Vx': 0.1, 'Vy': 0.0, 'Vz': 0.0},
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def latency_stats(samples) -> dict:
+    samples = np.asarray(samples)
+    p50, p99 = np.percentile(samples, [50, 99]) * 1e3
+    return {'p50_ms': float(p50), 'p99_ms': float(p99), 'rate_per_s': float(len(samples) / samples.sum())}
+
+
+@contextlib.contextmanager
+def db_server(workdir: str):
+    """Run DBPackage on a free port against a scratch database."""
+    port = free_port()
+    env = dict(os.environ, AUV_DB_URI=f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'modules', 'DBPackage.py'),
+                                '--host', '127.0.0.1', '--port', str(port)], env=env, cwd=workdir)
+    url = f'http://127.0.0.1:{port}'
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                if requests.get(url + '/metrics', timeout=1).status_code == 200:
+                    break
+            except requests.exceptions.ConnectionError:
+                pass
+            if time.time() > deadline or process.poll() is not None:
+                raise RuntimeError('DBPackage did not start')
+            time.sleep(0.1)
+        yield url
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def bench_db(url: str, n: int) -> dict:
+    """POST and GET latency/throughput per DBPackage route."""
+    session = requests.Session()
+    results = {}
+    for route, payload in PAYLOADS.items():
+        samples = []
+        for _ in range(n):
+            data = dict(payload, datetime=datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f'))
+            start = time.perf_counter()
+            session.post(f'{url}/{route}', json=data)
+            samples.append(time.perf_counter() - start)
+        results[f'db.post_{route}'] = latency_stats(samples)
+        samples = []
+        for _ in range(n):
+            start = time.perf_counter()
+            session.get(f'{url}/{route}')
+            samples.append(time.perf_counter() - start)
+        results[f'db.get_{route}'] = latency_stats(samples)
+    return results
+
+
+def synthetic_path(size: int) -> np.ndarray:
+    t = np.linspace(0, 4 * np.pi, size)
+    path = np.zeros((size, 9), dtype=np.float32)
+    path[:, 0], path[:, 1], path[:, 2] = 10 * np.cos(t), -t, 10 * np.sin(t)
+    path[:, 5] = np.degrees(t) % 360
+    path[:, 6], path[:, 8] = -np.sin(t), np.cos(t)
+    return path
+
+
+def bench_env(url: str, workdir: str, path_sizes, steps: int) -> dict:
+    """AUVEnv.step rate against the local DBPackage, and reward cost, for several expert path sizes."""
+    from EnvPackage import AUVEnv
+
+    session = requests.Session()
+    for route in ('position', 'rotation', 'velocity'):
+        session.post(f'{url}/{route}', json=dict(PAYLOADS[route], datetime=datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')))
+
+    results = {}
+    for size in path_sizes:
+        path_dir = os.path.join(workdir, f'paths_{size}')
+        os.makedirs(path_dir, exist_ok=True)
+        np.save(os.path.join(path_dir, 'bench.npy'), synthetic_path(size))
+        with contextlib.redirect_stderr(io.StringIO()):
+            env = AUVEnv(f'{url}/position', f'{url}/rotation', f'{url}/velocity', f'{url}/inputs', path_library=path_dir,
+                         start_mode=None)
+            env.logger.setLevel('WARNING')
+            env.reset()
+        action = np.zeros(9, dtype=np.float32)
+        samples = []
+        for _ in range(steps):
+            start = time.perf_counter()
+            env.step(action)
+            samples.append(time.perf_counter() - start)
+        results[f'env.step_path_{size}'] = latency_stats(samples)
+
+        samples = []
+        rng = np.random.default_rng(0)
+        for _ in range(steps * 10):
+            env.state.X, env.state.Y, env.state.Z = rng.uniform(-12, 12, 3)
+            start = time.perf_counter()
+            env._calculate_reward()
+            samples.append(time.perf_counter() - start)
+        results[f'env.reward_path_{size}'] = latency_stats(samples)
+    return results
+
+
+def bench_bridge(url: str, ticks: int, rate: float) -> dict:
+    """
+    HardwareInterface tick cost (free running) with separate and combined Unity RPCs, and loop jitter at a
+    fixed rate, against the JSON-RPC Unity stand-in.
+    """
+    from HardwareInterface import unityInterface
+
+    host, port = url.rsplit(':', 1)
+    unity_port = free_port()
+    server = fake_unity.serve(unity_port)
+    results = {}
+    try:
+        for mode in ('separate', 'combined'):
+            bridge = unityInterface(unity_port=unity_port, inputs_url=host.split('//')[1], inputs_port=int(port), rpc_mode=mode)
+            samples = []
+            for _ in range(ticks):
+                start = time.perf_counter()
+                bridge.tick()
+                samples.append(time.perf_counter() - start)
+            results[f'bridge.tick_{mode}'] = latency_stats(samples)
+        # Unity share of the tick, from the bridge's own spans
+        import Metrics
+        unity_spans = {'separate': ['bridge_unity_get_position', 'bridge_unity_get_rotation', 'bridge_unity_get_velocity',
+                                    'bridge_unity_set_velocity'],
+                       'combined': ['bridge_unity_get_state']}
+        for mode, names in unity_spans.items():
+            total = sum(Metrics.histogram(f'{name}_seconds').total() for name in names)
+            results[f'bridge.tick_{mode}']['unity_ms'] = total / ticks * 1e3
+
+        bridge = unityInterface(unity_port=unity_port, inputs_url=host.split('//')[1], inputs_port=int(port))
+        period = 1.0 / rate
+        starts = []
+        next_tick = time.perf_counter()
+        for _ in range(ticks):
+            starts.append(time.perf_counter())
+            bridge.tick()
+            next_tick += period
+            time.sleep(max(0.0, next_tick - time.perf_counter()))
+    finally:
+        server.shutdown()
+    intervals = np.diff(starts)
+    results['bridge.loop'] = {
+        'target_hz': rate,
+        'achieved_hz': float(1.0 / intervals.mean()),
+        'jitter_ms': float(intervals.std() * 1e3),
+        'max_interval_ms': float(intervals.max() * 1e3),
+    }
+    return results
+
+
+def bench_cameras(frames: int) -> dict:
+    """MJPEG (cv2.imencode .jpg) encode rate per camera frame size."""
+    import cv2
+
+    results = {}
+    rng = np.random.default_rng(0)
+    for name, (width, height) in CAMERAS.items():
+        # Smooth gradient plus noise compresses roughly like a rendered scene
+        base = np.linspace(0, 255, width * height * 3).reshape(height, width, 3).astype(np.uint8)
+        frame = cv2.add(base, rng.integers(0, 32, base.shape, dtype=np.uint8))
+        samples = []
+        for _ in range(frames):
+            start = time.perf_counter()
+            cv2.imencode('.jpg', frame)
+            samples.append(time.perf_counter() - start)
+        stats = latency_stats(samples)
+        stats['fps'] = stats.pop('rate_per_s')
+        results[f'camera.encode_{name}'] = stats
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    @brief Compare every metric with the baseline. Rates (rate_per_s, fps, achieved_hz) should not drop and
+           latencies (*_ms) should not grow by more than tolerance.
+    @return List of (metric, baseline, current, relative change, regressed) tuples.
+    """
+    rows = []
+    for bench, metrics in results.items():
+        for key, current in metrics.items():
+            base = baseline.get(bench, {}).get(key)
+            if base is None or key == 'target_hz' or base == 0:
+                continue
+            change = (current - base) / abs(base)
+            higher_is_better = key in ('rate_per_s', 'fps', 'achieved_hz')
+            regressed = change < -tolerance if higher_is_better else change > tolerance
+            rows.append((f'{bench}.{key}', base, current, change, regressed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmarks for the AUV control pipeline")
+    parser.add_argument('--output', type=str, default='benchmark_results.json', help='Where to write the results')
+    parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE, help='Baseline results to compare against')
+    parser.add_argument('--save_baseline', action='store_true', help='Store these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Allowed relative change before flagging a regression (default: 0.15)')
+    parser.add_argument('--fail_on_regression', action='store_true', help='Exit with status 1 when a metric regressed')
+    parser.add_argument('--requests', type=int, default=500, help='Requests per DBPackage route and method')
+    parser.add_argument('--steps', type=int, default=300, help='Env steps per expert path size')
+    parser.add_argument('--path_sizes', type=str, default='100,1000,10000', help='Expert path sizes to test')
+    parser.add_argument('--ticks', type=int, default=200, help='Bridge ticks')
+    parser.add_argument('--bridge_rate', type=float, default=10.0, help='Bridge loop rate for the jitter test (default: 10 Hz like run())')
+    parser.add_argument('--frames', type=int, default=200, help='Frames encoded per camera')
+    parser.add_argument('--only', type=str, default='db,env,bridge,camera', help='Comma separated benchmarks to run')
+    args = parser.parse_args()
+
+    selected = set(args.only.split(','))
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        if selected & {'db', 'env', 'bridge'}:
+            with db_server(workdir) as url:
+                if 'db' in selected:
+                    print('Running DBPackage benchmarks...')
+                    results.update(bench_db(url, args.requests))
+                if 'env' in selected:
+                    print('Running AUVEnv benchmarks...')
+                    results.update(bench_env(url, workdir, [int(s) for s in args.path_sizes.split(',')], args.steps))
+                if 'bridge' in selected:
+                    print('Running bridge benchmarks...')
+                    results.update(bench_bridge(url, args.ticks, args.bridge_rate))
+        if 'camera' in selected:
+            print('Running camera encode benchmarks...')
+            results.update(bench_cameras(args.frames))
+
+    report = {
+        'meta': {'datetime': datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(),
+                 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f'Results written to {args.output}')
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)['results']
+        for metric, base, current, change, regressed in compare(results, baseline, args.tolerance):
+            flag = 'REGRESSION' if regressed else ''
+            print(f'{metric:55s} {base:12.3f} -> {current:12.3f} ({change:+7.1%}) {flag}')
+            if regressed:
+                regressions.append(metric)
+        report['comparison'] = {'baseline': args.baseline, 'tolerance': args.tolerance, 'regressions': regressions}
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=4)
+        print(f'Baseline saved to {args.baseline}')
+
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,96 @@
 import requests
 import pygame
+import numpy as np
+import argparse
+import threading
 import time
 import json
 import os
+from datetime import datetime
+
+class CommandSender:
+    """
+    Non-blocking sender for controller commands. The control loop hands over the latest command and
+    returns immediately; a background thread posts it to the DBPackage. If several commands arrive
+    while a post is in flight only the newest one is sent (older ones are coalesced away).
+    """
+    def __init__(self, url: str = "http://localhost:5000/inputs", timeout: float = 0.5):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.sent = 0
+        self.coalesced = 0
+        self.failed = 0
+        self._pending = None
+        self._running = True
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="command-sender", daemon=True)
+        self._thread.start()
+
+    def submit(self, data: dict) -> None:
+        """
+        @brief Queue a command to be sent, replacing any command that has not been sent yet.
+        @param data: The output data to send.
+        @return None
+        """
+        with self._cond:
+            if self._pending is not None:
+                self.coalesced += 1
+            self._pending = dict(data)
+            self._cond.notify()
+
+    def close(self) -> None:
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while self._pending is None and self._running:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                data, self._pending = self._pending, None
+            data["datetime"] = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
+            data["source"] = "controller"
+            try:
+                response = self.session.post(self.url, json=data, timeout=self.timeout)
+                if response.status_code in (200, 201):
+                    self.sent += 1
+                else:
+                    self.failed += 1
+            except requests.exceptions.RequestException:
+                self.failed += 1
+
+class ControllerProfile:
+    """
+    A joystick profile from configs/controller.json compiled once into index arrays, so each tick is
+    a single NumPy gather + scale/offset instead of nested dictionary lookups and per-axis mapping.
+    """
+    # "<Output>_Increase"/"<Output>_Decrease" buttons step the output by this many counts
+    BUTTON_STEP = 10
+
+    def __init__(self, config : dict, in_min : float = -1.0, in_max : float = 1.0, out_min : float = 0.0, out_max : float = 255.0):
+        self.name = config.get("name", "")
+        self.axis_outputs = list(config.get("axis", {}).keys())
+        self.axis_index = np.array([config["axis"][name] for name in self.axis_outputs], dtype=np.intp)
+        # Linear map of [in_min, in_max] onto [out_min, out_max] as x * scale + offset
+        scale = (out_max - out_min) / (in_max - in_min)
+        self.axis_scale = np.full(len(self.axis_outputs), scale, dtype=np.float64)
+        self.axis_offset = np.full(len(self.axis_outputs), out_min - in_min * scale, dtype=np.float64)
+
+        buttons = config.get("button", {})
+        self.arm_button = buttons["Arm"]["button"] if "Arm" in buttons else None
+        self.step_buttons = []
+        for key, entry in buttons.items():
+            output, _, direction = key.rpartition("_")
+            if direction == "Increase":
+                self.step_buttons.append((output, entry["button"], self.BUTTON_STEP))
+            elif direction == "Decrease":
+                self.step_buttons.append((output, entry["button"], -self.BUTTON_STEP))
+        self.neutral_outputs = self.axis_outputs + sorted({name for name, _, _ in self.step_buttons})
 
 class Controller:
     def __init__(self):
@@ -30,21 +118,43 @@ class Controller:
             "S3": 128,
             "Arm": 0
         }
+        # Stick values inside +/- deadband are treated as centered
+        self.deadband = 0.0
+        self.verbose = True
+        # Raw input buffers, allocated on the first read
+        self.axes = None
+        self.buttons = None
+        self.hats = None
 
     def get_raw_data(self):
+        """
+        @brief Reads all axes, buttons and hats into preallocated arrays.
+        @return (axes, buttons, hats) NumPy arrays, reused between calls.
+        """
         pygame.event.pump()
-        axes = [round(self.joystick.get_axis(i), 2) for i in range(self.joystick.get_numaxes())]
-        buttons = [self.joystick.get_button(i) for i in range(self.joystick.get_numbuttons())]
-        hats = [self.joystick.get_hat(i) for i in range(self.joystick.get_numhats())]
+        joystick = self.joystick
+        if self.axes is None:
+            self.axes = np.zeros(joystick.get_numaxes(), dtype=np.float64)
+            self.buttons = np.zeros(joystick.get_numbuttons(), dtype=np.int8)
+            self.hats = np.zeros((joystick.get_numhats(), 2), dtype=np.int8)
+        axes, buttons, hats = self.axes, self.buttons, self.hats
+        for i in range(len(axes)):
+            axes[i] = joystick.get_axis(i)
+        np.round(axes, 2, out=axes)
+        for i in range(len(buttons)):
+            buttons[i] = joystick.get_button(i)
+        for i in range(len(hats)):
+            hats[i] = joystick.get_hat(i)
         return axes, buttons, hats
     def print_raw_data(self):
         axes, buttons, hats = self.get_raw_data()
-        print(f"Axes: {axes}, Buttons: {buttons}, Hats: {hats}", end="\r")
-    def parse_config(self, config_file):
+        print(f"Axes: {axes.tolist()}, Buttons: {buttons.tolist()}, Hats: {hats.tolist()}", end="\r")
+    def parse_config(self, config_file, profile=None):
         """
         @brief Parses the configuration file and loads the settings.
         @param config_file: Path to the configuration file.
-        @return None
+        @param profile: Profile key (e.g. "joystick_1") or index to use. Asks on the terminal when None.
+        @return The selected joystick configuration dictionary, or None.
 
         @note Config file should be in JSON format like below:
         {
@@ -79,75 +189,133 @@ class Controller:
             return
         with open(config_file, 'r') as file:
             config = json.load(file)
-        
-        print("Which controller do you want to use?")
-        for i, key in enumerate(config.keys()):
-            print(f"{i}: {key}")
-        choice = int(input("Enter the number of your choice: "))
-        if choice < 0 or choice >= len(config):
-            print("Invalid choice. Exiting.")
+
+        keys = list(config.keys())
+        if profile is None:
+            print("Which controller do you want to use?")
+            for i, key in enumerate(keys):
+                print(f"{i}: {key}")
+            profile = int(input("Enter the number of your choice: "))
+        if profile in config:
+            selected_joystick = profile
+        elif str(profile).isdigit() and 0 <= int(profile) < len(keys):
+            selected_joystick = keys[int(profile)]
+        else:
+            print(f"Invalid choice {profile}. Exiting.")
             return
-        selected_joystick = list(config.keys())[choice]
         print(f"Selected joystick: {config[selected_joystick]['name']}")
         joystick_config = config[selected_joystick]
         return joystick_config
-    def mapping(self, x : float, in_min : float, in_max : float, out_min : float, out_max : float):
-        return (x - in_min) * (out_max - out_min) / (in_max - in_min) + out_min
-    def parse_output_data(self, config : dict):
+    def parse_output_data(self, profile : ControllerProfile):
         """
-        @brief Parses the output data from the joystick based on the configuration.
-        @param config: The configuration dictionary.
+        @brief Parses the output data from the joystick based on the compiled profile.
+        @param profile: The ControllerProfile compiled from the configuration.
         @return None
         """
         axes, buttons, hats = self.get_raw_data()
-        if buttons[config["button"]["Arm"]["button"]]:
-            self.output_data["Arm"] = 1
-        else:
-            self.output_data["Arm"] = 0
-        if self.output_data["Arm"] == 1:
-            self.output_data["X"] = int(self.mapping(axes[config["axis"]["X"]], -1, 1, 0, 255))
-            self.output_data["Y"] = int(self.mapping(axes[config["axis"]["Y"]], -1, 1, 0, 255))
-            self.output_data["Z"] = int(self.mapping(axes[config["axis"]["Z"]], -1, 1, 0, 255))
-            self.output_data["Yaw"] = int(self.mapping(axes[config["axis"]["Yaw"]], -1, 1, 0, 255))
-            self.output_data["S3"] = int(self.mapping(axes[config["axis"]["S3"]], -1, 1, 0, 255))
-            
-            if buttons[config["button"]["S1_Increase"]["button"]]:
-                self.output_data["S1"] = min(self.output_data["S1"] + 10, 255)
-            if buttons[config["button"]["S1_Decrease"]["button"]]:
-                self.output_data["S1"] = max(self.output_data["S1"] - 10, 0)
-            if buttons[config["button"]["S2_Increase"]["button"]]:
-                self.output_data["S2"] = min(self.output_data["S2"] + 10, 255)
-            if buttons[config["button"]["S2_Decrease"]["button"]]:
-                self.output_data["S2"] = max(self.output_data["S2"] - 10, 0)
+        output = self.output_data
+        armed = bool(buttons[profile.arm_button]) if profile.arm_button is not None else False
+        output["Arm"] = 1 if armed else 0
+        if armed:
+            values = axes[profile.axis_index]
+            values[np.abs(values) < self.deadband] = 0.0
+            values = (values * profile.axis_scale + profile.axis_offset).astype(np.int64)
+            for name, value in zip(profile.axis_outputs, values.tolist()):
+                output[name] = value
+
+            for name, button, step in profile.step_buttons:
+                if buttons[button]:
+                    output[name] = min(max(output[name] + step, 0), 255)
         else:
-            self.output_data["X"] = 128
-            self.output_data["Y"] = 128
-            self.output_data["Z"] = 128
-            self.output_data["Yaw"] = 128
-            self.output_data["S1"] = 128
-            self.output_data["S2"] = 128
-            self.output_data["S3"] = 128        
-        print(f"Output Data: {self.output_data}", end="\r")
-    def send_data(self):
+            for name in profile.neutral_outputs:
+                output[name] = 128
+        if self.verbose:
+            print(f"Output Data: {output}", end="\r")
+    def send_data(self, url : str = "http://localhost:5000/inputs"):
         """
         @brief Sends the output data to the DBPackage via http post requests.
+        @param url: The inputs route of the DBPackage.
         @return None
         """
-        request = requests.post("http://localhost:5000/inputs", json=self.output_data)
-        if request.status_code == 200:
+        data = dict(self.output_data, source="controller", datetime=datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f'))
+        request = requests.post(url, json=data)
+        if request.status_code in (200, 201):
             print("Data sent successfully.")
         else:
             print(f"Failed to send data. Status code: {request.status_code}")
+    def has_changed(self, last_sent : dict, min_delta : int):
+        """
+        @brief Checks whether the output data differs meaningfully from the last sent command.
+        @param last_sent: The last command handed to the sender, or None.
+        @param min_delta: Smallest change (in 0-255 output counts) that counts as a change.
+        @return True if the command should be sent.
+        """
+        if last_sent is None or last_sent["Arm"] != self.output_data["Arm"]:
+            return True
+        return any(abs(self.output_data[key] - last_sent[key]) >= min_delta for key in self.output_data if key != "Arm")
+    def run_event_loop(self, profile : ControllerProfile, sender : CommandSender, rate : float = 250.0, min_delta : int = 2, keepalive : float = 0.5):
+        """
+        @brief Event driven control loop. Joystick events are read at a high rate, and a command is
+               only sent when the output changed by at least min_delta or when keepalive seconds passed
+               since the last send (so the bridge still sees a fresh command while the sticks are idle).
+        @param profile: The compiled joystick profile.
+        @param sender: Non-blocking CommandSender used for all sends.
+        @param rate: Event polling rate in Hz.
+        @param min_delta: Change detection threshold in 0-255 output counts.
+        @param keepalive: Maximum seconds between sends.
+        @return None
+        """
+        clock = pygame.time.Clock()
+        joystick_events = (pygame.JOYAXISMOTION, pygame.JOYBUTTONDOWN, pygame.JOYBUTTONUP, pygame.JOYHATMOTION)
+        last_sent = None
+        last_send_time = 0.0
+        while True:
+            events = pygame.event.get()
+            if any(event.type == pygame.QUIT for event in events):
+                return
+            now = time.monotonic()
+            if last_sent is None or any(event.type in joystick_events for event in events):
+                self.parse_output_data(profile)
+            if self.has_changed(last_sent, min_delta) or now - last_send_time >= keepalive:
+                sender.submit(self.output_data)
+                last_sent = dict(self.output_data)
+                last_send_time = now
+            clock.tick(rate)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Joystick controller for the AUV")
+    parser.add_argument("--mode", type=str, default="poll", choices=["poll", "event"], help="poll: send every 100 ms, event: send on change (default: poll)")
+    parser.add_argument("--config", type=str, default="configs/controller.json", help="Joystick configuration file")
+    parser.add_argument("--profile", type=str, default=None, help="Profile key or index in the configuration file (default: ask)")
+    parser.add_argument("--url", type=str, default="http://localhost:5000/inputs", help="Inputs route to send commands to")
+    parser.add_argument("--rate", type=float, default=250.0, help="Event mode polling rate in Hz (default: 250)")
+    parser.add_argument("--deadband", type=float, default=0.05, help="Event mode stick deadband (default: 0.05)")
+    parser.add_argument("--min_delta", type=int, default=2, help="Event mode change threshold in output counts (default: 2)")
+    parser.add_argument("--keepalive", type=float, default=0.5, help="Event mode maximum seconds between sends (default: 0.5)")
+    args = parser.parse_args()
+
     controller = Controller()
+    sender = None
     try:
-        joystick_config = controller.parse_config("configs/controller.json")
-        while True:
-            # controller.print_raw_data()
-            controller.parse_output_data(joystick_config)
-            controller.send_data()
-            time.sleep(0.1)
+        joystick_config = controller.parse_config(args.config, args.profile)
+        if joystick_config is None:
+            raise SystemExit(1)
+        profile = ControllerProfile(joystick_config)
+        if args.mode == "event":
+            controller.deadband = args.deadband
+            controller.verbose = False
+            sender = CommandSender(args.url)
+            controller.run_event_loop(profile, sender, args.rate, args.min_delta, args.keepalive)
+        else:
+            while True:
+                # controller.print_raw_data()
+                controller.parse_output_data(profile)
+                controller.send_data(args.url)
+                time.sleep(0.1)
     except KeyboardInterrupt:
         print("\nExiting...")
+    finally:
+        if sender is not None:
+            sender.close()
+            print(f"Sent: {sender.sent}, Coalesced: {sender.coalesced}, Failed: {sender.failed}")
         pygame.quit()
\ No newline at end of file
@@ -0,0 +1,129 @@
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modules'))
+from TelemetryReader import DEFAULT_DB_PATH, DEFAULT_NAMESPACE, STATE_FIELDS, read_states
+
+# Columns of STATE_FIELDS that are angles in degrees and wrap at 360
+ANGLE_COLUMNS = [3, 4, 5]
+
+
+def unwrap_angles(states: np.ndarray) -> np.ndarray:
+    """Unwrap the angle columns so smoothing and interpolation don't cut across the 0/360 seam."""
+    states = states.copy()
+    states[:, ANGLE_COLUMNS] = np.unwrap(states[:, ANGLE_COLUMNS], period=360.0, axis=0)
+    return states
+
+
+def wrap_angles(states: np.ndarray) -> np.ndarray:
+    states = states.copy()
+    states[:, ANGLE_COLUMNS] = np.mod(states[:, ANGLE_COLUMNS], 360.0)
+    return states
+
+
+def deduplicate(times: np.ndarray, states: np.ndarray, min_step: float):
+    """
+    @brief Drop repeated samples and samples that moved less than min_step from the previous kept one.
+    @param times: Sample times in seconds.
+    @param states: (N, 9) states.
+    @param min_step: Minimum distance in position units between kept samples.
+    @return (times, states) of the kept samples.
+    """
+    if len(states) == 0:
+        return times, states
+    keep = np.ones(len(states), dtype=bool)
+    keep[1:] = np.any(states[1:] != states[:-1], axis=1)
+    times, states = times[keep], states[keep]
+
+    # Keep the first sample of every min_step bucket along the travelled distance
+    step = np.linalg.norm(np.diff(states[:, :3], axis=0), axis=1)
+    arc = np.concatenate([[0.0], np.cumsum(step)])
+    bucket = np.floor(arc / min_step) if min_step > 0 else np.arange(len(arc))
+    keep = np.ones(len(arc), dtype=bool)
+    keep[1:] = bucket[1:] != bucket[:-1]
+    keep[-1] = True
+    return times[keep], states[keep]
+
+
+def smooth(states: np.ndarray, window: int) -> np.ndarray:
+    """Centered moving average over window samples, edges padded by reflection."""
+    if window <= 1 or len(states) < window:
+        return states
+    kernel = np.ones(window) / window
+    pad = window // 2
+    padded = np.pad(states, ((pad, window - 1 - pad), (0, 0)), mode='reflect')
+    return np.stack([np.convolve(padded[:, i], kernel, mode='valid') for i in range(states.shape[1])], axis=1)
+
+
+def resample(times: np.ndarray, states: np.ndarray, spacing: float, mode: str = 'arc') -> np.ndarray:
+    """
+    @brief Resample the path at uniform spacing.
+    @param times: Sample times in seconds.
+    @param states: (N, 9) states with unwrapped angles.
+    @param spacing: Distance between waypoints ('arc', position units) or seconds ('time').
+    @param mode: 'arc' for uniform arc-length spacing, 'time' for uniform time spacing.
+    @return (M, 9) resampled states.
+    """
+    if mode == 'arc':
+        step = np.linalg.norm(np.diff(states[:, :3], axis=0), axis=1)
+        axis = np.concatenate([[0.0], np.cumsum(step)])
+    elif mode == 'time':
+        axis = times - times[0]
+    else:
+        raise ValueError(f"Unknown resample mode: {mode}")
+    if axis[-1] <= 0:
+        return states[:1]
+    grid = np.arange(0.0, axis[-1], spacing)
+    if grid[-1] < axis[-1]:
+        grid = np.append(grid, axis[-1])
+    return np.stack([np.interp(grid, axis, states[:, i]) for i in range(states.shape[1])], axis=1)
+
+
+def write_path(output: str, states: np.ndarray) -> None:
+    """
+    @brief Write the path as the JSON list of waypoint dicts AUVEnv.load_expert_path expects, plus a
+           compact float32 .npy (columns in STATE_FIELDS order) next to it.
+    @param output: Path of the JSON file, the binary file uses the same name with .npy.
+    @param states: (M, 9) states.
+    @return None
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    waypoints = [dict(zip(STATE_FIELDS, row)) for row in states.tolist()]
+    with open(output, 'w') as f:
+        json.dump(waypoints, f)
+    np.save(os.path.splitext(output)[0] + '.npy', states.astype(np.float32))
+
+
+def build_path(db_path: str, start=None, stop=None, mode: str = 'arc', spacing: float = 0.25,
+               window: int = 5, min_step: float = 0.01, namespace: str = DEFAULT_NAMESPACE) -> np.ndarray:
+    """Read a recorded teleop run from data.db and turn it into a uniform, deduplicated path."""
+    times, states = read_states(db_path, start, stop, namespace)
+    if len(states) == 0:
+        raise ValueError(f"No telemetry found in {db_path} for the requested window")
+    states = unwrap_angles(states)
+    times, states = deduplicate(times, states, min_step)
+    states = smooth(states, window)
+    states = resample(times, states, spacing, mode)
+    return wrap_angles(states)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build an expert path from recorded teleop telemetry")
+    parser.add_argument("--db", type=str, default=DEFAULT_DB_PATH, help="Path to the DBPackage data.db")
+    parser.add_argument("--start", type=str, default=None, help="First datetime of the run (YYYY-MM-DD HH:MM:SS)")
+    parser.add_argument("--stop", type=str, default=None, help="Last datetime of the run (YYYY-MM-DD HH:MM:SS)")
+    parser.add_argument("--namespace", type=str, default=DEFAULT_NAMESPACE, help=f"Vehicle namespace the run was recorded under (default: {DEFAULT_NAMESPACE})")
+    parser.add_argument("--mode", type=str, default="arc", choices=["arc", "time"], help="Uniform arc-length or time spacing (default: arc)")
+    parser.add_argument("--spacing", type=float, default=0.25, help="Waypoint spacing in position units or seconds (default: 0.25)")
+    parser.add_argument("--smooth", type=int, default=5, help="Moving average window in samples, 1 disables (default: 5)")
+    parser.add_argument("--min_step", type=float, default=0.01, help="Drop samples that moved less than this (default: 0.01)")
+    parser.add_argument("--output", type=str, default="expert_paths/path_1.json", help="Output JSON path")
+    args = parser.parse_args()
+
+    path = build_path(args.db, args.start, args.stop, args.mode, args.spacing, args.smooth, args.min_step, args.namespace)
+    write_path(args.output, path)
+    print(f"Wrote {len(path)} waypoints to {args.output}")
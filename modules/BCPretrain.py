@@ -0,0 +1,105 @@
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+import torch
+
+from TelemetryReader import DEFAULT_NAMESPACE, asof_indices, read_states, read_table
+
+# Inputs table columns in AUVEnv action order
+ACTION_COLUMNS = ["X", "Y", "Z", "Roll", "Pitch", "Yaw", "S1", "S2", "S3"]
+
+# controller.py commands are 0..255, AUVEnv actions are -1..1
+OPERATOR_NEUTRAL = 127.5
+OPERATOR_SPAN = 127.5
+
+# Inputs rows that are operator commands, by the source column DBPackage records: controller.py writing
+# straight to the DBPackage (operator units; rows without a source predate it), and the mux while the
+# operator alone is in control (already -1..1). Policy, blended and idle rows are not demonstrations.
+RAW_OPERATOR_SOURCES = ["controller", None]
+MUX_OPERATOR_SOURCES = ["operator"]
+
+
+def build_bc_dataset(db_path: str, start: Optional[str] = None, stop: Optional[str] = None,
+                     max_lag: float = 1.0, namespace: str = DEFAULT_NAMESPACE) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    @brief Build a behavioral cloning dataset from recorded operator runs.
+    @param db_path: Path to data.db.
+    @param start: Optional first datetime of the window.
+    @param stop: Optional last datetime of the window.
+    @param max_lag: Drop commands whose latest telemetry sample is older than this many seconds.
+    @param namespace: DBPackage namespace the operator runs were recorded under.
+    @return (observations (N, 10), actions (N, 9)) float32, laid out like AUVEnv observations/actions.
+
+    @note Every armed operator command in the inputs table is paired with the latest telemetry state at
+          or before it (as-of join). Disarmed rows are the controller idling and are left out.
+    """
+    t_raw, raw = read_table(db_path, 'inputs', ACTION_COLUMNS + ["Arm"], start, stop, namespace, RAW_OPERATOR_SOURCES)
+    t_mux, mux = read_table(db_path, 'inputs', ACTION_COLUMNS + ["Arm"], start, stop, namespace, MUX_OPERATOR_SOURCES)
+    t_state, states = read_states(db_path, start, stop, namespace)
+    raw[:, :-1] = (raw[:, :-1] - OPERATOR_NEUTRAL) / OPERATOR_SPAN
+    t_in, commands = np.concatenate([t_raw, t_mux]), np.concatenate([raw, mux])
+    if len(t_in) == 0 or len(t_state) == 0:
+        return np.zeros((0, 10), dtype=np.float32), np.zeros((0, 9), dtype=np.float32)
+
+    order = np.argsort(t_in, kind='stable')
+    armed = commands[order, -1] > 0.5
+    t_in, commands = t_in[order][armed], commands[order][armed, :-1]
+
+    idx = asof_indices(t_in, t_state, tolerance=max_lag)
+    valid = idx >= 0
+    idx = idx[valid]
+
+    # AUVEnv observation: state followed by the Arm flag, which the env always reports as 0
+    observations = np.zeros((len(idx), 10), dtype=np.float32)
+    observations[:, :9] = states[idx]
+    actions = np.clip(commands[valid], -1.0, 1.0).astype(np.float32)
+    return observations, actions
+
+
+def pretrain_policy(model, observations: np.ndarray, actions: np.ndarray, epochs: int = 20, batch_size: int = 256,
+                    learning_rate: float = 1e-3, threads: Optional[int] = None,
+                    log: Callable[[str], None] = print) -> float:
+    """
+    @brief Fit the policy network of an SB3 model to (observation, action) pairs with mini-batch
+           supervised learning on CPU. Only the mean action is regressed (MSE); the value head and the
+           exploration std are left as initialised so PPO still explores from the warm start.
+    @param model: The SB3 model (e.g. PPO("MlpPolicy", ...)) whose policy is trained in place.
+    @param observations: (N, obs_dim) observations, already normalized if the model uses normalization.
+    @param actions: (N, action_dim) target actions in the env's action range.
+    @param epochs: Passes over the dataset.
+    @param batch_size: Mini-batch size.
+    @param learning_rate: Adam learning rate.
+    @param threads: torch CPU threads, None keeps the torch default.
+    @param log: Progress callback.
+    @return Final epoch mean loss.
+    """
+    if threads is not None:
+        torch.set_num_threads(threads)
+    policy = model.policy
+    policy.set_training_mode(True)
+    obs_tensor = torch.as_tensor(observations, dtype=torch.float32, device=policy.device)
+    action_tensor = torch.as_tensor(actions, dtype=torch.float32, device=policy.device)
+    parameters = list(policy.mlp_extractor.policy_net.parameters()) + list(policy.action_net.parameters())
+    if not policy.share_features_extractor:
+        parameters += list(policy.pi_features_extractor.parameters())
+    optimizer = torch.optim.Adam(parameters, lr=learning_rate)
+
+    n = len(observations)
+    epoch_loss = float('nan')
+    for epoch in range(epochs):
+        permutation = torch.randperm(n, device=policy.device)
+        total = 0.0
+        for begin in range(0, n, batch_size):
+            batch = permutation[begin:begin + batch_size]
+            features = policy.extract_features(obs_tensor[batch], policy.pi_features_extractor)
+            latent_pi = policy.mlp_extractor.forward_actor(features)
+            predicted = policy.action_net(latent_pi)
+            loss = torch.nn.functional.mse_loss(predicted, action_tensor[batch])
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total += loss.item() * len(batch)
+        epoch_loss = total / n
+        log(f"[BC] Epoch {epoch + 1}/{epochs} loss: {epoch_loss:.5f}")
+    policy.set_training_mode(False)
+    return epoch_loss
@@ -0,0 +1,235 @@
+from flask import Flask, request, jsonify, Response
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Tuple
+import argparse
+import threading
+import logging
+import time
+from datetime import datetime
+
+import numpy as np
+import requests
+
+import Metrics
+from Metrics import span
+
+# Command multiplexer between the command sources (controller.py, AUVEnv) and the bridge.
+# Sources POST to /inputs/<source> instead of straight to the DBPackage; every control tick the mux
+# arbitrates the latest command of each source and writes exactly one command to the DBPackage.
+
+app = Flask(__name__)
+
+log = logging.getLogger('werkzeug')
+log.setLevel(logging.ERROR)
+
+# Fields that are arbitrated/blended. 'Arm' is not: it comes from the arming source alone (see CommandMux).
+COMMAND_FIELDS = ["X", "Y", "Z", "Roll", "Pitch", "Yaw", "S1", "S2", "S3"]
+
+
+@dataclass
+class SourceConfig:
+    name: str
+    priority: int                     # Higher priority sources override lower ones
+    timeout: float                    # Seconds after the last command before the source is stale
+    neutral: float = 0.0              # Value meaning "no command" in the source's own units
+    span: float = 1.0                 # Half range of the source's units (neutral +/- span maps to -1..1)
+    override_threshold: float = 0.0   # Normalized deflection needed to take control, 0 = always in control
+    arms: bool = False                # The arming authority: its Arm is the mux output's Arm
+
+
+# controller.py sends 0..255, AUVEnv sends -1..1. The operator timeout spans several of controller.py's
+# 0.5 s event mode keepalives, so a stick held still does not go stale on a late one
+DEFAULT_SOURCES = [
+    SourceConfig("operator", priority=2, timeout=1.5, neutral=127.5, span=127.5, override_threshold=0.1, arms=True),
+    SourceConfig("policy", priority=1, timeout=0.25),
+]
+
+
+def parse_sources(items: List[str], sources: List[SourceConfig] = DEFAULT_SOURCES) -> List[SourceConfig]:
+    """
+    @brief Apply --source overrides to the source configuration.
+    @param items: 'name=priority:timeout' entries, e.g. 'operator=2:1.5'. Unknown names add a -1..1 source.
+    @return The updated sources.
+    """
+    by_name = {s.name: s for s in sources}
+    for item in items:
+        try:
+            name, settings = item.split('=', 1)
+            priority, timeout = settings.split(':', 1)
+            priority, timeout = int(priority), float(timeout)
+        except ValueError:
+            raise ValueError(f"Expected --source name=priority:timeout, got {item}")
+        if name in by_name:
+            by_name[name] = replace(by_name[name], priority=priority, timeout=timeout)
+        else:
+            by_name[name] = SourceConfig(name, priority=priority, timeout=timeout)
+    return list(by_name.values())
+
+
+class CommandMux:
+    """
+    Keeps the latest command of each source and picks one command per tick:
+      - sources older than their timeout are ignored (a dead controller or policy can't hold the vehicle),
+      - the highest priority fresh source whose deflection exceeds its override_threshold wins, so a
+        centred operator stick lets the policy drive and any stick input takes over,
+      - with blend > 0 the lower priority source keeps that share of the output while overridden
+        (shared autonomy), with blend = 0 the override is strict,
+      - with no fresh source the output is neutral.
+    Arm is the last Arm sent by the arming source (the operator), whichever source is in control and
+    whether or not it is fresh: the bridge resets the vehicle on a disarm edge, so handing control over
+    or a late keepalive must never disarm. Only the operator disarming does.
+    """
+    def __init__(self, sources=DEFAULT_SOURCES, blend: float = 0.0, output_neutral: float = 0.0, output_span: float = 1.0):
+        self.sources: Dict[str, SourceConfig] = {s.name: s for s in sources}
+        self.order = sorted(self.sources.values(), key=lambda s: s.priority, reverse=True)
+        self.blend = blend
+        self.output_neutral = output_neutral
+        self.output_span = output_span
+        # name -> (receive time, normalized command vector, arm)
+        self.latest: Dict[str, Tuple[float, np.ndarray, float]] = {}
+        self.arm = 0.0
+        self._lock = threading.Lock()
+
+    def submit(self, source: str, command: dict, timestamp: Optional[float] = None) -> None:
+        """
+        @brief Store the newest command of a source.
+        @param source: Source name, must be configured.
+        @param command: Command dictionary in the source's units.
+        @param timestamp: Receive time (time.monotonic()), defaults to now.
+        @return None
+        """
+        config = self.sources[source]
+        values = np.array([float(command.get(k, config.neutral)) for k in COMMAND_FIELDS], dtype=np.float64)
+        values = np.clip((values - config.neutral) / config.span, -1.0, 1.0)
+        arm = float(command.get("Arm", 0))
+        with self._lock:
+            self.latest[source] = (time.monotonic() if timestamp is None else timestamp, values, arm)
+            if config.arms:
+                self.arm = arm
+
+    def select(self, now: Optional[float] = None) -> Tuple[dict, str]:
+        """
+        @brief Arbitrate the current command.
+        @param now: Current time (time.monotonic()), defaults to now.
+        @return (command in output units, name of the source in control or 'none')
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            fresh = [(s, self.latest[s.name]) for s in self.order
+                     if s.name in self.latest and now - self.latest[s.name][0] <= s.timeout]
+            arm = self.arm
+
+        if not fresh:
+            values, label = np.zeros(len(COMMAND_FIELDS)), "none"
+        else:
+            winner = next((i for i, (s, (_, v, _)) in enumerate(fresh)
+                           if np.max(np.abs(v)) >= s.override_threshold), 0)
+            source, (_, values, _) = fresh[winner]
+            label = source.name
+            if self.blend > 0.0 and winner + 1 < len(fresh):
+                lower = fresh[winner + 1]
+                values = (1.0 - self.blend) * values + self.blend * lower[1][1]
+                label = f"{source.name}+{lower[0].name}"
+
+        output = values * self.output_span + self.output_neutral
+        command = {k: float(v) for k, v in zip(COMMAND_FIELDS, output)}
+        command["Arm"] = arm
+        return command, label
+
+    def status(self, now: Optional[float] = None) -> dict:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return {name: {"age": now - t, "stale": now - t > self.sources[name].timeout}
+                    for name, (t, _, _) in self.latest.items()}
+
+
+class MuxLoop:
+    """Runs the mux at a fixed control rate and forwards one command per tick to the DBPackage."""
+    def __init__(self, mux: CommandMux, inputs_url: str, rate: float = 10.0):
+        self.mux = mux
+        self.inputs_url = inputs_url
+        self.period = 1.0 / rate
+        self.session = requests.Session()
+        self.last_command = None
+        self.last_source = "none"
+        self.ticks = 0
+        self.failed = 0
+
+    def tick(self) -> None:
+        with span("mux_tick"):
+            self._tick()
+
+    def _tick(self) -> None:
+        command, source = self.mux.select()
+        self.last_command, self.last_source = command, source
+        data = dict(command, source=source, datetime=datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f'))
+        try:
+            response = self.session.post(self.inputs_url, json=data, timeout=self.period)
+            if response.status_code != 201:
+                self.failed += 1
+        except requests.exceptions.RequestException:
+            self.failed += 1
+        self.ticks += 1
+
+    def run(self) -> None:
+        next_tick = time.monotonic()
+        while True:
+            self.tick()
+            next_tick += self.period
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Overran the tick, don't try to catch up with a burst of writes
+                next_tick = time.monotonic()
+
+
+mux = CommandMux()
+loop: Optional[MuxLoop] = None
+
+# Routes for command sources
+@app.route('/inputs/<source>', methods=['POST'])
+def add_source_input(source):
+    data = request.get_json()
+    if not data:
+        return jsonify({'message': 'No data provided'}), 400
+    if source not in mux.sources:
+        return jsonify({'message': f'Unknown source {source}'}), 404
+    mux.submit(source, data)
+    return jsonify({'message': 'Command accepted'}), 201
+
+@app.route('/inputs', methods=['GET'])
+def get_selected_input():
+    if loop is None or loop.last_command is None:
+        return jsonify({'message': 'No data available'}), 404
+    return jsonify(dict(loop.last_command, source=loop.last_source))
+
+@app.route('/sources', methods=['GET'])
+def get_sources():
+    return jsonify(mux.status())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(Metrics.render(), mimetype=Metrics.CONTENT_TYPE)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Command multiplexer between command sources and the DBPackage")
+    parser.add_argument("--port", type=int, default=5002, help="Port for the mux API")
+    parser.add_argument("--host", type=str, default="localhost", help="Host for the mux API")
+    parser.add_argument("--inputs_url", type=str, default="http://localhost:5000/inputs", help="DBPackage inputs route")
+    parser.add_argument("--rate", type=float, default=10.0, help="Control rate in Hz (default: 10)")
+    parser.add_argument("--blend", type=float, default=0.0, help="Share kept by the lower priority source while overridden (default: 0)")
+    parser.add_argument("--source", action="append", default=[], metavar="NAME=PRIORITY:TIMEOUT",
+                        help="Priority and stale timeout in seconds of a source, e.g. operator=2:1.5 (default: operator=2:1.5, policy=1:0.25)")
+    args = parser.parse_args()
+
+    Metrics.set_component("mux")
+    try:
+        sources = parse_sources(args.source)
+    except ValueError as e:
+        parser.error(str(e))
+    mux = CommandMux(sources, blend=args.blend)
+    loop = MuxLoop(mux, args.inputs_url, args.rate)
+    threading.Thread(target=loop.run, name="mux-loop", daemon=True).start()
+    app.run(host=args.host, port=args.port, debug=False, threaded=True)
@@ -1,32 +1,92 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 import argparse
 
 import logging
+import threading
+import sqlite3
+import re
+import itertools
+import time
 import sys
 import os
 
+import Metrics
+
 # Initialize Flask app and SQLAlchemy
 app = Flask(__name__)
 
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///data.db'  # Use SQLite for simplicity
+# Use SQLite for simplicity, AUV_DB_URI points the store somewhere else (e.g. a scratch database for benchmarks)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('AUV_DB_URI', 'sqlite:///data.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db = SQLAlchemy(app)
 
+# Many envs write to one SQLite file at once: WAL lets the GETs read while a POST commits, and
+# synchronous=NORMAL only syncs at checkpoints, which is safe in WAL mode
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragma(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+
 # Suppress all Flask and Werkzeug logs
 log = logging.getLogger('werkzeug')
 log.setLevel(logging.ERROR)
 
-# Redirect stdout and stderr
-sys.stdout = open(os.devnull, 'w')
-sys.stderr = open(os.devnull, 'w')
+Metrics.set_component('dbpackage')
+
+# Time every request per route and method, e.g. db_post_add_input_seconds
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+    namespace = (request.view_args or {}).get('namespace')
+    if namespace is not None and not NAMESPACE_PATTERN.match(namespace):
+        return jsonify({'message': f'Invalid namespace {namespace!r}'}), 400
+
+@app.after_request
+def stop_timer(response):
+    # Piggyback pending resets on the bridge's inputs poll so it needs no extra request per tick
+    if request.endpoint == 'get_inputs' and reset_pending.get(request.view_args['namespace']):
+        response.headers['X-Reset-Pending'] = str(reset_pending[request.view_args['namespace']][0])
+    if request.endpoint and request.endpoint not in ('metrics', 'health'):
+        Metrics.histogram(f'db_{request.method.lower()}_{request.endpoint}_seconds').observe(time.perf_counter() - g.request_start)
+        if response.status_code >= 400:
+            Metrics.counter(f'db_{request.method.lower()}_{request.endpoint}_errors_total').inc()
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(Metrics.render(), mimetype=Metrics.CONTENT_TYPE)
+
+# Readiness check for start.py, only answers once the database can be queried
+@app.route('/health', methods=['GET'])
+def health():
+    try:
+        db.session.execute(db.text('SELECT 1'))
+        return jsonify({'status': 'ok'})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 503
+
+# The bridge stamps every state row with a tick id shared by the position, rotation and velocity rows of
+# one tick (the key to join them on), t_mono (its time.monotonic() when the state was read) and a datetime
+# with microseconds. Both are optional so older clients still post with one second datetimes.
+
+# Every table has a namespace column (one per vehicle/env, e.g. 'env3'), so one store serves many envs.
+# Routes exist both as /<namespace>/<table> and as the original /<table>, which is namespace 'default'.
+DEFAULT_NAMESPACE = 'default'
+NAMESPACE_PATTERN = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
 
 # Inputs class to store the submarine's input data (X, Y, Z, Roll, Pitch, Yaw, Arm, S1, S2, S3)
 class Inputs(db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    namespace = db.Column(db.String(64), nullable=False, default=DEFAULT_NAMESPACE, server_default=DEFAULT_NAMESPACE)
     datetime = db.Column(db.DateTime)
     X = db.Column(db.Float, nullable=False)
     Y = db.Column(db.Float, nullable=False)
@@ -38,73 +98,120 @@ class Inputs(db.Model):
     S1 = db.Column(db.Float, nullable=False)
     S2 = db.Column(db.Float, nullable=False)
     S3 = db.Column(db.Float, nullable=False)
+    # Writer of the command, which also fixes its units: 'controller' (controller.py, 0..255), 'policy'
+    # (AUVEnv, -1..1) or the source in control of the mux ('operator', 'policy', 'operator+policy',
+    # 'none', all -1..1). NULL for rows from before sources were recorded.
+    source = db.Column(db.String(32))
+    __table_args__ = (db.Index('ix_inputs_namespace_datetime', 'namespace', 'datetime'),)
 
     def __repr__(self):
-        return f'<Inputs {self.datetime}, {self.X}, {self.Y}, {self.Z}, {self.Roll}, {self.Pitch}, {self.Yaw}, {self.Arm}, {self.S1}, {self.S2}, {self.S3}>'
+        return f'<Inputs {self.namespace}, {self.datetime}, {self.X}, {self.Y}, {self.Z}, {self.Roll}, {self.Pitch}, {self.Yaw}, {self.Arm}, {self.S1}, {self.S2}, {self.S3}>'
 
 # Position class to store the submarine's position data (X, Y, Z)
 class Position(db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    namespace = db.Column(db.String(64), nullable=False, default=DEFAULT_NAMESPACE, server_default=DEFAULT_NAMESPACE)
     datetime = db.Column(db.DateTime)
     X = db.Column(db.Float, nullable=False)
     Y = db.Column(db.Float, nullable=False)
     Z = db.Column(db.Float, nullable=False)
+    tick = db.Column(db.BigInteger)
+    t_mono = db.Column(db.Float)
+    __table_args__ = (db.Index('ix_position_namespace_datetime', 'namespace', 'datetime'),
+                      db.Index('ix_position_namespace_tick', 'namespace', 'tick'))
 
     def __repr__(self):
-        return f'<Position {self.datetime}, {self.X}, {self.Y}, {self.Z}>'
+        return f'<Position {self.namespace}, {self.datetime}, {self.X}, {self.Y}, {self.Z}>'
 
 # Rotation class to store the submarine's rotation data (Roll, Pitch, Yaw)
 class Rotation(db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    namespace = db.Column(db.String(64), nullable=False, default=DEFAULT_NAMESPACE, server_default=DEFAULT_NAMESPACE)
     datetime = db.Column(db.DateTime)
     Roll = db.Column(db.Float, nullable=False)
     Pitch = db.Column(db.Float, nullable=False)
     Yaw = db.Column(db.Float, nullable=False)
+    tick = db.Column(db.BigInteger)
+    t_mono = db.Column(db.Float)
+    __table_args__ = (db.Index('ix_rotation_namespace_datetime', 'namespace', 'datetime'),
+                      db.Index('ix_rotation_namespace_tick', 'namespace', 'tick'))
 
     def __repr__(self):
-        return f'<Rotation {self.datetime}, {self.Roll}, {self.Pitch}, {self.Yaw}>'
+        return f'<Rotation {self.namespace}, {self.datetime}, {self.Roll}, {self.Pitch}, {self.Yaw}>'
 
 # Velocity class to store the submarine's velocity data (Vx, Vy, Vz)  
 class Velocity(db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    namespace = db.Column(db.String(64), nullable=False, default=DEFAULT_NAMESPACE, server_default=DEFAULT_NAMESPACE)
     datetime = db.Column(db.DateTime)
     Vx = db.Column(db.Float, nullable=False)
     Vy = db.Column(db.Float, nullable=False)
     Vz = db.Column(db.Float, nullable=False)
+    tick = db.Column(db.BigInteger)
+    t_mono = db.Column(db.Float)
+    __table_args__ = (db.Index('ix_velocity_namespace_datetime', 'namespace', 'datetime'),
+                      db.Index('ix_velocity_namespace_tick', 'namespace', 'tick'))
 
     def __repr__(self):
-        return f'<Velocity {self.datetime}, {self.Vx}, {self.Vy}, {self.Vz}>'
-    
+        return f'<Velocity {self.namespace}, {self.datetime}, {self.Vx}, {self.Vy}, {self.Vz}>'
+
+MODELS = [Inputs, Position, Rotation, Velocity]
+
+# Fields each GET returns besides 'datetime'
+INPUT_FIELDS = ['X', 'Y', 'Z', 'Roll', 'Pitch', 'Yaw', 'Arm', 'S1', 'S2', 'S3']
+POSITION_FIELDS = ['X', 'Y', 'Z', 'tick', 't_mono']
+ROTATION_FIELDS = ['Roll', 'Pitch', 'Yaw', 'tick', 't_mono']
+VELOCITY_FIELDS = ['Vx', 'Vy', 'Vz', 'tick', 't_mono']
+
+def parse_datetime(text: str) -> datetime:
+    """'%Y-%m-%d %H:%M:%S' with optional fractional seconds (microsecond resolution)."""
+    return datetime.fromisoformat(text)
+
+# Latest row per (table, namespace), kept current by the POST routes, so the per-tick GETs of every env and
+# bridge are answered without a query. Entries are (id, response) and only replaced by a newer id.
+latest_rows: Dict[Tuple[str, str], Tuple[int, Dict[str, Any]]] = {}
+latest_lock = threading.Lock()
+
+def store_latest(record, fields: List[str]) -> None:
+    key = (record.__tablename__, record.namespace)
+    row = {'datetime': record.datetime, **{field: getattr(record, field) for field in fields}}
+    with latest_lock:
+        current = latest_rows.get(key)
+        if current is None or current[0] < record.id:
+            latest_rows[key] = (record.id, row)
+
+def get_latest(model, namespace: str, fields: List[str]):
+    """Latest row of a namespace as a response dict, None when the namespace has no rows."""
+    cached = latest_rows.get((model.__tablename__, namespace))
+    if cached is not None:
+        return cached[1]
+    record = model.query.filter_by(namespace=namespace).order_by(model.id.desc()).first()
+    if record is None:
+        return None
+    store_latest(record, fields)
+    return latest_rows[(model.__tablename__, namespace)][1]
+
 # Routes for inputs data
-@app.route('/inputs', methods=['GET'])
-def get_inputs():
-    latest_input = Inputs.query.order_by(Inputs.id.desc()).first()
+@app.route('/inputs', methods=['GET'], defaults={'namespace': DEFAULT_NAMESPACE})
+@app.route('/<namespace>/inputs', methods=['GET'])
+def get_inputs(namespace):
+    latest_input = get_latest(Inputs, namespace, INPUT_FIELDS)
     if latest_input:
-        return jsonify({
-            'datetime': latest_input.datetime,
-            'X': latest_input.X,
-            'Y': latest_input.Y,
-            'Z': latest_input.Z,
-            'Roll': latest_input.Roll,
-            'Pitch': latest_input.Pitch,
-            'Yaw': latest_input.Yaw,
-            'Arm': latest_input.Arm,
-            'S1': latest_input.S1,
-            'S2': latest_input.S2,
-            'S3': latest_input.S3
-        })
+        return jsonify(latest_input)
     else:
         return jsonify({'message': 'No data available'}), 404
 
-@app.route('/inputs', methods=['POST'])
-def add_input():
+@app.route('/inputs', methods=['POST'], defaults={'namespace': DEFAULT_NAMESPACE})
+@app.route('/<namespace>/inputs', methods=['POST'])
+def add_input(namespace):
     data = request.get_json()
     if not data:
         return jsonify({'message': 'No data provided'}), 400
 
     try:
         new_input = Inputs(
-            datetime=datetime.strptime(data['datetime'], '%Y-%m-%d %H:%M:%S'),
+            namespace=namespace,
+            datetime=parse_datetime(data['datetime']),
             X=data['X'],
             Y=data['Y'],
             Z=data['Z'],
@@ -114,126 +221,255 @@ def add_input():
             Arm=data['Arm'],
             S1=data['S1'],
             S2=data['S2'],
-            S3=data['S3']
+            S3=data['S3'],
+            source=data.get('source')
         )
         db.session.add(new_input)
         db.session.commit()
+        store_latest(new_input, INPUT_FIELDS)
         return jsonify({'message': 'Input data added successfully'}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': str(e)}), 400
     
 # Routes for position data
-@app.route('/position', methods=['GET'])
-def get_position():
-    latest_position = Position.query.order_by(Position.id.desc()).first()
+@app.route('/position', methods=['GET'], defaults={'namespace': DEFAULT_NAMESPACE})
+@app.route('/<namespace>/position', methods=['GET'])
+def get_position(namespace):
+    latest_position = get_latest(Position, namespace, POSITION_FIELDS)
     if latest_position:
-        return jsonify({
-            'datetime': latest_position.datetime,
-            'X': latest_position.X,
-            'Y': latest_position.Y,
-            'Z': latest_position.Z
-        })
+        return jsonify(latest_position)
     else:
         return jsonify({'message': 'No data available'}), 404
 
-@app.route('/position', methods=['POST'])
-def add_position():
+@app.route('/position', methods=['POST'], defaults={'namespace': DEFAULT_NAMESPACE})
+@app.route('/<namespace>/position', methods=['POST'])
+def add_position(namespace):
     data = request.get_json()
     if not data:
         return jsonify({'message': 'No data provided'}), 400
 
     try:
         new_position = Position(
-            datetime=datetime.strptime(data['datetime'], '%Y-%m-%d %H:%M:%S'),
+            namespace=namespace,
+            datetime=parse_datetime(data['datetime']),
             X=data['X'],
             Y=data['Y'],
-            Z=data['Z']
+            Z=data['Z'],
+            tick=data.get('tick'),
+            t_mono=data.get('t_mono')
         )
         db.session.add(new_position)
         db.session.commit()
+        store_latest(new_position, POSITION_FIELDS)
         return jsonify({'message': 'Position data added successfully'}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': str(e)}), 400
     
 # Routes for rotation data
-@app.route('/rotation', methods=['GET'])
-def get_rotation():
-    latest_rotation = Rotation.query.order_by(Rotation.id.desc()).first()
+@app.route('/rotation', methods=['GET'], defaults={'namespace': DEFAULT_NAMESPACE})
+@app.route('/<namespace>/rotation', methods=['GET'])
+def get_rotation(namespace):
+    latest_rotation = get_latest(Rotation, namespace, ROTATION_FIELDS)
     if latest_rotation:
-        return jsonify({
-            'datetime': latest_rotation.datetime,
-            'Roll': latest_rotation.Roll,
-            'Pitch': latest_rotation.Pitch,
-            'Yaw': latest_rotation.Yaw
-        })
+        return jsonify(latest_rotation)
     else:
         return jsonify({'message': 'No data available'}), 404
     
-@app.route('/rotation', methods=['POST'])
-def add_rotation():
+@app.route('/rotation', methods=['POST'], defaults={'namespace': DEFAULT_NAMESPACE})
+@app.route('/<namespace>/rotation', methods=['POST'])
+def add_rotation(namespace):
     data = request.get_json()
     if not data:
         return jsonify({'message': 'No data provided'}), 400
 
     try:
         new_rotation = Rotation(
-            datetime=datetime.strptime(data['datetime'], '%Y-%m-%d %H:%M:%S'),
+            namespace=namespace,
+            datetime=parse_datetime(data['datetime']),
             Roll=data['Roll'],
             Pitch=data['Pitch'],
-            Yaw=data['Yaw']
+            Yaw=data['Yaw'],
+            tick=data.get('tick'),
+            t_mono=data.get('t_mono')
         )
         db.session.add(new_rotation)
         db.session.commit()
+        store_latest(new_rotation, ROTATION_FIELDS)
         return jsonify({'message': 'Rotation data added successfully'}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': str(e)}), 400
     
 # Routes for velocity data
-@app.route('/velocity', methods=['GET'])
-def get_velocity():
-    latest_velocity = Velocity.query.order_by(Velocity.id.desc()).first()
+@app.route('/velocity', methods=['GET'], defaults={'namespace': DEFAULT_NAMESPACE})
+@app.route('/<namespace>/velocity', methods=['GET'])
+def get_velocity(namespace):
+    latest_velocity = get_latest(Velocity, namespace, VELOCITY_FIELDS)
     if latest_velocity:
-        return jsonify({
-            'datetime': latest_velocity.datetime,
-            'Vx': latest_velocity.Vx,
-            'Vy': latest_velocity.Vy,
-            'Vz': latest_velocity.Vz
-        })
+        return jsonify(latest_velocity)
     else:
         return jsonify({'message': 'No data available'}), 404
     
-@app.route('/velocity', methods=['POST'])
-def add_velocity():
+@app.route('/velocity', methods=['POST'], defaults={'namespace': DEFAULT_NAMESPACE})
+@app.route('/<namespace>/velocity', methods=['POST'])
+def add_velocity(namespace):
     data = request.get_json()
     if not data:
         return jsonify({'message': 'No data provided'}), 400
 
     try:
         new_velocity = Velocity(
-            datetime=datetime.strptime(data['datetime'], '%Y-%m-%d %H:%M:%S'),
+            namespace=namespace,
+            datetime=parse_datetime(data['datetime']),
             Vx=data['Vx'],
             Vy=data['Vy'],
-            Vz=data['Vz']
+            Vz=data['Vz'],
+            tick=data.get('tick'),
+            t_mono=data.get('t_mono')
         )
         db.session.add(new_velocity)
         db.session.commit()
+        store_latest(new_velocity, VELOCITY_FIELDS)
         return jsonify({'message': 'Velocity data added successfully'}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': str(e)}), 400
+
+# Namespaces in the store with their row count per table, to find runs across envs
+@app.route('/namespaces', methods=['GET'])
+def get_namespaces():
+    namespaces: Dict[str, Dict[str, int]] = {}
+    for model in MODELS:
+        for namespace, count in db.session.query(model.namespace, db.func.count(model.id)).group_by(model.namespace):
+            namespaces.setdefault(namespace, {})[model.__tablename__] = count
+    return jsonify(namespaces)
     
-# Initialize the database and create tables
-with app.app_context():
-    db.create_all()
+# Reset channel between the env and the bridge. A reset is a transient handshake, not telemetry, so it is
+# kept in memory: the env POSTs /reset with an optional pose and velocity, the bridge sees X-Reset-Pending
+# on its next GET /inputs, applies it in Unity and POSTs the resulting state to /reset/<id>/ack, and the
+# env waits for that with GET /reset/<id>?timeout=<s>. Reset ids are unique across namespaces, each
+# namespace has its own pending queue so a bridge only sees the resets of its own vehicle.
+RESET_FIELDS = ['X', 'Y', 'Z', 'Roll', 'Pitch', 'Yaw', 'Vx', 'Vy', 'Vz']
+resets: Dict[int, Dict[str, Any]] = {}
+reset_pending: Dict[str, List[int]] = {}
+reset_ids = itertools.count(1)
+reset_done = threading.Condition()
+
+def remove_pending(entry: Dict[str, Any]) -> bool:
+    pending = reset_pending.get(entry['namespace'], [])
+    if entry['id'] in pending:
+        pending.remove(entry['id'])
+        return True
+    return False
 
-# Configure the arguments for the Flask app
-parser = argparse.ArgumentParser(description="Flask API for Unity Interface")
-parser.add_argument("--port", type=int, default=5000, help="Port for Flask API")
-parser.add_argument("--host", type=str, default="localhost", help="Host for Flask API")
-args = parser.parse_args()
+@app.route('/reset', methods=['POST'], defaults={'namespace': DEFAULT_NAMESPACE})
+@app.route('/<namespace>/reset', methods=['POST'])
+def add_reset(namespace):
+    data = request.get_json(silent=True) or {}
+    with reset_done:
+        reset_id = next(reset_ids)
+        resets[reset_id] = {
+            'id': reset_id,
+            'namespace': namespace,
+            'status': 'pending',
+            'pose': data.get('pose'),
+            'velocity': data.get('velocity'),
+            'requested': time.time(),
+            'result': None,
+        }
+        reset_pending.setdefault(namespace, []).append(reset_id)
+        # Keep the last few finished resets around for late readers
+        for old_id in [i for i in resets if i < reset_id - 100 and resets[i]['status'] == 'done']:
+            del resets[old_id]
+    return jsonify({'message': 'Reset requested', 'id': reset_id}), 201
+
+@app.route('/reset/pending', methods=['GET'], defaults={'namespace': DEFAULT_NAMESPACE})
+@app.route('/<namespace>/reset/pending', methods=['GET'])
+def get_pending_reset(namespace):
+    with reset_done:
+        pending = reset_pending.get(namespace)
+        if pending:
+            return jsonify(resets[pending[0]])
+    return jsonify({'message': 'No reset pending'}), 404
+
+@app.route('/reset/<int:reset_id>/ack', methods=['POST'], defaults={'namespace': DEFAULT_NAMESPACE})
+@app.route('/<namespace>/reset/<int:reset_id>/ack', methods=['POST'])
+def ack_reset(namespace, reset_id):
+    data = request.get_json(silent=True) or {}
+    with reset_done:
+        entry = resets.get(reset_id)
+        if entry is None:
+            return jsonify({'message': f'Unknown reset {reset_id}'}), 404
+        try:
+            entry['result'] = {k: float(data[k]) for k in RESET_FIELDS}
+        except (KeyError, TypeError, ValueError) as e:
+            return jsonify({'message': f'Invalid acknowledgment: {e}'}), 400
+        entry['status'] = 'done'
+        entry['acked'] = time.time()
+        remove_pending(entry)
+        reset_done.notify_all()
+    return jsonify({'message': 'Reset acknowledged'}), 201
+
+@app.route('/reset/<int:reset_id>', methods=['DELETE'], defaults={'namespace': DEFAULT_NAMESPACE})
+@app.route('/<namespace>/reset/<int:reset_id>', methods=['DELETE'])
+def cancel_reset(namespace, reset_id):
+    # Withdraw a reset the env gave up waiting for, so a bridge that comes back later does not apply it
+    with reset_done:
+        entry = resets.get(reset_id)
+        if entry is None:
+            return jsonify({'message': f'Unknown reset {reset_id}'}), 404
+        if remove_pending(entry):
+            entry['status'] = 'cancelled'
+            reset_done.notify_all()
+        return jsonify(entry)
+
+@app.route('/reset/<int:reset_id>', methods=['GET'], defaults={'namespace': DEFAULT_NAMESPACE})
+@app.route('/<namespace>/reset/<int:reset_id>', methods=['GET'])
+def get_reset(namespace, reset_id):
+    # Long poll: wait up to timeout seconds for the acknowledgment, 202 while it is still pending
+    timeout = min(request.args.get('timeout', 0.0, type=float), 30.0)
+    with reset_done:
+        entry = resets.get(reset_id)
+        if entry is None:
+            return jsonify({'message': f'Unknown reset {reset_id}'}), 404
+        reset_done.wait_for(lambda: entry['status'] != 'pending', timeout=timeout)
+        return jsonify(entry), 200 if entry['status'] == 'done' else 202
+
+# Initialize the database and create tables. Called when the server starts rather than at import time,
+# so importing the models (e.g. for an import time report) has no side effects.
+# Databases from older versions get the missing columns (namespace, whose existing rows become 'default',
+# tick and t_mono, NULL for existing rows) and indexes added in place.
+def init_db():
+    with app.app_context():
+        db.create_all()
+        inspector = db.inspect(db.engine)
+        with db.engine.begin() as connection:
+            for model in MODELS:
+                existing = {column['name'] for column in inspector.get_columns(model.__tablename__)}
+                for column in model.__table__.columns:
+                    if column.name in existing:
+                        continue
+                    ddl = f"ALTER TABLE {model.__tablename__} ADD COLUMN {column.name} {column.type.compile(dialect=db.engine.dialect)}"
+                    if column.server_default is not None:
+                        ddl += f" NOT NULL DEFAULT '{column.server_default.arg}'"
+                    connection.execute(db.text(ddl))
+        for model in MODELS:
+            for index in model.__table__.indexes:
+                index.create(db.engine, checkfirst=True)
 
 if __name__ == "__main__":
-    app.run(host=args.host, port=args.port, debug=False)
+    # Configure the arguments for the Flask app
+    parser = argparse.ArgumentParser(description="Flask API for Unity Interface")
+    parser.add_argument("--port", type=int, default=5000, help="Port for Flask API")
+    parser.add_argument("--host", type=str, default="localhost", help="Host for Flask API")
+    args = parser.parse_args()
+
+    # Redirect stdout and stderr
+    sys.stdout = open(os.devnull, 'w')
+    sys.stderr = open(os.devnull, 'w')
+
+    init_db()
+    # threaded: GET /reset/<id> long polls while the bridge acknowledges
+    app.run(host=args.host, port=args.port, debug=False, threaded=True)
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Dict, Optional, Tuple
 import numpy as np
 import gymnasium as gym
 from dataclasses import dataclass
@@ -8,11 +8,18 @@ import json
 import logging
 from datetime import datetime
 
+from TelemetryReader import STATE_FIELDS
+from PathLibrary import ExpertPath, load_library
+from Scoring import REWARD_WEIGHTS, tracking_errors, tracking_reward
+import Metrics
+from Metrics import span
+from LogPackage import LoggerHelper
+
 
 class HelperFunctions:
     def get_updates(self, url: str):
         request = requests.get(url=url)
-        if request.status_code == 201:  # expected from Unity interface
+        if request.status_code in (200, 201):  # DBPackage answers GETs with 200
             return request.json()
         else:
             raise Exception(f"Error: {request.status_code} - {request.text}")
@@ -25,39 +32,6 @@ class HelperFunctions:
             raise Exception(f"Error: {request.status_code} - {request.text}")
 
 
-class LoggerHelper:
-    @staticmethod
-    def setup_logger(name: str, log_dir: str = "logs", log_level=logging.INFO, to_file=True) -> logging.Logger:
-        """
-        Sets up a logger that outputs to both console and a timestamped file.
-        """
-        os.makedirs(log_dir, exist_ok=True)
-        logger = logging.getLogger(name)
-        logger.setLevel(log_level)
-
-        if logger.hasHandlers():
-            logger.handlers.clear()
-
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-
-        # Console handler
-        ch = logging.StreamHandler()
-        ch.setLevel(log_level)
-        ch.setFormatter(formatter)
-        logger.addHandler(ch)
-
-        # File handler
-        if to_file:
-            timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-            log_filename = os.path.join(log_dir, f"{name}_{timestamp}.log")
-            fh = logging.FileHandler(log_filename)
-            fh.setLevel(log_level)
-            fh.setFormatter(formatter)
-            logger.addHandler(fh)
-
-        return logger
-
-
 @dataclass
 class AUVState:
     X: float
@@ -89,17 +63,79 @@ class AUVState:
         )
 
 
+# Pose fields of a reset request, in DBPackage naming
+POSE_FIELDS = ["X", "Y", "Z", "Roll", "Pitch", "Yaw"]
+
+# How reset() places the vehicle: 'restart' the game's start position, 'pose' the configured start_pose,
+# 'path' the first waypoint of the expert path, 'random_waypoint' a random waypoint (the episode continues
+# from there along the path). None keeps the vehicle where it is and only re-reads the state.
+START_MODES = (None, "restart", "pose", "path", "random_waypoint")
+
+
 class AUVEnv(gym.Env):
-    def __init__(self, position_url, rotation_url, velocity_url, inputs_url):
-        self.logger = LoggerHelper.setup_logger("AUVEnv")
+    def __init__(self, position_url, rotation_url, velocity_url, inputs_url,
+                 path_library: Optional[str] = None, path_selection: str = "random",
+                 path_id: Optional[str] = None, curriculum_episodes: int = 100, metrics_port: Optional[int] = None,
+                 log_level: int = logging.INFO, log_json: bool = False, step_log_rate: Optional[float] = 1.0,
+                 start_mode: Optional[str] = "restart", start_pose: Optional[Dict[str, float]] = None,
+                 start_noise: Optional[Dict[str, float]] = None, reset_url: Optional[str] = None,
+                 reset_timeout: float = 5.0, reward_weights: Optional[Dict[str, float]] = None):
+        """
+        @param path_library: Directory of expert paths (see PathLibrary). None uses the single
+                             expert_paths/path_1.json file.
+        @param path_selection: How reset() picks a path from the library: 'random', 'curriculum' or 'id'.
+        @param path_id: Path used when path_selection is 'id'.
+        @param curriculum_episodes: Episodes until every path is unlocked in 'curriculum' mode.
+        @param metrics_port: Serve the step timings on http://<host>:<metrics_port>/metrics when set.
+        @param log_level: Level of the AUVEnv logger, per step records are logged at DEBUG.
+        @param log_json: Write the log as JSON lines.
+        @param step_log_rate: Per step records logged per second at most, None logs every step.
+        @param start_mode: Where reset() places the vehicle, see START_MODES.
+        @param start_pose: X/Y/Z/Roll/Pitch/Yaw for start_mode 'pose'.
+        @param start_noise: Half range of uniform noise added per pose field (e.g. {"X": 0.5, "Yaw": 10})
+                            to the start pose of every mode except 'restart'.
+        @param reset_url: DBPackage reset channel, default is /reset next to position_url.
+        @param reset_timeout: Seconds to wait for the bridge to acknowledge a reset.
+        @param reward_weights: Overrides of REWARD_WEIGHTS, e.g. {"rotation": 0.2}.
+        """
+        if start_mode not in START_MODES:
+            raise ValueError(f"start_mode must be one of {START_MODES}, got {start_mode}")
+        if start_mode == "pose" and start_pose is None:
+            raise ValueError("start_mode 'pose' needs a start_pose")
+        unknown = set(reward_weights or {}) - set(REWARD_WEIGHTS)
+        if unknown:
+            raise ValueError(f"Unknown reward weights {sorted(unknown)}, expected {sorted(REWARD_WEIGHTS)}")
+        self.logger = LoggerHelper.setup_logger("AUVEnv", log_level=log_level, json_lines=log_json,
+                                                rate_limit=step_log_rate)
         self.logger.info("Initializing AUVEnv...")
 
+        if metrics_port:
+            Metrics.set_component("env")
+            Metrics.serve_metrics(metrics_port)
+
         self.position_url = position_url
         self.rotation_url = rotation_url
         self.velocity_url = velocity_url
         self.inputs_url = inputs_url
-
-        self.expert_path = self.load_expert_path()
+        self.reset_url = reset_url or position_url.rsplit("/", 1)[0] + "/reset"
+
+        self.start_mode = start_mode
+        self.start_pose = start_pose
+        self.start_noise = start_noise or {}
+        self.reset_timeout = reset_timeout
+        self.reward_weights = {**REWARD_WEIGHTS, **(reward_weights or {})}
+
+        self.path_selection = path_selection
+        self.path_id = path_id
+        self.curriculum_episodes = curriculum_episodes
+        self.episode = 0
+        if path_library is not None:
+            self.library = load_library(path_library)
+            self.logger.info("Loaded expert path library with %d paths.", len(self.library))
+            self.expert_path = self.library.select(np.random.default_rng(), path_selection, path_id, 0.0)
+        else:
+            self.library = None
+            self.expert_path = ExpertPath.from_array("path_1", self.load_expert_path())
         self.max_steps = len(self.expert_path)
         self.step_idx = 0
 
@@ -116,17 +152,88 @@ class AUVEnv(gym.Env):
         self.logger.info("AUVEnv initialized.")
 
     def reset(self, *, seed: Optional[int] = None, options: Optional[dict] = None):
+        """
+        @param options: 'path_selection'/'path_id' override the path choice, 'pose' (X..Yaw) starts there,
+                        'waypoint' starts at that waypoint of the path, 'snapshot' (from snapshot()) restores
+                        the vehicle state, path and step of an earlier episode.
+        """
         super().reset(seed=seed)
-        self.logger.info("Environment reset.")
+        options = options or {}
+        snapshot = options.get("snapshot")
+        if snapshot is not None:
+            if self.library is not None:
+                self.expert_path = self.library.get(snapshot["path_id"])
+        elif self.library is not None:
+            progress = self.episode / max(1, self.curriculum_episodes)
+            self.expert_path = self.library.select(self.np_random, options.get("path_selection", self.path_selection),
+                                                   options.get("path_id", self.path_id), progress)
+        self.max_steps = len(self.expert_path)
+        self.episode += 1
+        self.logger.info("Environment reset. Expert path: %s", self.expert_path.id)
         self.done = False
-        self.step_idx = 0
-        self.state = self._get_current_state()
+
+        pose, velocity, self.step_idx = self._start_state(options)
+        with span("env_reset"):
+            if pose is None and self.start_mode is None:
+                self.state = self._get_current_state()
+            else:
+                self.state = self._reset_vehicle(pose, velocity)
         return self._get_observation(), self.info
 
-    def step(self, action):
-        action = np.clip(action, -1.0, 1.0)
+    def snapshot(self) -> dict:
+        """Vehicle state, expert path and step of the running episode, for reset(options={"snapshot": ...})."""
+        return {"path_id": self.expert_path.id, "step": self.step_idx, "state": self.state.to_dict()}
+
+    def _start_state(self, options: dict) -> Tuple[Optional[Dict[str, float]], Optional[Dict[str, float]], int]:
+        """Start pose (None for the game's start position), start velocity and path step of the next episode."""
+        waypoints = self.expert_path.waypoints
+        if "snapshot" in options:
+            state = AUVState.from_dict(options["snapshot"]["state"])
+            pose = {k: float(getattr(state, k)) for k in POSE_FIELDS}
+            velocity = {"Vx": float(state.S1), "Vy": float(state.S2), "Vz": float(state.S3)}
+            # Restores exactly, without start noise
+            return pose, velocity, int(options["snapshot"]["step"])
+
+        step, velocity = 0, None
+        if "pose" in options:
+            pose = dict(options["pose"])
+        elif "waypoint" in options or self.start_mode in ("path", "random_waypoint"):
+            if "waypoint" in options:
+                step = int(options["waypoint"])
+            elif self.start_mode == "random_waypoint":
+                step = int(self.np_random.integers(0, max(1, len(waypoints) - 1)))
+            waypoint = waypoints[step]
+            pose = {k: float(v) for k, v in zip(POSE_FIELDS, waypoint[0:6])}
+            velocity = {k: float(v) for k, v in zip(("Vx", "Vy", "Vz"), waypoint[6:9])}
+        elif self.start_mode == "pose":
+            pose = dict(self.start_pose)
+        else:
+            return None, None, 0
+
+        for key, half_range in self.start_noise.items():
+            pose[key] += float(self.np_random.uniform(-half_range, half_range))
+        return pose, velocity, step
+
+    def _reset_vehicle(self, pose: Optional[Dict[str, float]], velocity: Optional[Dict[str, float]]) -> AUVState:
+        """Request a reset from the bridge through the DBPackage and wait for its acknowledgment."""
+        # Neutral command first, so the bridge does not apply the last action of the previous episode after the reset
+        self.helper.set_updates(self.inputs_url, self._command(np.zeros(9, dtype=np.float32)))
+        reset_id = self.helper.set_updates(self.reset_url, {"pose": pose, "velocity": velocity})["id"]
+        response = requests.get(f"{self.reset_url}/{reset_id}", params={"timeout": self.reset_timeout})
+        if response.status_code != 200:
+            requests.delete(f"{self.reset_url}/{reset_id}")
+            raise TimeoutError(f"Bridge did not acknowledge reset {reset_id} within {self.reset_timeout} s "
+                               f"({response.status_code} - {response.text})")
+        result = response.json()["result"]
+        return AUVState(
+            X=result["X"], Y=result["Y"], Z=result["Z"],
+            Roll=result["Roll"], Pitch=result["Pitch"], Yaw=result["Yaw"],
+            S1=result["Vx"], S2=result["Vy"], S3=result["Vz"],
+            Arm=0
+        )
 
-        command = {
+    def _command(self, action) -> dict:
+        return {
             "X": float(action[0]),
             "Y": float(action[1]),
             "Z": float(action[2]),
@@ -136,49 +243,46 @@ class AUVEnv(gym.Env):
             "S1": float(action[6]),
             "S2": float(action[7]),
             "S3": float(action[8]),
-            "Arm": 0
+            "Arm": 0,
+            "source": "policy",
+            "datetime": datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
         }
 
-        self.logger.debug(f"Sending action: {command}")
-        self.helper.set_updates(self.inputs_url, command)
+    def step(self, action):
+        with span("env_step"):
+            return self._step(action)
 
-        self.state = self._get_current_state()
-        self.reward = self._calculate_reward()
+    def _step(self, action):
+        action = np.clip(action, -1.0, 1.0)
 
-        self.logger.debug(f"Step {self.step_idx} | Reward: {self.reward:.3f} | State: {self.state}")
+        command = self._command(action)
+
+        self.logger.debug("Sending action: %s", command)
+        with span("env_send_action"):
+            self.helper.set_updates(self.inputs_url, command)
+
+        with span("env_get_state"):
+            self.state = self._get_current_state()
+        with span("env_reward"):
+            self.reward = self._calculate_reward()
+
+        self.logger.debug("Step %d | Reward: %.3f | State: %s", self.step_idx, self.reward, self.state)
 
         self.step_idx += 1
-        self.done = self.step_idx >= self.max_steps
+        # Running out of expert path is a time limit, not a terminal state
+        truncated = self.step_idx >= self.max_steps
+        self.done = truncated
 
-        return self._get_observation(), self.reward, self.done, self.info
+        return self._get_observation(), self.reward, False, truncated, self.info
 
     def _calculate_reward(self):
-        current_pos = np.array([self.state.X, self.state.Y, self.state.Z])
-        current_rot = np.array([self.state.Roll, self.state.Pitch, self.state.Yaw])
-        current_vel = np.array([self.state.S1, self.state.S2, self.state.S3])
-
-        closest = None
-        min_dist = float('inf')
-
-        for waypoint in self.expert_path:
-            target_pos = np.array([waypoint["X"], waypoint["Y"], waypoint["Z"]])
-            dist = np.linalg.norm(current_pos - target_pos)
-            if dist < min_dist:
-                min_dist = dist
-                closest = waypoint
-
-        if closest:
-            rot_err = np.linalg.norm(current_rot - np.array([
-                closest["Roll"], closest["Pitch"], closest["Yaw"]
-            ]))
-            vel_err = np.linalg.norm(current_vel - np.array([
-                closest["vel_x"], closest["vel_y"], closest["vel_z"]
-            ]))
-        else:
-            rot_err = 0
-            vel_err = 0
+        state = self._get_observation()[:9]
 
-        return -min_dist - 0.1 * rot_err - 0.05 * vel_err
+        if len(self.expert_path) == 0:
+            return 0.0
+        # Same error terms as offline scoring (Scoring.score_trajectory), for a single state
+        closest = self.expert_path.waypoints[self.expert_path.nearest(state[:3])]
+        return float(tracking_reward(tracking_errors(state, closest), self.reward_weights)[0])
 
     def _get_current_state(self):
         pos = self.helper.get_updates(self.position_url)
@@ -188,7 +292,7 @@ class AUVEnv(gym.Env):
         return AUVState(
             X=pos["X"], Y=pos["Y"], Z=pos["Z"],
             Roll=rot["Roll"], Pitch=rot["Pitch"], Yaw=rot["Yaw"],
-            S1=vel["S1"], S2=vel["S2"], S3=vel["S3"],
+            S1=vel["Vx"], S2=vel["Vy"], S3=vel["Vz"],
             Arm=0
         )
 
@@ -201,12 +305,13 @@ class AUVEnv(gym.Env):
         ], dtype=np.float32)
 
     def load_expert_path(self):
-        path = os.path.join(os.path.dirname(__file__), "expert_paths/path_1.json")
+        """Load expert_paths/path_1.json (repository root) as an (N, 9) array in STATE_FIELDS order."""
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "expert_paths/path_1.json")
         if os.path.exists(path):
             with open(path, "r") as f:
                 data = json.load(f)
-                self.logger.info(f"Loaded expert path with {len(data)} waypoints.")
-                return data
+                self.logger.info("Loaded expert path with %d waypoints.", len(data))
+                return np.array([[waypoint[k] for k in STATE_FIELDS] for waypoint in data], dtype=np.float32).reshape(-1, 9)
         else:
-            self.logger.error(f"Expert path file not found: {path}")
+            self.logger.error("Expert path file not found: %s", path)
             raise FileNotFoundError(f"Expert path file not found: {path}")
@@ -1,8 +1,19 @@
 import time
+import logging
+import itertools
+from datetime import datetime
 import requests
 import argparse
 from dataclasses import dataclass
-from peaceful_pie.unity_comms import UnityComms
+from typing import Optional, Tuple
+from peaceful_pie.unity_comms import UnityComms, CSException
+
+import Metrics
+from Metrics import span
+from LogPackage import LoggerHelper
+
+# Configured in __main__; per tick records are rate limited there so the loop never waits on the console
+logger = logging.getLogger("bridge")
 
 # These dataclasses are used to represent the submarine's position, rotation, and velocity.
 # They are supposed to match the structure of the data returned by Unity.
@@ -27,14 +38,39 @@ class SubVel:
     pitch: float
     yaw: float
 
+# Result of the combined getSubState / setSubSetVelAndGetState RPCs: all three readings of one physics frame
+@dataclass
+class SubState:
+    position: SubPos
+    rotation: SubRot
+    velocity: SubVel
+
+
+# rpc_mode values: 'combined' reads the state with one RPC per tick (and applies the command in the same
+# call), 'separate' uses getSubPos/getSubRot/getSubMeasuredVel/setSubSetVel, 'auto' tries the combined RPC
+# once and falls back to the separate calls for game builds that do not have it
+RPC_MODES = ("auto", "combined", "separate")
+
 
 class unityInterface:
-    def __init__(self, unity_port: str = 9999, inputs_url: str = '127.0.0.1', inputs_port: int = 9999) -> None:
+    def __init__(self, unity_port: str = 9999, inputs_url: str = '127.0.0.1', inputs_port: int = 9999,
+                 rpc_mode: str = "auto", namespace: Optional[str] = None) -> None:
+        if rpc_mode not in RPC_MODES:
+            raise ValueError(f"rpc_mode must be one of {RPC_MODES}, got {rpc_mode}")
+        self.rpc_mode = rpc_mode
         self.unity_comms = UnityComms(port=unity_port)
-        self.url = f'http://{inputs_url}:{inputs_port}/inputs'
-        self.pos_url = f'http://{inputs_url}:{inputs_port}/position'
-        self.rot_url = f'http://{inputs_url}:{inputs_port}/rotation'
-        self.vel_url = f'http://{inputs_url}:{inputs_port}/velocity'
+        # With a namespace this bridge is one of several vehicles sharing a DBPackage
+        base_url = f'http://{inputs_url}:{inputs_port}' + (f'/{namespace}' if namespace else '')
+        self.url = f'{base_url}/inputs'
+        self.pos_url = f'{base_url}/position'
+        self.rot_url = f'{base_url}/rotation'
+        self.vel_url = f'{base_url}/velocity'
+        self.reset_url = f'{base_url}/reset'
+        self.armed = False
+        self.pending_reset = None
+        # Tick ids are seeded from the wall clock in ms, so they keep increasing across bridge restarts
+        # (ticks are slower than 1 ms) and the rows of two runs never share an id
+        self.ticks = itertools.count(int(time.time() * 1000))
 
     def get_submarine_position(self) -> SubPos:
         """Get the submarine position from Unity."""
@@ -64,18 +100,90 @@ class unityInterface:
         velocity.x = velocity.x * -1
         self.unity_comms.setSubSetVel(subSetVel=velocity)
 
-    def restart_sub_position(self, data) -> None:
-        """Restart the submarine position in Unity."""
-        if data['arm']:
-            pass
+    def get_submarine_state(self, velocity: SubVel = None) -> Tuple[SubPos, SubRot, SubVel]:
+        """
+        @brief Read position, rotation and velocity with one RPC, applying velocity (same convention as
+               set_submarine_velocity) in the same call when given.
+        @param velocity: Command to apply before the state is read, or None to only read.
+        @return (position, rotation, velocity) of the same physics frame.
+        """
+        if velocity is None:
+            state: SubState = self.unity_comms.getSubState(ResultClass=SubState)
         else:
+            velocity.x = velocity.x * -1
+            state: SubState = self.unity_comms.setSubSetVelAndGetState(subSetVel=velocity, ResultClass=SubState)
+        return state.position, state.rotation, state.velocity
+
+    def resolve_rpc_mode(self) -> str:
+        """Probe the game for the combined RPC in 'auto' mode and settle on 'combined' or 'separate'."""
+        if self.rpc_mode == "auto":
+            try:
+                self.unity_comms.getSubState(ResultClass=SubState)
+                self.rpc_mode = "combined"
+            except CSException:
+                logger.warning("Unity has no getSubState RPC, using separate position/rotation/velocity calls")
+                self.rpc_mode = "separate"
+        return self.rpc_mode
+
+    def restart_sub_position(self, data) -> None:
+        """Restart the submarine position in Unity when the operator disarms."""
+        # Only on the armed -> disarmed edge: a source that keeps sending Arm 0 (the env) must not put the
+        # sub back at the start every tick. Episode resets go through the reset channel instead
+        if self.armed and not data['arm']:
             self.unity_comms.restartPosition()
+        self.armed = bool(data['arm'])
+
+    def apply_reset(self, reset: dict) -> None:
+        """
+        @brief Apply a reset requested through the DBPackage reset channel: set the requested pose and
+               velocity (setSubState), or the game's start position (restartPosition) when no pose is given.
+        @param reset: Entry from GET /reset/pending.
+        """
+        pose, velocity = reset.get('pose'), reset.get('velocity') or {}
+        if pose is None:
+            self.unity_comms.restartPosition()
+            return
+        state = SubState(
+            position=SubPos(x=pose['X'], y=pose['Y'], z=pose['Z']),
+            rotation=SubRot(roll=pose['Roll'], pitch=pose['Pitch'], yaw=pose['Yaw']),
+            velocity=SubVel(x=velocity.get('Vx', 0.0), y=velocity.get('Vy', 0.0), z=velocity.get('Vz', 0.0),
+                            roll=0.0, pitch=0.0, yaw=0.0),
+        )
+        try:
+            self.unity_comms.setSubState(state=state)
+        except CSException:
+            logger.warning("Unity has no setSubState RPC, resetting to the start position instead of %s", pose)
+            self.unity_comms.restartPosition()
+
+    def handle_reset(self) -> None:
+        """Apply the pending reset, publish the new state and acknowledge it with that state."""
+        response = requests.get(self.reset_url + '/pending')
+        self.pending_reset = None
+        if response.status_code != 200:
+            return
+        reset = response.json()
+        self.apply_reset(reset)
+        if self.rpc_mode == "combined":
+            sub_pos, sub_rot, sub_vel = self.get_submarine_state()
+        else:
+            sub_pos, sub_rot, sub_vel = self.get_submarine_position(), self.get_submarine_rotation(), self.get_submarine_velocity()
+        # Post first so the env's next state read already sees the new pose
+        self.post_data(sub_vel, sub_pos, sub_rot)
+        ack = {
+            'X': sub_pos.x, 'Y': sub_pos.y, 'Z': sub_pos.z,
+            'Roll': sub_rot.roll, 'Pitch': sub_rot.pitch, 'Yaw': sub_rot.yaw,
+            'Vx': sub_vel.x, 'Vy': sub_vel.y, 'Vz': sub_vel.z,
+        }
+        post_request = requests.post(f"{self.reset_url}/{reset['id']}/ack", json=ack)
+        if post_request.status_code != 201:
+            logger.warning("Failed to acknowledge reset %s. Status code: %s", reset['id'], post_request.status_code)
 
     def get_data(self) -> SubVel:
         """Get the input data from the RL server."""
         """This method should be used during testing to get the input data from the RL server."""
         """It fetches the data from the specified URL and converts it into a SubVel dataclass instance."""
         response = requests.get(self.url)
+        self.pending_reset = response.headers.get('X-Reset-Pending')
         if response.status_code == 200:
             data = response.json()
             if isinstance(data, list) and data:
@@ -89,16 +197,29 @@ class unityInterface:
                 return SubVel(**data)
         return None
     
-    def post_data(self, subvel : SubVel, subpos : SubPos, subrot : SubRot) -> None:
+    def stamp(self) -> dict:
+        """
+        @brief Timestamps of a state read: a tick id shared by the three rows of the tick, the monotonic
+               time and the wall clock with microseconds.
+        """
+        return {
+            'datetime': datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f'),
+            'tick': next(self.ticks),
+            't_mono': time.monotonic(),
+        }
+
+    def post_data(self, subvel : SubVel, subpos : SubPos, subrot : SubRot, stamp: Optional[dict] = None) -> None:
         """
         @brief Post the submarine's position, rotation, and velocity to the DBPackage.
         @param subvel: The submarine's velocity.
         @param subpos: The submarine's position.
         @param subrot: The submarine's rotation.
+        @param stamp: stamp() taken when the state was read, default now.
         @return None
         """
+        stamp = stamp or self.stamp()
         pos_data = {
-            'datetime': time.strftime('%Y-%m-%d %H:%M:%S'),
+            **stamp,
             'X': subpos.x,
             'Y': subpos.y,
             'Z': subpos.z
@@ -108,9 +229,9 @@ class unityInterface:
             # print("Position data sent successfully.")
             pass
         else:
-            print(f"Failed to send position data. Status code: {post_request.status_code}")
+            logger.warning("Failed to send position data. Status code: %s", post_request.status_code)
         rot_data = {
-            'datetime': time.strftime('%Y-%m-%d %H:%M:%S'),
+            **stamp,
             'Roll': subrot.roll,
             'Pitch': subrot.pitch,
             'Yaw': subrot.yaw
@@ -120,9 +241,9 @@ class unityInterface:
             # print("Rotation data sent successfully.")
             pass
         else:
-            print(f"Failed to send rotation data. Status code: {post_request.status_code}")
+            logger.warning("Failed to send rotation data. Status code: %s", post_request.status_code)
         vel_data = {
-            'datetime': time.strftime('%Y-%m-%d %H:%M:%S'),
+            **stamp,
             'Vx': subvel.x,
             'Vy': subvel.y,
             'Vz': subvel.z,
@@ -135,28 +256,52 @@ class unityInterface:
             # print("Velocity data sent successfully.")
             pass
         else:
-            print(f"Failed to send velocity data. Status code: {post_request.status_code}")
+            logger.warning("Failed to send velocity data. Status code: %s", post_request.status_code)
         # print(f"Data sent successfully: {data}")
     
-    def run(self) -> None:
-        while True:
-            # Get the submarine position, rotation, and velocity from Unity
-            sub_pos = self.get_submarine_position()
-            sub_rot = self.get_submarine_rotation()
-            sub_vel = self.get_submarine_velocity()
-
+    def tick(self) -> None:
+        """One bridge iteration: read Unity state, apply the latest inputs, post the state."""
+        if self.rpc_mode == "auto":
+            self.resolve_rpc_mode()
+        with span("bridge_tick"):
             # Get the input data from the RL server
-            input_data = self.get_data()
-            if input_data:
-                # Set the submarine's velocity in Unity
-                self.set_submarine_velocity(input_data)
+            with span("bridge_get_inputs"):
+                input_data = self.get_data()
+            if self.pending_reset:
+                # A reset replaces this tick, the polled inputs predate it and are not applied
+                with span("bridge_reset"):
+                    self.handle_reset()
+                return
+
+            if self.rpc_mode == "combined":
+                # Apply the inputs and read the state in one RPC
+                with span("bridge_unity_get_state"):
+                    sub_pos, sub_rot, sub_vel = self.get_submarine_state(input_data)
+                stamp = self.stamp()
+            else:
+                # Get the submarine position, rotation, and velocity from Unity
+                with span("bridge_unity_get_position"):
+                    sub_pos = self.get_submarine_position()
+                with span("bridge_unity_get_rotation"):
+                    sub_rot = self.get_submarine_rotation()
+                with span("bridge_unity_get_velocity"):
+                    sub_vel = self.get_submarine_velocity()
+                stamp = self.stamp()
+                if input_data:
+                    # Set the submarine's velocity in Unity
+                    with span("bridge_unity_set_velocity"):
+                        self.set_submarine_velocity(input_data)
 
             # Post the submarine's position, rotation, and velocity to the DBPackage
-            self.post_data(sub_vel, sub_pos, sub_rot)
+            with span("bridge_post_state"):
+                self.post_data(sub_vel, sub_pos, sub_rot, stamp)
 
-            # Print the submarine's position, rotation, and velocity
-            print(f"Position: {sub_pos}, Rotation: {sub_rot}, Velocity: {sub_vel}, Inputs: {input_data}")
+        # Log the submarine's position, rotation, and velocity
+        logger.info("Position: %s, Rotation: %s, Velocity: %s, Inputs: %s", sub_pos, sub_rot, sub_vel, input_data)
 
+    def run(self) -> None:
+        while True:
+            self.tick()
             time.sleep(0.1) # Sleep for a short duration to avoid overwhelming the server
 
 if __name__ == "__main__":
@@ -164,8 +309,22 @@ if __name__ == "__main__":
     parser.add_argument("--unity_port", type=int, default=9999, help="Port for Unity communication")
     parser.add_argument("--inputs_url", type=str, default="localhost", help="URL for RL server")
     parser.add_argument("--inputs_port", type=int, default=5000, help="Port for RL server")
+    parser.add_argument("--namespace", type=str, default=None, help="DBPackage namespace of this vehicle when several share one store (default: none)")
+    parser.add_argument("--metrics_port", type=int, default=9101, help="Port for the /metrics endpoint, 0 disables it")
+    parser.add_argument("--rpc", type=str, default="auto", choices=RPC_MODES, help="Unity state RPCs: one combined call per tick or the separate calls (default: auto)")
+    parser.add_argument("--log_rate", type=float, default=1.0, help="Per tick log records per second (default: 1), 0 silences them")
+    parser.add_argument("--log_json", action="store_true", help="Log JSON lines instead of plain text")
+    parser.add_argument("--log_dir", type=str, default=None, help="Also log to a timestamped file in this directory")
+    parser.add_argument("--log_level", type=str, default="INFO", help="Log level (default: INFO)")
     args = parser.parse_args()
 
-    unity_interface = unityInterface(args.unity_port, args.inputs_url, args.inputs_port)
+    LoggerHelper.setup_logger("bridge", log_dir=args.log_dir, log_level=args.log_level.upper(), to_file=args.log_dir is not None,
+                              json_lines=args.log_json, rate_limit=args.log_rate, rate_limit_level=logging.WARNING)
+
+    Metrics.set_component("bridge")
+    if args.metrics_port:
+        Metrics.serve_metrics(args.metrics_port)
+
+    unity_interface = unityInterface(args.unity_port, args.inputs_url, args.inputs_port, args.rpc, args.namespace)
     
     unity_interface.run()
\ No newline at end of file
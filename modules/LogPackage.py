@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from logging.handlers import QueueHandler, QueueListener
+
+# Logging for the control loops (AUVEnv, bridge). In async mode the logging call only puts the record on
+# a bounded queue; formatting and console/file I/O happen on a listener thread, and records are dropped
+# (and counted) instead of blocking when the queue is full. Use %-style arguments
+# (logger.debug("State: %s", state)) so nothing is formatted for records that are filtered out, and pass
+# objects that are not mutated afterwards since they are formatted later on the listener thread.
+
+# Attributes every LogRecord has, anything else was passed through extra= and is written as a JSON field
+_RECORD_ATTRS = set(logging.LogRecord("", 0, "", 0, "", None, None).__dict__) | {"message", "asctime", "taskName"}
+
+# Listener per logger name, so calling setup_logger again replaces it instead of leaking a thread
+_listeners: Dict[str, QueueListener] = {}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any extra= fields."""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="microseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket per message template (the unformatted msg), so a per-step log call passes at most
+    rate times per second with bursts of burst records (rate 0 drops them). Records above max_level always pass. The number of
+    records suppressed since the last one that passed is attached as record.suppressed.
+    """
+    def __init__(self, rate: float, burst: int = 1, max_level: int = logging.INFO):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.max_level = max_level
+        self._buckets: Dict[str, Tuple[float, float, int]] = {}  # msg -> (tokens, last time, suppressed)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.max_level:
+            return True
+        if self.rate <= 0:
+            return False
+        now = time.monotonic()
+        tokens, last, suppressed = self._buckets.get(record.msg, (self.burst, now, 0))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens < 1.0:
+            self._buckets[record.msg] = (tokens, now, suppressed + 1)
+            return False
+        self._buckets[record.msg] = (tokens - 1.0, now, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks the caller: records are dropped when the queue is full."""
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The listener runs in this process, so the record is passed as is and formatted on its thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LoggerHelper:
+    @staticmethod
+    def setup_logger(name: str, log_dir: Optional[str] = "logs", log_level=logging.INFO, to_file=True,
+                     async_mode: bool = True, json_lines: bool = False, rate_limit: Optional[float] = None,
+                     rate_limit_level: int = logging.DEBUG, queue_size: int = 10000) -> logging.Logger:
+        """
+        Sets up a logger that outputs to both console and a timestamped file.
+        @param async_mode: Hand records to a background listener thread through a bounded queue.
+        @param json_lines: Write JSON lines instead of plain text.
+        @param rate_limit: Records per second allowed per message template at or below rate_limit_level
+                           (per step/tick logs), None disables the limit.
+        @param queue_size: Records buffered for the listener before new ones are dropped.
+        """
+        logger = logging.getLogger(name)
+        logger.setLevel(log_level)
+        logger.propagate = False
+
+        if name in _listeners:
+            _listeners.pop(name).stop()
+        if logger.hasHandlers():
+            logger.handlers.clear()
+        logger.filters.clear()
+
+        if json_lines:
+            formatter = JsonFormatter()
+        else:
+            formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+        # Console handler
+        handlers = [logging.StreamHandler()]
+
+        # File handler
+        if to_file and log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+            timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            log_filename = os.path.join(log_dir, f"{name}_{timestamp}.{'jsonl' if json_lines else 'log'}")
+            handlers.append(logging.FileHandler(log_filename))
+
+        for handler in handlers:
+            handler.setLevel(log_level)
+            handler.setFormatter(formatter)
+
+        if rate_limit is not None:
+            logger.addFilter(RateLimitFilter(rate_limit, max_level=rate_limit_level))
+
+        if async_mode:
+            log_queue = queue.Queue(maxsize=queue_size)
+            logger.addHandler(DroppingQueueHandler(log_queue))
+            listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+            listener.start()
+            _listeners[name] = listener
+        else:
+            for handler in handlers:
+                logger.addHandler(handler)
+
+        return logger
+
+
+def dropped_records(logger: logging.Logger) -> int:
+    """Records an async logger dropped because its queue was full."""
+    return sum(h.dropped for h in logger.handlers if isinstance(h, DroppingQueueHandler))
+
+
+@atexit.register
+def _stop_listeners() -> None:
+    # Flush what is still queued before the interpreter exits
+    for listener in list(_listeners.values()):
+        listener.stop()
+    _listeners.clear()
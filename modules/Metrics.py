@@ -0,0 +1,223 @@
+import bisect
+import threading
+import time
+import weakref
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+# Low overhead instrumentation for the control loop. Every thread records into its own shard, so the hot
+# path never takes a lock; shards are only summed when /metrics is scraped. When a thread exits (Flask's
+# threaded servers use one per request) its shard is folded into a base shard, so shards do not pile up. Exposition is the Prometheus
+# text format, with p50/p95/p99 estimated from the histogram buckets added as gauges.
+
+# Histogram bucket upper bounds in seconds: 1, 2.5, 5 per decade from 10 us to 10 s
+BUCKETS: List[float] = [m * 10.0 ** e for e in range(-5, 1) for m in (1.0, 2.5, 5.0)] + [10.0]
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Label added to every sample, set once per process (e.g. 'dbpackage', 'bridge', 'env')
+_component = "auv"
+
+
+def set_component(name: str) -> None:
+    global _component
+    _component = name
+
+
+class _Shard:
+    __slots__ = ("counts", "sum")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+
+
+class _ShardOwner:
+    """Thread-local handle of a shard, garbage collected with the thread's locals when the thread exits."""
+    __slots__ = ("shard", "__weakref__")
+
+    def __init__(self, shard: _Shard):
+        self.shard = shard
+
+
+class _Sharded:
+    """Per-thread shards, created on first use by each thread and retired into a base shard on thread exit."""
+    def __init__(self, name: str, help: str, size: int):
+        self.name = name
+        self.help = help
+        self._size = size
+        self._local = threading.local()
+        self._base = _Shard(size)
+        self._shards: List[_Shard] = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> _Shard:
+        owner = getattr(self._local, "owner", None)
+        if owner is None:
+            owner = _ShardOwner(_Shard(self._size))
+            with self._lock:
+                self._shards.append(owner.shard)
+            weakref.finalize(owner, self._retire, owner.shard)
+            self._local.owner = owner
+        return owner.shard
+
+    def _retire(self, shard: _Shard) -> None:
+        with self._lock:
+            for i, c in enumerate(shard.counts):
+                self._base.counts[i] += c
+            self._base.sum += shard.sum
+            self._shards.remove(shard)
+
+    def _merged(self):
+        with self._lock:
+            counts = list(self._base.counts)
+            total = self._base.sum
+            for shard in self._shards:
+                for i, c in enumerate(shard.counts):
+                    counts[i] += c
+                total += shard.sum
+        return counts, total
+
+
+class Counter(_Sharded):
+    def __init__(self, name: str, help: str = ""):
+        super().__init__(name, help, 1)
+
+    def inc(self, amount: float = 1) -> None:
+        self._shard().sum += amount
+
+    def value(self) -> float:
+        return self._merged()[1]
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter",
+                f'{self.name}{{component="{_component}"}} {self.value()}']
+
+
+class Histogram(_Sharded):
+    def __init__(self, name: str, help: str = ""):
+        super().__init__(name, help, len(BUCKETS) + 1)
+
+    def observe(self, seconds: float) -> None:
+        shard = self._shard()
+        shard.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        shard.sum += seconds
+
+    def total(self) -> float:
+        """Sum of all observed values."""
+        return self._merged()[1]
+
+    def quantile(self, q: float, counts: Optional[List[int]] = None) -> float:
+        """Estimate a quantile by linear interpolation inside the bucket it falls in."""
+        counts = counts if counts is not None else self._merged()[0]
+        total = sum(counts)
+        if total == 0:
+            return float("nan")
+        rank = q * total
+        cumulative = 0
+        for i, c in enumerate(counts):
+            if cumulative + c >= rank and c > 0:
+                lower = BUCKETS[i - 1] if i > 0 else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+                return lower + (upper - lower) * (rank - cumulative) / c
+            cumulative += c
+        return BUCKETS[-1]
+
+    def render(self) -> List[str]:
+        counts, total = self._merged()
+        label = f'component="{_component}"'
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, c in zip(BUCKETS, counts):
+            cumulative += c
+            lines.append(f'{self.name}_bucket{{{label},le="{bound:g}"}} {cumulative}')
+        cumulative += counts[-1]
+        lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {cumulative}')
+        lines.append(f"{self.name}_sum{{{label}}} {total}")
+        lines.append(f"{self.name}_count{{{label}}} {cumulative}")
+        for q in QUANTILES:
+            gauge = f"{self.name}_p{int(q * 100)}"
+            lines.append(f"# TYPE {gauge} gauge")
+            lines.append(f"{gauge}{{{label}}} {self.quantile(q, counts)}")
+        return lines
+
+
+_REGISTRY: Dict[str, _Sharded] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def _get(cls, name: str, help: str):
+    metric = _REGISTRY.get(name)
+    if metric is None:
+        with _REGISTRY_LOCK:
+            metric = _REGISTRY.get(name)
+            if metric is None:
+                metric = cls(name, help)
+                _REGISTRY[name] = metric
+    return metric
+
+
+def histogram(name: str, help: str = "") -> Histogram:
+    """Get or create a latency histogram (values in seconds)."""
+    return _get(Histogram, name, help)
+
+
+def counter(name: str, help: str = "") -> Counter:
+    """Get or create a counter."""
+    return _get(Counter, name, help)
+
+
+class span:
+    """
+    Time a block into the '<name>_seconds' histogram:
+        with span("bridge_get_position"):
+            ...
+    """
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, name: str):
+        self.histogram = histogram(f"{name}_seconds", f"Time spent in {name}")
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+def render() -> str:
+    """All metrics of this process in Prometheus text format."""
+    lines: List[str] = []
+    for name in sorted(_REGISTRY):
+        lines.extend(_REGISTRY[name].render())
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/metrics"):
+            body, status = render().encode(), 200
+        elif self.path.startswith("/health"):
+            body, status = b"ok\n", 200
+        else:
+            body, status = b"not found\n", 404
+        self.send_response(status)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve /metrics (and /health) from a background thread, for components without a Flask app."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -0,0 +1,311 @@
+import os
+import json
+import glob
+import fcntl
+import shutil
+import tempfile
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from TelemetryReader import STATE_FIELDS
+
+# Default directory with the expert paths written by expert_path_creator.py
+DEFAULT_PATH_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'expert_paths')
+
+# Compiled library lives in this sub directory of the path directory. It is a symlink to the current
+# version directory (.library-*), swapped atomically when the library is recompiled
+LIBRARY_DIR_NAME = 'library'
+VERSION_PREFIX = '.library-'
+LOCK_NAME = '.library.lock'
+
+# Cell coordinates are packed into one int64 key, 21 bits per axis
+_CELL_BITS = 21
+_CELL_BIAS = 1 << (_CELL_BITS - 1)
+
+# Offsets of the 27 cells around (and including) a cell
+_NEIGHBOURS = np.array([(i, j, k) for i in (-1, 0, 1) for j in (-1, 0, 1) for k in (-1, 0, 1)], dtype=np.int64)
+
+
+def cell_keys(cells: np.ndarray) -> np.ndarray:
+    """Pack integer (..., 3) cell coordinates into int64 keys."""
+    cells = cells.astype(np.int64) + _CELL_BIAS
+    return (cells[..., 0] << (2 * _CELL_BITS)) | (cells[..., 1] << _CELL_BITS) | cells[..., 2]
+
+
+def load_path_file(path: str) -> Optional[np.ndarray]:
+    """Load one path written by expert_path_creator.py (.npy preferred, .json fallback) as (N, 9) float32."""
+    if path.endswith('.npy'):
+        return np.load(path).astype(np.float32)
+    if os.path.getsize(path) == 0:
+        return None
+    with open(path, 'r') as f:
+        waypoints = json.load(f)
+    if not waypoints:
+        return None
+    return np.array([[w[k] for k in STATE_FIELDS] for w in waypoints], dtype=np.float32)
+
+
+def compile_library(path_dir: str = DEFAULT_PATH_DIR, cell_size: float = 1.0, force: bool = True) -> str:
+    """
+    @brief Compile the paths of path_dir into a new library version and make it current. Compilers are
+           serialized by a lock file, readers never wait: they resolve the symlink once (see PathLibrary).
+    @param force: Compile even if another process made the library current while this one waited.
+    @return The library directory (symlink).
+    """
+    with open(os.path.join(path_dir, LOCK_NAME), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        # Envs starting together all find the library stale, the first one compiles it for the others
+        library_dir = os.path.join(path_dir, LIBRARY_DIR_NAME)
+        if not force and not is_stale(path_dir):
+            return library_dir
+        return _compile_locked(path_dir, cell_size)
+
+
+def _compile_locked(path_dir: str, cell_size: float) -> str:
+    """
+    @brief Compile every path in path_dir into one memory-mappable library.
+    @param path_dir: Directory with <id>.json / <id>.npy paths.
+    @param cell_size: Edge length of the spatial hash grid cells.
+    @return The library directory.
+
+    @note Library layout (all plain .npy so np.load(mmap_mode='r') shares the pages between processes):
+          waypoints.npy (total, 9) float32   all paths back to back, STATE_FIELDS columns
+          offsets.npy   (P + 1,)  int64      path p is waypoints[offsets[p]:offsets[p + 1]]
+          keys.npy      (total,)  int64      grid cell key of each waypoint, sorted within each path
+          order.npy     (total,)  int32      path-local waypoint index for each sorted key
+          lengths.npy   (P,)      float32    arc length of each path
+          library.json  ids, cell size and fields
+    """
+    sources: Dict[str, str] = {}
+    for source in sorted(glob.glob(os.path.join(path_dir, '*.json')) + glob.glob(os.path.join(path_dir, '*.npy'))):
+        path_id = os.path.splitext(os.path.basename(source))[0]
+        # The binary copy written next to the JSON wins
+        if path_id not in sources or source.endswith('.npy'):
+            sources[path_id] = source
+
+    ids, arrays = [], []
+    for path_id, source in sorted(sources.items()):
+        waypoints = load_path_file(source)
+        if waypoints is not None and len(waypoints):
+            ids.append(path_id)
+            arrays.append(waypoints)
+    if not arrays:
+        raise FileNotFoundError(f"No expert paths found in {path_dir}")
+
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(a) for a in arrays])
+    keys = np.empty(offsets[-1], dtype=np.int64)
+    order = np.empty(offsets[-1], dtype=np.int32)
+    lengths = np.empty(len(arrays), dtype=np.float32)
+    for p, waypoints in enumerate(arrays):
+        path_keys = cell_keys(np.floor(waypoints[:, :3] / cell_size))
+        path_order = np.argsort(path_keys, kind='stable')
+        keys[offsets[p]:offsets[p + 1]] = path_keys[path_order]
+        order[offsets[p]:offsets[p + 1]] = path_order
+        lengths[p] = np.linalg.norm(np.diff(waypoints[:, :3], axis=0), axis=1).sum()
+
+    # Build a new version directory next to the current one, the current one stays untouched while envs read it
+    library_dir = os.path.join(path_dir, LIBRARY_DIR_NAME)
+    tmp_dir = tempfile.mkdtemp(prefix=VERSION_PREFIX, dir=path_dir)
+    np.save(os.path.join(tmp_dir, 'waypoints.npy'), np.concatenate(arrays))
+    np.save(os.path.join(tmp_dir, 'offsets.npy'), offsets)
+    np.save(os.path.join(tmp_dir, 'keys.npy'), keys)
+    np.save(os.path.join(tmp_dir, 'order.npy'), order)
+    np.save(os.path.join(tmp_dir, 'lengths.npy'), lengths)
+    with open(os.path.join(tmp_dir, 'library.json'), 'w') as f:
+        json.dump({'ids': ids, 'cell_size': cell_size, 'fields': STATE_FIELDS}, f, indent=4)
+    previous = os.path.realpath(library_dir) if os.path.islink(library_dir) else None
+    if os.path.isdir(library_dir) and not os.path.islink(library_dir):
+        # Library compiled before versioning, a plain directory cannot be replaced by a symlink atomically
+        shutil.rmtree(library_dir, ignore_errors=True)
+    # rename() of a symlink over the old one is atomic: readers see either the old or the new version
+    link = os.path.join(path_dir, LIBRARY_DIR_NAME + '.tmp')
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.basename(tmp_dir), link)
+    os.replace(link, library_dir)
+
+    # Keep the version just replaced for readers that resolved it a moment ago, older ones are unused
+    for version in glob.glob(os.path.join(path_dir, VERSION_PREFIX + '*')):
+        if os.path.realpath(version) not in (os.path.realpath(tmp_dir), previous):
+            shutil.rmtree(version, ignore_errors=True)
+    return library_dir
+
+
+def is_stale(path_dir: str) -> bool:
+    """True if the library is missing or older than any source path."""
+    marker = os.path.join(path_dir, LIBRARY_DIR_NAME, 'library.json')
+    if not os.path.exists(marker):
+        return True
+    built = os.path.getmtime(marker)
+    sources = glob.glob(os.path.join(path_dir, '*.json')) + glob.glob(os.path.join(path_dir, '*.npy'))
+    return any(os.path.getmtime(s) > built for s in sources)
+
+
+class ExpertPath:
+    """One expert path: a read-only (N, 9) waypoint view plus its spatial hash for nearest lookups."""
+    def __init__(self, path_id: str, waypoints: np.ndarray, keys: np.ndarray, order: np.ndarray, cell_size: float):
+        self.id = path_id
+        self.waypoints = waypoints
+        self.positions = waypoints[:, :3]
+        self.keys = keys
+        self.order = order
+        self.cell_size = cell_size
+
+    @classmethod
+    def from_array(cls, path_id: str, waypoints: np.ndarray, cell_size: float = 1.0) -> "ExpertPath":
+        waypoints = np.asarray(waypoints, dtype=np.float32)
+        keys = cell_keys(np.floor(waypoints[:, :3] / cell_size))
+        order = np.argsort(keys, kind='stable').astype(np.int32)
+        return cls(path_id, waypoints, keys[order], order, cell_size)
+
+    def __len__(self) -> int:
+        return len(self.waypoints)
+
+    def nearest(self, position) -> int:
+        """
+        @brief Index of the waypoint closest to position.
+        @note Only the 27 grid cells around the position are searched. A hit within cell_size is exact
+              (anything outside those cells is further away), otherwise all waypoints are scanned.
+        """
+        position = np.asarray(position, dtype=np.float64)
+        cell = np.floor(position / self.cell_size).astype(np.int64)
+        neighbour_keys = cell_keys(cell + _NEIGHBOURS)
+        lo = np.searchsorted(self.keys, neighbour_keys, side='left')
+        hi = np.searchsorted(self.keys, neighbour_keys, side='right')
+        if np.any(hi > lo):
+            candidates = np.concatenate([self.order[a:b] for a, b in zip(lo, hi) if b > a])
+            dist = np.sum((self.positions[candidates] - position) ** 2, axis=1)
+            best = int(np.argmin(dist))
+            if dist[best] <= self.cell_size ** 2:
+                return int(candidates[best])
+        return int(np.argmin(np.sum((self.positions - position) ** 2, axis=1)))
+
+    def nearest_batch(self, positions: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+        """
+        @brief Index of the closest waypoint for each of (M, 3) positions, for scoring whole trajectories.
+        @note The grid lookup of nearest() done for all positions at once: the candidates of the 27 cells
+              around every position are gathered into flat arrays and reduced per position. Positions with
+              no hit within cell_size fall back to an exact brute force search.
+        """
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        indices = np.empty(len(positions), dtype=np.int64)
+        for a in range(0, len(positions), chunk_size):
+            indices[a:a + chunk_size] = self._nearest_grid(positions[a:a + chunk_size])
+        return indices
+
+    def _nearest_grid(self, positions: np.ndarray) -> np.ndarray:
+        m = len(positions)
+        cells = np.floor(positions / self.cell_size).astype(np.int64)
+        neighbour_keys = cell_keys(cells[:, None, :] + _NEIGHBOURS[None, :, :])
+        lo = np.searchsorted(self.keys, neighbour_keys, side='left')
+        runs = (np.searchsorted(self.keys, neighbour_keys, side='right') - lo).ravel()
+        counts = runs.reshape(m, -1).sum(axis=1)
+
+        # Flat candidate list grouped by position, owner[i] is the position of candidate i
+        owner = np.repeat(np.arange(m), counts)
+        within = np.arange(runs.sum()) - np.repeat(np.cumsum(runs) - runs, runs)
+        candidates = self.order[np.repeat(lo.ravel(), runs) + within].astype(np.int64)
+        dist = np.sum((self.positions[candidates] - positions[owner]) ** 2, axis=1)
+
+        indices = np.full(m, -1, dtype=np.int64)
+        hit = counts > 0
+        if hit.any():
+            best = np.minimum.reduceat(dist, (np.cumsum(counts) - counts)[hit])
+            # First candidate at the minimum distance of each position
+            at_best = np.flatnonzero(dist == np.repeat(best, counts[hit]))
+            first = at_best[np.r_[True, owner[at_best][1:] != owner[at_best][:-1]]]
+            exact = best <= self.cell_size ** 2
+            indices[np.flatnonzero(hit)[exact]] = candidates[first][exact]
+        missing = np.flatnonzero(indices < 0)
+        if len(missing):
+            indices[missing] = self._nearest_brute(positions[missing])
+        return indices
+
+    def _nearest_brute(self, positions: np.ndarray, chunk_size: int = 4096) -> np.ndarray:
+        """Exact search over all waypoints as one matrix product per chunk (|p|^2 - 2 p.w + |w|^2)."""
+        waypoints = np.asarray(self.positions, dtype=np.float64)
+        waypoint_sq = np.sum(waypoints ** 2, axis=1)
+        indices = np.empty(len(positions), dtype=np.int64)
+        for a in range(0, len(positions), chunk_size):
+            # |p|^2 is the same for every waypoint of a row and does not change the argmin
+            indices[a:a + chunk_size] = np.argmin(waypoint_sq - 2.0 * positions[a:a + chunk_size] @ waypoints.T, axis=1)
+        return indices
+
+
+class PathLibrary:
+    """
+    Read-only, memory-mapped collection of expert paths. The arrays are mapped from the compiled
+    library, so every env process on a host shares the same physical pages.
+    """
+    def __init__(self, path_dir: str = DEFAULT_PATH_DIR, mmap: bool = True):
+        if is_stale(path_dir):
+            compile_library(path_dir, force=False)
+        for attempt in range(3):
+            # Resolved once, so every file is read from the same version even if it is recompiled meanwhile
+            library_dir = os.path.realpath(os.path.join(path_dir, LIBRARY_DIR_NAME))
+            try:
+                self._load(library_dir, 'r' if mmap else None)
+                break
+            except FileNotFoundError:
+                # The version was retired by two recompiles in a row while loading, read the current one
+                if attempt == 2:
+                    raise
+        # Paths sorted from shortest to longest, used for curriculum selection
+        self.by_length = np.argsort(self.lengths, kind='stable')
+        self._paths: Dict[int, ExpertPath] = {}
+
+    def _load(self, library_dir: str, mode: Optional[str]) -> None:
+        with open(os.path.join(library_dir, 'library.json'), 'r') as f:
+            meta = json.load(f)
+        self.ids: List[str] = meta['ids']
+        self.cell_size: float = meta['cell_size']
+        # Mapped files stay readable after their version directory is removed
+        self.waypoints = np.load(os.path.join(library_dir, 'waypoints.npy'), mmap_mode=mode)
+        self.offsets = np.load(os.path.join(library_dir, 'offsets.npy'))
+        self.keys = np.load(os.path.join(library_dir, 'keys.npy'), mmap_mode=mode)
+        self.order = np.load(os.path.join(library_dir, 'order.npy'), mmap_mode=mode)
+        self.lengths = np.load(os.path.join(library_dir, 'lengths.npy'))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def path(self, index: int) -> ExpertPath:
+        if index not in self._paths:
+            a, b = self.offsets[index], self.offsets[index + 1]
+            self._paths[index] = ExpertPath(self.ids[index], self.waypoints[a:b], self.keys[a:b], self.order[a:b], self.cell_size)
+        return self._paths[index]
+
+    def get(self, path_id: str) -> ExpertPath:
+        return self.path(self.ids.index(path_id))
+
+    def select(self, rng: np.random.Generator, mode: str = "random", path_id: Optional[str] = None,
+               progress: float = 1.0) -> ExpertPath:
+        """
+        @brief Pick a path for an episode.
+        @param rng: Random generator of the env.
+        @param mode: 'random', 'curriculum' (shortest paths first) or 'id'.
+        @param path_id: Path id for mode 'id'.
+        @param progress: Curriculum progress in [0, 1], the shortest fraction of paths that is unlocked.
+        @return The selected ExpertPath.
+        """
+        if mode == "id" or path_id is not None:
+            return self.get(path_id)
+        if mode == "curriculum":
+            unlocked = max(1, int(np.ceil(np.clip(progress, 0.0, 1.0) * len(self))))
+            return self.path(int(self.by_length[rng.integers(unlocked)]))
+        if mode == "random":
+            return self.path(int(rng.integers(len(self))))
+        raise ValueError(f"Unknown path selection mode: {mode}")
+
+
+# One library per directory and process, shared by all envs created in that process
+_LIBRARIES: Dict[str, PathLibrary] = {}
+
+
+def load_library(path_dir: str = DEFAULT_PATH_DIR) -> PathLibrary:
+    path_dir = os.path.abspath(path_dir)
+    if path_dir not in _LIBRARIES:
+        _LIBRARIES[path_dir] = PathLibrary(path_dir)
+    return _LIBRARIES[path_dir]
@@ -0,0 +1,96 @@
+from typing import List, Optional
+import argparse
+import time
+from datetime import datetime
+
+import requests
+
+# Control loop in front of PolicyServer: every control tick the latest vehicle state is read from the
+# DBPackage, sent to the policy's /act route, and the action is posted as the 'policy' source of the
+# CommandMux (or straight to the DBPackage inputs when no mux runs). A tick that fails posts nothing, so
+# the mux sees the policy go stale and falls back to neutral instead of repeating an old action.
+
+# Observation layout of AUVEnv: DBPackage table -> fields, followed by Arm (always 0 for the policy)
+STATE_ROUTES = [
+    ("position", ["X", "Y", "Z"]),
+    ("rotation", ["Roll", "Pitch", "Yaw"]),
+    ("velocity", ["Vx", "Vy", "Vz"]),
+]
+
+# Command fields in action order, as AUVEnv._command sends them
+ACTION_FIELDS = ["X", "Y", "Z", "Roll", "Pitch", "Yaw", "S1", "S2", "S3"]
+
+
+class PolicyLoop:
+    """Runs the served policy at a fixed control rate and forwards one command per tick."""
+    def __init__(self, state_url: str, act_url: str, inputs_url: str, rate: float = 10.0):
+        """
+        @param state_url: DBPackage base URL of the vehicle, e.g. http://localhost:5000 or http://localhost:5000/env0.
+        @param act_url: PolicyServer /act route.
+        @param inputs_url: CommandMux /inputs/policy route, or the DBPackage /inputs route without a mux.
+        @param rate: Control rate in Hz.
+        """
+        self.state_url = state_url.rstrip('/')
+        self.act_url = act_url
+        self.inputs_url = inputs_url
+        self.period = 1.0 / rate
+        self.session = requests.Session()
+        self.last_command = None
+        self.ticks = 0
+        self.failed = 0
+        self.overruns = 0
+
+    def observation(self) -> List[float]:
+        obs = []
+        for route, fields in STATE_ROUTES:
+            response = self.session.get(f"{self.state_url}/{route}", timeout=self.period)
+            response.raise_for_status()
+            data = response.json()
+            obs.extend(float(data[k]) for k in fields)
+        obs.append(0.0)
+        return obs
+
+    def command(self, action: List[float]) -> dict:
+        command = {k: max(-1.0, min(1.0, float(v))) for k, v in zip(ACTION_FIELDS, action)}
+        command.update(Arm=0, source="policy", datetime=datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f'))
+        return command
+
+    def tick(self) -> None:
+        try:
+            obs = self.observation()
+            response = self.session.post(self.act_url, json={'obs': obs}, timeout=self.period)
+            response.raise_for_status()
+            command = self.command(response.json()['action'])
+            response = self.session.post(self.inputs_url, json=command, timeout=self.period)
+            if response.status_code != 201:
+                self.failed += 1
+            else:
+                self.last_command = command
+        except (requests.exceptions.RequestException, KeyError, ValueError):
+            self.failed += 1
+        self.ticks += 1
+
+    def run(self, ticks: Optional[int] = None) -> None:
+        next_tick = time.monotonic()
+        while ticks is None or self.ticks < ticks:
+            self.tick()
+            next_tick += self.period
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Overran the tick, don't try to catch up with a burst of stale actions
+                self.overruns += 1
+                next_tick = time.monotonic()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive the vehicle with the policy served by PolicyServer")
+    parser.add_argument("--state_url", type=str, default="http://localhost:5000", help="DBPackage base URL, with the namespace for a shared store")
+    parser.add_argument("--act_url", type=str, default="http://localhost:5003/act", help="PolicyServer act route")
+    parser.add_argument("--inputs_url", type=str, default="http://localhost:5002/inputs/policy", help="CommandMux policy route, or the DBPackage inputs route without a mux")
+    parser.add_argument("--rate", type=float, default=10.0, help="Control rate in Hz (default: 10)")
+    args = parser.parse_args()
+
+    print(f"[INFO] Policy control loop at {args.rate} Hz: {args.state_url} -> {args.act_url} -> {args.inputs_url}")
+    PolicyLoop(args.state_url, args.act_url, args.inputs_url, args.rate).run()
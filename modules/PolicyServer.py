@@ -0,0 +1,286 @@
+from flask import Flask, request, jsonify, Response
+from concurrent.futures import Future
+from typing import List, Optional
+import argparse
+import threading
+import logging
+import pickle
+import queue
+import time
+import os
+
+import numpy as np
+import torch
+
+import Metrics
+
+# Serves a trained policy at control rate: the SB3 model is exported once to TorchScript (or ONNX),
+# requests from one or many envs/vehicles are batched into single forward passes, and inference
+# latency percentiles are reported on /stats.
+
+app = Flask(__name__)
+
+log = logging.getLogger('werkzeug')
+log.setLevel(logging.ERROR)
+
+
+class DeterministicActor(torch.nn.Module):
+    """
+    The deterministic action path of an SB3 ActorCriticPolicy (what model.predict(obs, deterministic=True)
+    computes), with the VecNormalize observation normalization of training folded in when given, so
+    clients send raw AUVEnv observations.
+    """
+    def __init__(self, policy, vec_normalize=None):
+        super().__init__()
+        shape = policy.observation_space.shape
+        if vec_normalize is not None and vec_normalize.norm_obs:
+            mean = torch.as_tensor(vec_normalize.obs_rms.mean, dtype=torch.float32)
+            scale = 1.0 / torch.sqrt(torch.as_tensor(vec_normalize.obs_rms.var, dtype=torch.float32) + vec_normalize.epsilon)
+            clip = float(vec_normalize.clip_obs)
+        else:
+            mean, scale, clip = torch.zeros(shape), torch.ones(shape), float("inf")
+        self.register_buffer("obs_mean", mean)
+        self.register_buffer("obs_scale", scale)
+        self.clip_obs = clip
+        self.features_extractor = policy.pi_features_extractor
+        self.policy_net = policy.mlp_extractor.policy_net
+        self.action_net = policy.action_net
+        low = torch.as_tensor(policy.action_space.low, dtype=torch.float32)
+        high = torch.as_tensor(policy.action_space.high, dtype=torch.float32)
+        self.register_buffer("low", low)
+        self.register_buffer("high", high)
+
+    def forward(self, obs: torch.Tensor) -> torch.Tensor:
+        obs = torch.clamp((obs - self.obs_mean) * self.obs_scale, -self.clip_obs, self.clip_obs)
+        action = self.action_net(self.policy_net(self.features_extractor(obs)))
+        return torch.max(torch.min(action, self.high), self.low)
+
+
+def export_policy(model_path: str, output: str, fmt: str = "torchscript", vecnormalize_path: Optional[str] = None) -> str:
+    """
+    @brief Export the deterministic actor of a saved PPO model.
+    @param model_path: Saved model (e.g. auv_ppo_model).
+    @param output: Output path without extension.
+    @param fmt: 'torchscript' (.pt) or 'onnx' (.onnx).
+    @param vecnormalize_path: Normalization statistics saved with the model (e.g. auv_ppo_model_vecnormalize.pkl).
+    @return Path of the exported file.
+    """
+    from stable_baselines3 import PPO
+
+    model = PPO.load(model_path, device="cpu")
+    vec_normalize = None
+    if vecnormalize_path is not None:
+        # VecNormalize pickles without its wrapped env, only the statistics are needed here
+        with open(vecnormalize_path, "rb") as f:
+            vec_normalize = pickle.load(f)
+    actor = DeterministicActor(model.policy, vec_normalize).eval()
+    example = torch.zeros((1,) + model.observation_space.shape, dtype=torch.float32)
+    if fmt == "torchscript":
+        path = output + ".pt"
+        with torch.no_grad():
+            traced = torch.jit.trace(actor, example)
+        # obs_mean is kept as an attribute so the server can read the observation width back
+        traced = torch.jit.freeze(traced, preserved_attrs=["obs_mean"])
+        traced.save(path)
+    elif fmt == "onnx":
+        path = output + ".onnx"
+        try:
+            torch.onnx.export(actor, example, path, input_names=["obs"], output_names=["action"],
+                              dynamic_axes={"obs": {0: "batch"}, "action": {0: "batch"}})
+        except ImportError as e:
+            raise ImportError(f"ONNX export requires the onnx packages (pip install onnx onnxscript): {e}")
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+    return path
+
+
+def pin_threads(threads: int = 1, cpus: Optional[List[int]] = None) -> None:
+    """Limit torch to a fixed number of threads and optionally pin the process to the given CPUs."""
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Can only be set once, before any parallel work
+        pass
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+
+
+class PolicyRunner:
+    """Runs an exported policy on a batch of observations."""
+    def __init__(self, path: str):
+        self.path = path
+        if path.endswith(".onnx"):
+            try:
+                import onnxruntime
+            except ImportError:
+                raise ImportError("Serving an ONNX policy requires onnxruntime (pip install onnxruntime)")
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = torch.get_num_threads()
+            options.inter_op_num_threads = 1
+            self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+            self.module = None
+            width = self.session.get_inputs()[0].shape[-1]
+        else:
+            self.module = torch.jit.load(path, map_location="cpu")
+            self.session = None
+            width = self.module.obs_mean.shape[-1] if hasattr(self.module, "obs_mean") else None
+        # Observation width the policy expects, None when the export does not say
+        self.obs_dim = width if isinstance(width, int) else None
+
+    def act(self, obs: np.ndarray) -> np.ndarray:
+        obs = np.ascontiguousarray(obs, dtype=np.float32)
+        if self.session is not None:
+            return self.session.run(None, {"obs": obs})[0]
+        with torch.inference_mode():
+            return self.module(torch.from_numpy(obs)).numpy()
+
+
+class LatencyRecorder:
+    """Fixed-size ring buffer of latencies in seconds with percentile reporting."""
+    def __init__(self, size: int = 10000):
+        self.samples = np.zeros(size, dtype=np.float64)
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        self.samples[self.count % len(self.samples)] = value
+        self.count += 1
+
+    def summary(self) -> dict:
+        n = min(self.count, len(self.samples))
+        if n == 0:
+            return {"count": 0}
+        p50, p99 = np.percentile(self.samples[:n], [50, 99])
+        return {"count": self.count, "p50_ms": p50 * 1e3, "p99_ms": p99 * 1e3}
+
+
+class BatchingServer:
+    """
+    Collects act() requests from any number of threads and runs them as one batch: the worker takes the
+    first waiting request, then keeps gathering until max_batch rows or max_wait seconds have passed.
+    """
+    def __init__(self, runner: PolicyRunner, max_batch: int = 32, max_wait: float = 0.002, timeout: float = 1.0):
+        self.runner = runner
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self.requests = queue.Queue()
+        self.inference = LatencyRecorder()
+        self.end_to_end = LatencyRecorder()
+        self.rows = 0
+        self._thread = threading.Thread(target=self._run, name="policy-batcher", daemon=True)
+        self._thread.start()
+
+    def act(self, obs: np.ndarray) -> np.ndarray:
+        """
+        @brief Get actions for one (obs_dim,) or several (n, obs_dim) observations. Blocks until the batch ran.
+        @param obs: Observation(s).
+        @return Action(s) with the same leading shape.
+        @throws TimeoutError if the batch did not run within timeout seconds.
+        """
+        obs = np.asarray(obs, dtype=np.float32)
+        single = obs.ndim == 1
+        future = Future()
+        self.requests.put((np.atleast_2d(obs), future, time.perf_counter()))
+        actions = future.result(timeout=self.timeout)
+        return actions[0] if single else actions
+
+    def stats(self) -> dict:
+        batches = self.inference.count
+        return {"inference": self.inference.summary(), "end_to_end": self.end_to_end.summary(),
+                "batches": batches, "mean_batch": self.rows / batches if batches else 0.0}
+
+    def _run(self) -> None:
+        while True:
+            pending = [self.requests.get()]
+            rows = len(pending[0][0])
+            deadline = time.perf_counter() + self.max_wait
+            while rows < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                pending.append(item)
+                rows += len(item[0])
+
+            # Requests of the wrong width fail on their own instead of failing the batch they landed in
+            width = self.runner.obs_dim or pending[0][0].shape[-1]
+            rejected = [item for item in pending if item[0].ndim != 2 or item[0].shape[-1] != width]
+            for obs, future, _ in rejected:
+                future.set_exception(ValueError(f"Expected observations of width {width}, got shape {obs.shape}"))
+            pending = [item for item in pending if item[0].ndim == 2 and item[0].shape[-1] == width]
+            if not pending:
+                continue
+
+            start = time.perf_counter()
+            try:
+                batch = np.concatenate([obs for obs, _, _ in pending]) if len(pending) > 1 else pending[0][0]
+                actions = self.runner.act(batch)
+            except Exception as e:
+                for _, future, _ in pending:
+                    future.set_exception(e)
+                continue
+            done = time.perf_counter()
+            self.inference.add(done - start)
+            Metrics.histogram("policy_inference_seconds").observe(done - start)
+            self.rows += len(batch)
+
+            offset = 0
+            for obs, future, submitted in pending:
+                future.set_result(actions[offset:offset + len(obs)])
+                offset += len(obs)
+                self.end_to_end.add(done - submitted)
+
+
+server: Optional[BatchingServer] = None
+
+@app.route('/act', methods=['POST'])
+def act():
+    data = request.get_json()
+    if not data or 'obs' not in data:
+        return jsonify({'message': 'No observation provided'}), 400
+    try:
+        action = server.act(np.asarray(data['obs'], dtype=np.float32))
+    except TimeoutError:
+        return jsonify({'message': 'Policy inference timed out'}), 503
+    except Exception as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify({'action': action.tolist()}), 200
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    return jsonify(server.stats())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(Metrics.render(), mimetype=Metrics.CONTENT_TYPE)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batched policy inference server")
+    parser.add_argument("--model", type=str, default="auv_ppo_model", help="Saved PPO model to serve")
+    parser.add_argument("--vecnormalize", type=str, default=None, help="Normalization statistics (default: <model>_vecnormalize.pkl if it exists)")
+    parser.add_argument("--format", type=str, default="torchscript", choices=["torchscript", "onnx"], help="Export format (default: torchscript)")
+    parser.add_argument("--export_only", action="store_true", help="Export the policy and exit")
+    parser.add_argument("--threads", type=int, default=1, help="Inference threads (default: 1)")
+    parser.add_argument("--cpus", type=str, default=None, help="Comma separated CPUs to pin the server to (default: no pinning)")
+    parser.add_argument("--max_batch", type=int, default=32, help="Maximum observations per batch (default: 32)")
+    parser.add_argument("--max_wait_ms", type=float, default=2.0, help="Maximum time to wait for a batch to fill (default: 2 ms)")
+    parser.add_argument("--timeout", type=float, default=1.0, help="Seconds a request waits for its batch before failing (default: 1)")
+    parser.add_argument("--port", type=int, default=5003, help="Port for the policy API")
+    parser.add_argument("--host", type=str, default="localhost", help="Host for the policy API")
+    args = parser.parse_args()
+
+    Metrics.set_component("policy")
+    pin_threads(args.threads, [int(c) for c in args.cpus.split(",")] if args.cpus else None)
+    vecnormalize_path = args.vecnormalize
+    if vecnormalize_path is None and os.path.exists(args.model + "_vecnormalize.pkl"):
+        vecnormalize_path = args.model + "_vecnormalize.pkl"
+    exported = export_policy(args.model, args.model + "_actor", args.format, vecnormalize_path)
+    print(f"Exported policy to {exported}")
+    if not args.export_only:
+        server = BatchingServer(PolicyRunner(exported), args.max_batch, args.max_wait_ms / 1000.0, args.timeout)
+        app.run(host=args.host, port=args.port, debug=False, threaded=True)
@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import queue
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+# One row per recorded frame. Stored as a flat binary file next to the video segments so it can be
+# loaded with np.fromfile / np.memmap and searched with np.searchsorted without decoding any video.
+INDEX_DTYPE = np.dtype([
+    ('frame', '<u4'),          # Frame number across the whole run
+    ('segment', '<u2'),        # Segment file the frame lives in
+    ('segment_frame', '<u4'),  # Frame number inside that segment
+    ('time', '<f8'),           # Capture time (seconds since epoch, same clock the bridge stamps data.db rows with)
+])
+
+# Format of the 'datetime' column DBPackage stores (with microseconds), so a run can be matched to its telemetry rows
+DB_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+class CameraWriter:
+    """
+    Background writer for a single camera. Frames are handed over through a bounded queue and
+    encoded to MJPG segment files (every frame is a keyframe, so seeking is exact and cheap).
+    submit() never blocks: when the queue is full the frame is dropped and counted instead of
+    stalling the capture or control loop. The index is flushed every flush_frames frames and on
+    each segment rollover, so a crash loses at most that many index rows and a reader of a live
+    run sees every closed segment.
+    """
+    def __init__(self, run_dir: str, name: str, fps: float = 20.0, queue_size: int = 64, segment_frames: int = 1800,
+                 flush_frames: int = 20):
+        self.run_dir = run_dir
+        self.name = name
+        self.fps = fps
+        self.segment_frames = segment_frames
+        self.flush_frames = flush_frames
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.frame_size = None
+
+        self._segment = -1
+        self._segment_frame = 0
+        self._writer = None
+        self._index_file = open(self.index_path, 'ab')
+        self._thread = threading.Thread(target=self._run, name=f'recorder-{name}', daemon=True)
+        self._thread.start()
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.run_dir, f'{self.name}.idx')
+
+    def segment_path(self, segment: int) -> str:
+        return os.path.join(self.run_dir, f'{self.name}_{segment:04d}.avi')
+
+    def submit(self, frame: np.ndarray, timestamp: Optional[float] = None) -> bool:
+        """
+        @brief Queue a BGR frame for writing.
+        @param frame: The frame to record.
+        @param timestamp: Capture time, defaults to now.
+        @return True if the frame was queued, False if it was dropped.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        try:
+            self.queue.put_nowait((frame, timestamp))
+            return True
+        except queue.Full:
+            self.frames_dropped += 1
+            return False
+
+    def close(self) -> None:
+        """Flush the queue and close the segment and index files."""
+        self.queue.put(None)
+        self._thread.join()
+
+    def _open_segment(self, frame: np.ndarray) -> None:
+        if self._writer is not None:
+            self._writer.release()
+            self._index_file.flush()
+        self._segment += 1
+        self._segment_frame = 0
+        height, width = frame.shape[:2]
+        self.frame_size = (width, height)
+        fourcc = cv2.VideoWriter_fourcc(*'MJPG')
+        self._writer = cv2.VideoWriter(self.segment_path(self._segment), fourcc, self.fps, self.frame_size)
+
+    def _run(self) -> None:
+        row = np.zeros(1, dtype=INDEX_DTYPE)
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            frame, timestamp = item
+            if self._writer is None or self._segment_frame >= self.segment_frames:
+                self._open_segment(frame)
+            if (frame.shape[1], frame.shape[0]) != self.frame_size:
+                frame = cv2.resize(frame, self.frame_size)
+            self._writer.write(frame)
+
+            row['frame'] = self.frames_written
+            row['segment'] = self._segment
+            row['segment_frame'] = self._segment_frame
+            row['time'] = timestamp
+            self._index_file.write(row.tobytes())
+
+            self._segment_frame += 1
+            self.frames_written += 1
+            if self.frames_written % self.flush_frames == 0:
+                self._index_file.flush()
+
+        if self._writer is not None:
+            self._writer.release()
+        self._index_file.close()
+
+
+class RunRecorder:
+    """
+    Records every camera of one run into its own directory:
+        <root>/<run_id>/run.json        manifest (cameras, start/stop times, telemetry db)
+        <root>/<run_id>/<cam>_NNNN.avi  MJPG video segments
+        <root>/<run_id>/<cam>.idx       frame index (INDEX_DTYPE)
+    Cameras are created on their first frame so any source (Virtual_Cameras regions, WebCam
+    captures) can feed the same recorder.
+    """
+    def __init__(self, root: str = 'recordings', run_id: Optional[str] = None, fps: float = 20.0,
+                 queue_size: int = 64, segment_frames: int = 1800, db_path: Optional[str] = None):
+        self.run_id = run_id or datetime.now().strftime('%Y%m%d-%H%M%S')
+        self.run_dir = os.path.join(root, self.run_id)
+        os.makedirs(self.run_dir, exist_ok=True)
+        self.fps = fps
+        self.queue_size = queue_size
+        self.segment_frames = segment_frames
+        self.db_path = db_path
+        self.writers: Dict[str, CameraWriter] = {}
+        self._lock = threading.Lock()
+        self.start_time = time.time()
+        self.stop_time = None
+        self._write_manifest()
+
+    def submit(self, camera, frame: np.ndarray, timestamp: Optional[float] = None) -> bool:
+        """
+        @brief Queue a frame from the given camera, creating its writer on first use.
+        @param camera: Camera name or number.
+        @param frame: BGR frame.
+        @param timestamp: Capture time, defaults to now.
+        @return True if the frame was queued, False if it was dropped.
+        """
+        name = str(camera) if not isinstance(camera, int) else f'cam{camera}'
+        writer = self.writers.get(name)
+        if writer is None:
+            with self._lock:
+                writer = self.writers.get(name)
+                if writer is None:
+                    writer = CameraWriter(self.run_dir, name, self.fps, self.queue_size, self.segment_frames)
+                    self.writers[name] = writer
+                    self._write_manifest()
+        return writer.submit(frame, timestamp)
+
+    def stats(self) -> dict:
+        return {name: {'written': w.frames_written, 'dropped': w.frames_dropped, 'queued': w.queue.qsize()}
+                for name, w in self.writers.items()}
+
+    def close(self) -> None:
+        for writer in list(self.writers.values()):
+            writer.close()
+        self.stop_time = time.time()
+        self._write_manifest()
+
+    def _write_manifest(self) -> None:
+        manifest = {
+            'run_id': self.run_id,
+            'fps': self.fps,
+            'cameras': sorted(self.writers.keys()),
+            'start_time': self.start_time,
+            'stop_time': self.stop_time,
+            # Window of data.db rows that belong to this run
+            'start_datetime': datetime.fromtimestamp(self.start_time).strftime(DB_DATETIME_FORMAT),
+            'stop_datetime': datetime.fromtimestamp(self.stop_time).strftime(DB_DATETIME_FORMAT) if self.stop_time else None,
+            'db_path': self.db_path,
+        }
+        with open(os.path.join(self.run_dir, 'run.json'), 'w') as f:
+            json.dump(manifest, f, indent=4)
+
+
+class RunReader:
+    """Random access to a recorded run for dataset extraction."""
+    def __init__(self, run_dir: str):
+        self.run_dir = run_dir
+        with open(os.path.join(run_dir, 'run.json'), 'r') as f:
+            self.manifest = json.load(f)
+        self.index = {}
+        for name in self.manifest['cameras']:
+            path = os.path.join(run_dir, f'{name}.idx')
+            self.index[name] = np.fromfile(path, dtype=INDEX_DTYPE) if os.path.exists(path) else np.zeros(0, INDEX_DTYPE)
+        self._captures = {}
+
+    def times(self, camera: str) -> np.ndarray:
+        return self.index[camera]['time']
+
+    def nearest(self, camera: str, timestamps) -> np.ndarray:
+        """
+        @brief Find the frame closest in time to each timestamp (vectorized).
+        @param camera: Camera name.
+        @param timestamps: Scalar or array of epoch seconds, e.g. telemetry row times.
+        @return Array of frame numbers, -1 for every timestamp if the camera recorded no frames.
+        """
+        t = self.times(camera)
+        ts = np.atleast_1d(np.asarray(timestamps, dtype=np.float64))
+        if len(t) == 0:
+            return np.full(len(ts), -1, dtype=np.int64)
+        idx = np.clip(np.searchsorted(t, ts), 1, max(len(t) - 1, 1))
+        left = t[idx - 1]
+        right = t[np.minimum(idx, len(t) - 1)]
+        idx = idx - ((ts - left) <= (right - ts))
+        return np.clip(idx, 0, len(t) - 1)
+
+    def between(self, camera: str, start: float, stop: float) -> np.ndarray:
+        """Index rows of all frames captured in [start, stop)."""
+        t = self.times(camera)
+        lo, hi = np.searchsorted(t, [start, stop])
+        return self.index[camera][lo:hi]
+
+    def read_frame(self, camera: str, frame: int) -> Optional[np.ndarray]:
+        """Decode a single frame by run frame number."""
+        row = self.index[camera][frame]
+        key = (camera, int(row['segment']))
+        capture = self._captures.get(key)
+        if capture is None:
+            capture = cv2.VideoCapture(os.path.join(self.run_dir, f"{camera}_{int(row['segment']):04d}.avi"))
+            self._captures[key] = capture
+        capture.set(cv2.CAP_PROP_POS_FRAMES, int(row['segment_frame']))
+        has_frame, image = capture.read()
+        return image if has_frame else None
+
+    def close(self) -> None:
+        for capture in self._captures.values():
+            capture.release()
+        self._captures.clear()
@@ -0,0 +1,336 @@
+import os
+from typing import Optional
+
+import numpy as np
+import torch as th
+import torch.nn.functional as F
+from gymnasium import spaces
+from stable_baselines3 import SAC
+from stable_baselines3.common.buffers import BaseBuffer, ReplayBuffer
+from stable_baselines3.common.utils import polyak_update
+from stable_baselines3.common.type_aliases import ReplayBufferSamples
+from stable_baselines3.common.vec_env import VecNormalize
+
+# Replay buffer for off-policy training on AUVEnv transitions (SAC/TD3, IBRL in Research/Notes.md).
+# Columns are preallocated float32 arrays, optionally memory-mapped .npy files in storage_dir so millions of
+# transitions live on disk and only the pages a batch touches are in RAM. Operator demonstrations are kept
+# in a separate expert store that is never overwritten, and every batch mixes expert_ratio of them in.
+#
+#   PrioritizedSAC("MlpPolicy", env, buffer_size=5_000_000, replay_buffer_class=DiskReplayBuffer,
+#                  replay_buffer_kwargs=dict(storage_dir="replay", prioritized=True, expert_ratio=0.25))
+#   model.replay_buffer.load_demonstrations(*build_bc_dataset(db_path))
+#
+# SB3's own train() loops neither weight the loss nor report TD errors back, so with plain SAC/TD3 a
+# prioritized buffer samples uniformly; PrioritizedSAC is SAC.train with both added.
+
+# Columns stored per transition, next_observations is left out with optimize_memory_usage
+AGENT_COLUMNS = ("observations", "next_observations", "actions", "rewards", "dones", "timeouts", "priorities")
+EXPERT_COLUMNS = ("expert_observations", "expert_next_observations", "expert_actions", "expert_rewards", "expert_dones")
+
+
+class DiskReplayBuffer(ReplayBuffer):
+    """
+    @brief SB3 ReplayBuffer with float32 columns, optional memory-mapped storage, proportional prioritized
+           sampling and mixed expert/agent batches. Drop-in for replay_buffer_class of SB3 off-policy algorithms.
+    @note prioritized only takes effect when the training loop applies last_weights and calls
+          update_priorities (PrioritizedSAC), with stock SAC/TD3 every priority stays at max_priority.
+    """
+    def __init__(self, buffer_size: int, observation_space: spaces.Space, action_space: spaces.Space,
+                 device="auto", n_envs: int = 1, optimize_memory_usage: bool = False,
+                 handle_timeout_termination: bool = True, storage_dir: Optional[str] = None,
+                 prioritized: bool = False, alpha: float = 0.6, beta: float = 0.4, priority_eps: float = 1e-6,
+                 expert_ratio: float = 0.0):
+        """
+        @param storage_dir: Memory-map the columns to .npy files in this directory, None keeps them in RAM.
+        @param prioritized: Sample transitions proportionally to priority ** alpha instead of uniformly.
+        @param alpha: How strongly priorities skew sampling (0 is uniform).
+        @param beta: Importance sampling exponent of the weights in last_weights.
+        @param priority_eps: Added to |TD error| so no transition gets priority 0.
+        @param expert_ratio: Fraction of every batch drawn from the demonstrations once they are loaded.
+        """
+        # ReplayBuffer.__init__ would allocate every column in RAM, the columns are allocated here instead
+        BaseBuffer.__init__(self, buffer_size, observation_space, action_space, device, n_envs=n_envs)
+        self.buffer_size = max(buffer_size // n_envs, 1)
+        if optimize_memory_usage and handle_timeout_termination:
+            raise ValueError("DiskReplayBuffer does not support optimize_memory_usage = True "
+                             "and handle_timeout_termination = True simultaneously.")
+        if not 0.0 <= expert_ratio <= 1.0:
+            raise ValueError(f"expert_ratio must be in [0, 1], got {expert_ratio}")
+        self.optimize_memory_usage = optimize_memory_usage
+        self.handle_timeout_termination = handle_timeout_termination
+        self.storage_dir = storage_dir
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.beta = beta
+        self.priority_eps = priority_eps
+        self.expert_ratio = expert_ratio
+        if storage_dir:
+            os.makedirs(storage_dir, exist_ok=True)
+
+        rows = (self.buffer_size, self.n_envs)
+        self.observations = self._column("observations", (*rows, *self.obs_shape))
+        if not optimize_memory_usage:
+            self.next_observations = self._column("next_observations", (*rows, *self.obs_shape))
+        self.actions = self._column("actions", (*rows, self.action_dim))
+        self.rewards = self._column("rewards", rows)
+        self.dones = self._column("dones", rows)
+        self.timeouts = self._column("timeouts", rows)
+        # Stored as priority ** alpha, so a draw is one cumulative sum and a binary search
+        self.priorities = self._column("priorities", rows) if prioritized else None
+        self.max_priority = 1.0
+
+        self.expert_size = 0
+        self.expert_observations = None
+        self.expert_next_observations = None
+        self.expert_actions = None
+        self.expert_rewards = None
+        self.expert_dones = None
+
+        # Agent transitions of the last sample() as flat indices (row * n_envs + env, -1 for expert rows)
+        # and their importance sampling weights, for update_priorities() after the TD errors are known
+        self.last_indices = np.zeros(0, dtype=np.int64)
+        self.last_weights = np.ones(0, dtype=np.float32)
+
+    def _column(self, name: str, shape) -> np.ndarray:
+        if self.storage_dir is None:
+            return np.zeros(shape, dtype=np.float32)
+        path = os.path.join(self.storage_dir, f"{name}.npy")
+        if os.path.exists(path):
+            # SB3 constructs a fresh buffer before load_replay_buffer unpickles the saved one onto the same
+            # files, so existing columns of the right shape are reopened instead of truncated
+            try:
+                existing = np.load(path, mmap_mode="r+")
+            except ValueError:
+                existing = None
+            if existing is not None and existing.shape == tuple(shape) and existing.dtype == np.float32:
+                return existing
+        # Sparse file on creation, pages are only written once transitions land in them
+        return np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=shape)
+
+    def add(self, obs, next_obs, action, reward, done, infos) -> None:
+        pos = self.pos
+        super().add(obs, next_obs, action, reward, done, infos)
+        if self.prioritized:
+            # New transitions are sampled at least once before their TD error is known
+            self.priorities[pos] = self.max_priority ** self.alpha
+
+    def load_demonstrations(self, observations: np.ndarray, actions: np.ndarray, rewards: Optional[np.ndarray] = None,
+                            next_observations: Optional[np.ndarray] = None, dones: Optional[np.ndarray] = None) -> None:
+        """
+        @brief Load expert transitions (e.g. BCPretrain.build_bc_dataset) into the expert store, replacing
+               previous ones. They are never overwritten by agent transitions.
+        @param observations: (N, *obs_shape) observations, in the same (unnormalized) form the env returns.
+        @param actions: (N, action_dim) actions in the env's action range.
+        @param rewards: (N,) rewards, zeros when the demonstrations carry none.
+        @param next_observations: (N, *obs_shape), default is the following row with the last one terminal.
+        @param dones: (N,) episode ends, default only the last row.
+        """
+        n = len(observations)
+        if n == 0:
+            return
+        if next_observations is None:
+            next_observations = np.concatenate([observations[1:], observations[-1:]])
+            if dones is None:
+                dones = np.zeros(n, dtype=np.float32)
+                dones[-1] = 1.0
+        self.expert_observations = self._column("expert_observations", (n, *self.obs_shape))
+        self.expert_next_observations = self._column("expert_next_observations", (n, *self.obs_shape))
+        self.expert_actions = self._column("expert_actions", (n, self.action_dim))
+        self.expert_rewards = self._column("expert_rewards", (n,))
+        self.expert_dones = self._column("expert_dones", (n,))
+        self.expert_observations[:] = np.reshape(observations, (n, *self.obs_shape))
+        self.expert_next_observations[:] = np.reshape(next_observations, (n, *self.obs_shape))
+        self.expert_actions[:] = np.reshape(actions, (n, self.action_dim))
+        self.expert_rewards[:] = 0.0 if rewards is None else rewards
+        self.expert_dones[:] = 0.0 if dones is None else dones
+        self.expert_size = n
+
+    def _sample_agent(self, n: int):
+        """Flat indices of n agent transitions and their importance sampling weights."""
+        upper = self.buffer_size if self.full else self.pos
+        if n == 0 or upper == 0:
+            # Batches of demonstrations only (expert_ratio 1, or nothing collected yet)
+            return np.zeros(0, dtype=np.int64), np.ones(0, dtype=np.float32)
+        if not self.prioritized:
+            if self.optimize_memory_usage and self.full:
+                # The row at pos holds the next observation of pos - 1 only, skip it
+                rows = (np.random.randint(1, self.buffer_size, size=n) + self.pos) % self.buffer_size
+            else:
+                rows = np.random.randint(0, upper, size=n)
+            return rows * self.n_envs + np.random.randint(0, self.n_envs, size=n), np.ones(n, dtype=np.float32)
+
+        probabilities = self.priorities[:upper].reshape(-1)
+        if self.optimize_memory_usage and self.full:
+            probabilities = probabilities.copy()
+            probabilities[self.pos * self.n_envs:(self.pos + 1) * self.n_envs] = 0.0
+        cumulative = np.cumsum(probabilities, dtype=np.float64)
+        total = cumulative[-1]
+        # Stratified draw: one uniform point per equal slice of the total mass, located by binary search
+        points = (np.arange(n) + np.random.random_sample(n)) * (total / n)
+        indices = np.minimum(np.searchsorted(cumulative, points, side="right"), len(cumulative) - 1)
+        weights = (len(cumulative) * probabilities[indices] / total) ** -self.beta
+        return indices, (weights / weights.max()).astype(np.float32)
+
+    def sample(self, batch_size: int, env: Optional[VecNormalize] = None) -> ReplayBufferSamples:
+        n_expert = int(round(batch_size * self.expert_ratio)) if self.expert_size else 0
+        if self.expert_size and self.pos == 0 and not self.full:
+            # Nothing collected yet, e.g. critic pretraining on the demonstrations alone
+            n_expert = batch_size
+        agent_indices, agent_weights = self._sample_agent(batch_size - n_expert)
+        rows, env_indices = np.divmod(agent_indices, self.n_envs)
+
+        if self.optimize_memory_usage:
+            next_obs = self.observations[(rows + 1) % self.buffer_size, env_indices]
+        else:
+            next_obs = self.next_observations[rows, env_indices]
+        observations = self.observations[rows, env_indices]
+        actions = self.actions[rows, env_indices]
+        # Only use dones that are not due to timeouts
+        dones = self.dones[rows, env_indices] * (1 - self.timeouts[rows, env_indices])
+        rewards = self.rewards[rows, env_indices]
+
+        if n_expert:
+            expert = np.random.randint(0, self.expert_size, size=n_expert)
+            observations = np.concatenate([observations, self.expert_observations[expert]])
+            actions = np.concatenate([actions, self.expert_actions[expert]])
+            next_obs = np.concatenate([next_obs, self.expert_next_observations[expert]])
+            dones = np.concatenate([dones, self.expert_dones[expert]])
+            rewards = np.concatenate([rewards, self.expert_rewards[expert]])
+
+        self.last_indices = np.concatenate([agent_indices, np.full(n_expert, -1, dtype=np.int64)])
+        self.last_weights = np.concatenate([agent_weights, np.ones(n_expert, dtype=np.float32)])
+        data = (
+            self._normalize_obs(observations, env),
+            actions,
+            self._normalize_obs(next_obs, env),
+            dones.reshape(-1, 1),
+            self._normalize_reward(rewards.reshape(-1, 1), env),
+        )
+        return ReplayBufferSamples(*tuple(map(self.to_torch, data)))
+
+    def update_priorities(self, indices: np.ndarray, td_errors: np.ndarray) -> None:
+        """Set the priorities of sampled transitions (last_indices) to |TD error|, expert rows are skipped."""
+        if not self.prioritized:
+            return
+        indices = np.asarray(indices)
+        priorities = np.abs(np.asarray(td_errors, dtype=np.float64).reshape(-1)) + self.priority_eps
+        agent = indices >= 0
+        rows, env_indices = np.divmod(indices[agent], self.n_envs)
+        self.priorities[rows, env_indices] = priorities[agent] ** self.alpha
+        if agent.any():
+            self.max_priority = max(self.max_priority, float(priorities[agent].max()))
+
+    def flush(self) -> None:
+        """Write memory-mapped columns to disk."""
+        for name in AGENT_COLUMNS + EXPERT_COLUMNS:
+            column = getattr(self, name, None)
+            if isinstance(column, np.memmap):
+                column.flush()
+
+    def __getstate__(self):
+        # SB3's save_replay_buffer pickles the buffer, memory-mapped columns are saved as their file
+        # instead of being copied into the pickle
+        state = self.__dict__.copy()
+        if self.storage_dir is not None:
+            self.flush()
+            for name in AGENT_COLUMNS + EXPERT_COLUMNS:
+                if isinstance(state.get(name), np.memmap):
+                    state[name] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.storage_dir is None:
+            return
+        for name in AGENT_COLUMNS + EXPERT_COLUMNS:
+            path = os.path.join(self.storage_dir, f"{name}.npy")
+            if getattr(self, name, None) is None and os.path.exists(path):
+                if name == "priorities" and not self.prioritized:
+                    continue
+                if name.startswith("expert_") and not self.expert_size:
+                    continue
+                setattr(self, name, np.load(path, mmap_mode="r+"))
+
+
+class PrioritizedSAC(SAC):
+    """
+    @brief SAC whose critic loss is weighted by the replay buffer's importance sampling weights and which
+           feeds the TD errors back as priorities. Same as SAC with any buffer that is not prioritized.
+    """
+    def train(self, gradient_steps: int, batch_size: int = 64) -> None:
+        prioritized = isinstance(self.replay_buffer, DiskReplayBuffer) and self.replay_buffer.prioritized
+        if not prioritized:
+            return super().train(gradient_steps, batch_size)
+
+        self.policy.set_training_mode(True)
+        optimizers = [self.actor.optimizer, self.critic.optimizer]
+        if self.ent_coef_optimizer is not None:
+            optimizers += [self.ent_coef_optimizer]
+        self._update_learning_rate(optimizers)
+
+        ent_coef_losses, ent_coefs = [], []
+        actor_losses, critic_losses = [], []
+
+        for gradient_step in range(gradient_steps):
+            replay_data = self.replay_buffer.sample(batch_size, env=self._vec_normalize_env)
+            indices = self.replay_buffer.last_indices
+            weights = th.as_tensor(self.replay_buffer.last_weights, device=self.device).reshape(-1, 1)
+            discounts = replay_data.discounts if replay_data.discounts is not None else self.gamma
+
+            if self.use_sde:
+                self.actor.reset_noise()
+            actions_pi, log_prob = self.actor.action_log_prob(replay_data.observations)
+            log_prob = log_prob.reshape(-1, 1)
+
+            ent_coef_loss = None
+            if self.ent_coef_optimizer is not None and self.log_ent_coef is not None:
+                ent_coef = th.exp(self.log_ent_coef.detach())
+                ent_coef_loss = -(self.log_ent_coef * (log_prob + self.target_entropy).detach()).mean()
+                ent_coef_losses.append(ent_coef_loss.item())
+            else:
+                ent_coef = self.ent_coef_tensor
+            ent_coefs.append(ent_coef.item())
+            if ent_coef_loss is not None and self.ent_coef_optimizer is not None:
+                self.ent_coef_optimizer.zero_grad()
+                ent_coef_loss.backward()
+                self.ent_coef_optimizer.step()
+
+            with th.no_grad():
+                next_actions, next_log_prob = self.actor.action_log_prob(replay_data.next_observations)
+                next_q_values = th.cat(self.critic_target(replay_data.next_observations, next_actions), dim=1)
+                next_q_values, _ = th.min(next_q_values, dim=1, keepdim=True)
+                next_q_values = next_q_values - ent_coef * next_log_prob.reshape(-1, 1)
+                target_q_values = replay_data.rewards + (1 - replay_data.dones) * discounts * next_q_values
+
+            current_q_values = self.critic(replay_data.observations, replay_data.actions)
+            # Importance sampling weights correct for the skew of prioritized sampling
+            critic_loss = 0.5 * sum((weights * F.mse_loss(current_q, target_q_values, reduction="none")).mean()
+                                    for current_q in current_q_values)
+            critic_losses.append(critic_loss.item())
+            self.critic.optimizer.zero_grad()
+            critic_loss.backward()
+            self.critic.optimizer.step()
+
+            # New priority: TD error of the first critic
+            td_errors = (current_q_values[0] - target_q_values).detach().cpu().numpy()
+            self.replay_buffer.update_priorities(indices, td_errors)
+
+            q_values_pi = th.cat(self.critic(replay_data.observations, actions_pi), dim=1)
+            min_qf_pi, _ = th.min(q_values_pi, dim=1, keepdim=True)
+            actor_loss = (ent_coef * log_prob - min_qf_pi).mean()
+            actor_losses.append(actor_loss.item())
+            self.actor.optimizer.zero_grad()
+            actor_loss.backward()
+            self.actor.optimizer.step()
+
+            if gradient_step % self.target_update_interval == 0:
+                polyak_update(self.critic.parameters(), self.critic_target.parameters(), self.tau)
+                polyak_update(self.batch_norm_stats, self.batch_norm_stats_target, 1.0)
+
+        self._n_updates += gradient_steps
+        self.logger.record("train/n_updates", self._n_updates, exclude="tensorboard")
+        self.logger.record("train/ent_coef", np.mean(ent_coefs))
+        self.logger.record("train/actor_loss", np.mean(actor_losses))
+        self.logger.record("train/critic_loss", np.mean(critic_losses))
+        if len(ent_coef_losses) > 0:
+            self.logger.record("train/ent_coef_loss", np.mean(ent_coef_losses))
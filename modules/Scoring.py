@@ -0,0 +1,173 @@
+import os
+import csv
+import sqlite3
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from TelemetryReader import DEFAULT_DB_PATH, DEFAULT_NAMESPACE, STATE_FIELDS, read_states
+from PathLibrary import ExpertPath, load_library, load_path_file
+
+# Offline tracking error of recorded trajectories against an expert path, with the same error terms and
+# weights as AUVEnv's reward, so a run scored here gets the return it would have earned step by step.
+
+# Reward = -(position * distance to the nearest waypoint + rotation * rotation error + velocity * velocity error)
+REWARD_WEIGHTS = {"position": 1.0, "rotation": 0.1, "velocity": 0.05}
+
+# Column slices of STATE_FIELDS per error component
+COMPONENTS = {"position": slice(0, 3), "rotation": slice(3, 6), "velocity": slice(6, 9)}
+
+# Columns of the summary table, in order
+SUMMARY_FIELDS = ["run", "samples", "reward", "progress"] + [
+    f"{component}_{stat}" for component in COMPONENTS for stat in ("mean", "p95", "max")]
+
+
+def tracking_errors(states: np.ndarray, waypoints: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    @brief Per sample error components between (N, 9) states and their matched (N, 9) waypoints.
+    @return {'position', 'rotation', 'velocity'} -> (N,) Euclidean norms of the STATE_FIELDS groups.
+    """
+    states = np.asarray(states, dtype=np.float64).reshape(-1, 9)
+    waypoints = np.asarray(waypoints, dtype=np.float64).reshape(-1, 9)
+    return {name: np.linalg.norm(states[:, columns] - waypoints[:, columns], axis=1)
+            for name, columns in COMPONENTS.items()}
+
+
+def tracking_reward(errors: Dict[str, np.ndarray], weights: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """Per sample reward from tracking_errors, weights default to REWARD_WEIGHTS."""
+    weights = {**REWARD_WEIGHTS, **(weights or {})}
+    return -sum(weights[name] * errors[name] for name in COMPONENTS)
+
+
+def score_trajectory(states: np.ndarray, path: ExpertPath,
+                     weights: Optional[Dict[str, float]] = None) -> Dict[str, np.ndarray]:
+    """
+    @brief Score a whole (N, 9) trajectory against an expert path in one pass.
+    @return Per sample arrays: 'nearest' waypoint index, the error components and 'reward'.
+    """
+    states = np.asarray(states, dtype=np.float64).reshape(-1, 9)
+    nearest = path.nearest_batch(states[:, :3])
+    errors = tracking_errors(states, path.waypoints[nearest])
+    return {"nearest": nearest, **errors, "reward": tracking_reward(errors, weights)}
+
+
+def summarize(scores: Dict[str, np.ndarray], path_length: int) -> Dict[str, float]:
+    """Aggregate of score_trajectory: total reward, furthest waypoint reached and error statistics."""
+    samples = len(scores["reward"])
+    summary = {"samples": samples, "reward": float(scores["reward"].sum()),
+               "progress": float(scores["nearest"].max() / max(path_length - 1, 1)) if samples else 0.0}
+    for name in COMPONENTS:
+        values = scores[name] if samples else np.zeros(1)
+        summary[f"{name}_mean"] = float(values.mean())
+        summary[f"{name}_p95"] = float(np.percentile(values, 95))
+        summary[f"{name}_max"] = float(values.max())
+    return summary
+
+
+def load_expert_path(source: str, path_id: Optional[str] = None) -> ExpertPath:
+    """An expert path from a path file (.json/.npy) or, with path_id, from a path library directory."""
+    if os.path.isdir(source):
+        library = load_library(source)
+        return library.get(path_id) if path_id else library.path(0)
+    waypoints = load_path_file(source)
+    if waypoints is None or len(waypoints) == 0:
+        raise ValueError(f"No waypoints in {source}")
+    return ExpertPath.from_array(os.path.splitext(os.path.basename(source))[0], waypoints)
+
+
+def load_run(source: str, namespace: str = DEFAULT_NAMESPACE, start: Optional[str] = None,
+             stop: Optional[str] = None) -> np.ndarray:
+    """
+    @brief Load a recorded trajectory as (N, 9) STATE_FIELDS states.
+    @param source: data.db (one namespace, optionally a start/stop window), an exported .npy/.json path
+                   (expert_path_creator format) or a .csv with STATE_FIELDS columns.
+    """
+    if source.endswith('.db'):
+        return read_states(source, start, stop, namespace)[1]
+    if source.endswith('.csv'):
+        table = np.genfromtxt(source, delimiter=',', names=True)
+        return np.stack([table[field] for field in STATE_FIELDS], axis=1).reshape(-1, 9)
+    states = load_path_file(source)
+    if states is None:
+        raise ValueError(f"Cannot read a trajectory from {source}")
+    return states
+
+
+def db_namespaces(db_path: str) -> List[str]:
+    """Namespaces with position rows in data.db, just the default one for databases without namespaces."""
+    connection = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    try:
+        if not any(row[1] == 'namespace' for row in connection.execute("PRAGMA table_info(position)")):
+            return [DEFAULT_NAMESPACE]
+        return [row[0] for row in connection.execute("SELECT DISTINCT namespace FROM position ORDER BY namespace")]
+    finally:
+        connection.close()
+
+
+# Expert path of a worker process, loaded once per worker instead of once per run
+_worker_path: Optional[ExpertPath] = None
+
+
+def _init_worker(path_source: str, path_id: Optional[str]) -> None:
+    global _worker_path
+    _worker_path = load_expert_path(path_source, path_id)
+
+
+def _score_run(run: Tuple[str, str, str, Optional[str], Optional[str]],
+               weights: Optional[Dict[str, float]]) -> Dict[str, float]:
+    name, source, namespace, start, stop = run
+    scores = score_trajectory(load_run(source, namespace, start, stop), _worker_path, weights)
+    return {"run": name, **summarize(scores, len(_worker_path))}
+
+
+def score_runs(runs: List[Tuple[str, str, str, Optional[str], Optional[str]]], path_source: str,
+               path_id: Optional[str] = None, weights: Optional[Dict[str, float]] = None,
+               workers: Optional[int] = None) -> List[Dict[str, float]]:
+    """
+    @brief Score many recorded runs in parallel, one process per core.
+    @param runs: (name, source, namespace, start, stop) per run, see load_run.
+    @param path_source: Expert path file or library directory, see load_expert_path.
+    @return One summary row per run, in the order of runs.
+    """
+    workers = min(workers or os.cpu_count() or 1, max(len(runs), 1))
+    if workers == 1:
+        _init_worker(path_source, path_id)
+        return [_score_run(run, weights) for run in runs]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(path_source, path_id)) as pool:
+        return list(pool.map(_score_run, runs, [weights] * len(runs)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score recorded trajectories against an expert path")
+    parser.add_argument("--path", type=str, required=True, help="Expert path file (.json/.npy) or path library directory")
+    parser.add_argument("--path_id", type=str, default=None, help="Path id when --path is a library (default: its first path)")
+    parser.add_argument("--db", type=str, nargs="*", default=[], help=f"DBPackage databases to score (e.g. {DEFAULT_DB_PATH})")
+    parser.add_argument("--namespace", type=str, nargs="*", default=None, help="Namespaces to score per database (default: all of them)")
+    parser.add_argument("--start", type=str, default=None, help="First datetime of the database window (YYYY-MM-DD HH:MM:SS)")
+    parser.add_argument("--stop", type=str, default=None, help="Last datetime of the database window (YYYY-MM-DD HH:MM:SS)")
+    parser.add_argument("--runs", type=str, nargs="*", default=[], help="Exported trajectories (.npy, .json or .csv)")
+    parser.add_argument("--workers", type=int, default=None, help="Parallel processes (default: one per core)")
+    parser.add_argument("--output", type=str, default=None, help="Write the summary table to this CSV")
+    args = parser.parse_args()
+
+    runs = []
+    for db_path in args.db:
+        for namespace in args.namespace or db_namespaces(db_path):
+            runs.append((f"{db_path}:{namespace}", db_path, namespace, args.start, args.stop))
+    runs += [(source, source, DEFAULT_NAMESPACE, None, None) for source in args.runs]
+    if not runs:
+        parser.error("nothing to score, give --db and/or --runs")
+
+    results = score_runs(runs, args.path, args.path_id, workers=args.workers)
+    print(f"{'run':40s} {'samples':>8} {'reward':>12} {'progress':>8} {'pos_mean':>9} {'rot_mean':>9} {'vel_mean':>9}")
+    for row in sorted(results, key=lambda r: -r["reward"]):
+        print(f"{row['run'][-40:]:40s} {row['samples']:8d} {row['reward']:12.2f} {row['progress']:8.2f} "
+              f"{row['position_mean']:9.3f} {row['rotation_mean']:9.3f} {row['velocity_mean']:9.3f}")
+    if args.output:
+        with open(args.output, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+        print(f"[INFO] Scores saved to {args.output}")
@@ -0,0 +1,284 @@
+import os
+import sqlite3
+import argparse
+from functools import reduce
+from typing import Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+# Flask-SQLAlchemy resolves the relative 'sqlite:///data.db' URI of DBPackage against the app's instance folder
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(__file__), 'instance', 'data.db')
+
+# Same format DBPackage parses the 'datetime' column with (stored values carry microseconds as well)
+DB_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Namespace DBPackage stores rows under when a client uses the plain /<table> routes
+DEFAULT_NAMESPACE = 'default'
+
+# Column layout of one telemetry state (and of one expert path waypoint)
+STATE_FIELDS = ["X", "Y", "Z", "Roll", "Pitch", "Yaw", "vel_x", "vel_y", "vel_z"]
+
+# DBPackage table -> columns that make up its part of a state
+STATE_TABLES = [
+    ('position', ['X', 'Y', 'Z']),
+    ('rotation', ['Roll', 'Pitch', 'Yaw']),
+    ('velocity', ['Vx', 'Vy', 'Vz']),
+]
+
+# Columns of STATE_FIELDS that are angles in degrees and wrap at 360
+ANGLE_COLUMNS = [3, 4, 5]
+
+# Inputs table columns, and the layout of an aligned frame: the state followed by the command in force
+INPUT_COLUMNS = ['X', 'Y', 'Z', 'Roll', 'Pitch', 'Yaw', 'Arm', 'S1', 'S2', 'S3']
+FRAME_FIELDS = STATE_FIELDS + [f"cmd_{column}" for column in INPUT_COLUMNS]
+
+
+def to_seconds(datetimes) -> np.ndarray:
+    """Convert the stored datetime strings to float seconds (vectorized)."""
+    return np.array(datetimes, dtype='datetime64[us]').astype(np.int64) / 1e6
+
+
+def table_columns(db_path: str, table: str) -> Set[str]:
+    connection = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    try:
+        return {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+    finally:
+        connection.close()
+
+
+def iter_table(db_path: str, table: str, columns: List[str], start: Optional[str] = None, stop: Optional[str] = None,
+               chunk_size: int = 10000, namespace: str = DEFAULT_NAMESPACE,
+               sources: Optional[Sequence[Optional[str]]] = None) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    @brief Stream rows of a DBPackage table in chunks, oldest first.
+    @param db_path: Path to data.db.
+    @param table: Table name ('inputs', 'position', 'rotation', 'velocity').
+    @param columns: Value columns to read.
+    @param start: Optional first datetime (inclusive), DB_DATETIME_FORMAT.
+    @param stop: Optional last datetime (inclusive), DB_DATETIME_FORMAT, optionally with microseconds
+                 (e.g. the start_datetime/stop_datetime of a recorded run).
+    @param chunk_size: Rows per chunk.
+    @param namespace: Vehicle/env namespace to read. Databases from before namespacing only hold 'default'.
+    @param sources: Inputs table only, rows written by these sources (None matches rows without one).
+    @return Iterator of (seconds, values) arrays, values is float64 (rows, len(columns)).
+    """
+    connection = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    query = f"SELECT datetime, {', '.join(columns)} FROM {table}"
+    where, params = [], []
+    existing = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+    if sources is not None:
+        named = [source for source in sources if source is not None]
+        if 'source' in existing:
+            match = [f"source IN ({', '.join('?' * len(named))})"] if named else []
+            if None in sources:
+                match.append("source IS NULL")
+            where.append("(" + " OR ".join(match or ["0"]) + ")")
+            params.extend(named)
+        elif None not in sources:
+            # Every row of a database without sources is sourceless
+            where.append("0")
+    if 'namespace' in existing:
+        # Served by the (namespace, datetime) index
+        where.append("namespace = ?")
+        params.append(namespace)
+    elif namespace != DEFAULT_NAMESPACE:
+        connection.close()
+        raise ValueError(f"{db_path} has no namespaces, only '{DEFAULT_NAMESPACE}' can be read")
+    if start is not None:
+        where.append("datetime >= ?")
+        params.append(start)
+    if stop is not None:
+        # Stored values carry microseconds, so a whole second stop compares against the end of that second
+        where.append("datetime <= ?")
+        params.append(stop if '.' in stop else stop + '.999999')
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += " ORDER BY id"
+
+    try:
+        cursor = connection.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            times = to_seconds([row[0] for row in rows])
+            values = np.array([row[1:] for row in rows], dtype=np.float64)
+            yield times, values
+    finally:
+        connection.close()
+
+
+def read_table(db_path: str, table: str, columns: List[str], start: Optional[str] = None,
+               stop: Optional[str] = None, namespace: str = DEFAULT_NAMESPACE,
+               sources: Optional[Sequence[Optional[str]]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Read a whole table (or time window) of one namespace into (seconds, values) arrays, see iter_table."""
+    chunks = list(iter_table(db_path, table, columns, start, stop, namespace=namespace, sources=sources))
+    if not chunks:
+        return np.zeros(0), np.zeros((0, len(columns)))
+    return np.concatenate([c[0] for c in chunks]), np.concatenate([c[1] for c in chunks])
+
+
+def read_states(db_path: str, start: Optional[str] = None, stop: Optional[str] = None,
+                namespace: str = DEFAULT_NAMESPACE) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    @brief Read position, rotation and velocity into one (N, 9) STATE_FIELDS array, oldest first.
+    @note Rows the bridge stamped with a tick id are joined on it, ticks missing from any table are
+          dropped, and their times come from the bridge's monotonic t_mono (see monotonic_seconds). Older
+          rows without one are paired by row order (the bridge posts the three tables once per tick in the
+          same order), truncated to the shortest table and timed by their datetime.
+    @return (seconds, states), seconds on the wall clock scale of the datetime column.
+    """
+    ticked = all('tick' in table_columns(db_path, table) for table, _ in STATE_TABLES)
+    parts = [read_table(db_path, table, columns + (['tick', 't_mono'] if ticked else []), start, stop, namespace)
+             for table, columns in STATE_TABLES]
+    if not ticked:
+        return _pair_by_row(parts)
+
+    has_tick = [~np.isnan(values[:, -2]) for _, values in parts]
+    legacy_times, legacy_states = _pair_by_row([(times[~mask], values[~mask, :-2])
+                                                for (times, values), mask in zip(parts, has_tick)])
+    ticks = [values[mask, -2].astype(np.int64) for (_, values), mask in zip(parts, has_tick)]
+    common = reduce(np.intersect1d, ticks)
+    columns, times = [], None
+    for (table_times, values), mask, table_ticks in zip(parts, has_tick, ticks):
+        # Row of every common tick in this table, in tick (= time) order
+        rows = np.intersect1d(common, table_ticks, return_indices=True)[2]
+        columns.append(values[mask][rows, :-2])
+        if times is None:
+            times = monotonic_seconds(table_times[mask][rows], values[mask][rows, -1])
+    times = np.concatenate([legacy_times, times])
+    states = np.concatenate([legacy_states, np.concatenate(columns, axis=1)])
+    order = np.argsort(times, kind='stable')
+    return times[order], states[order]
+
+
+def monotonic_seconds(wall: np.ndarray, mono: np.ndarray) -> np.ndarray:
+    """
+    @brief Sample times from the bridge's time.monotonic() stamps, moved onto the wall clock by the median
+           wall - monotonic offset. A wall clock step (NTP) then neither reorders samples nor opens gaps.
+    @param wall: Seconds of the datetime column, in tick order.
+    @param mono: t_mono of the same rows, NaN where the poster sent none (those keep their wall time).
+    @note The offset is taken per run of non-decreasing t_mono, the monotonic clock restarts with the host.
+    """
+    times = np.array(wall, dtype=np.float64)
+    stamped = np.flatnonzero(~np.isnan(mono))
+    if len(stamped) == 0:
+        return times
+    segments = np.concatenate([[0], np.cumsum(np.diff(mono[stamped]) < 0)])
+    for segment in range(segments[-1] + 1):
+        rows = stamped[segments == segment]
+        times[rows] = mono[rows] + np.median(wall[rows] - mono[rows])
+    return times
+
+
+def _pair_by_row(parts: List[Tuple[np.ndarray, np.ndarray]]) -> Tuple[np.ndarray, np.ndarray]:
+    n = min(len(times) for times, _ in parts)
+    times = parts[0][0][:n]
+    states = np.concatenate([values[:n] for _, values in parts], axis=1)
+    return times, states
+
+
+def asof_indices(t_left: np.ndarray, t_right: np.ndarray, tolerance: Optional[float] = None) -> np.ndarray:
+    """
+    @brief As-of join: index of the last right sample at or before each left time.
+    @param t_left: Query times, any order.
+    @param t_right: Sorted sample times.
+    @param tolerance: Treat right samples older than this many seconds as missing.
+    @return (len(t_left),) int64 indices into t_right, -1 where there is no match.
+    """
+    indices = np.searchsorted(t_right, t_left, side='right') - 1
+    if tolerance is not None:
+        matched = indices >= 0
+        stale = np.zeros(len(indices), dtype=bool)
+        stale[matched] = (np.asarray(t_left)[matched] - t_right[indices[matched]]) > tolerance
+        indices[stale] = -1
+    return indices
+
+
+def asof_join(t_left: np.ndarray, t_right: np.ndarray, values_right: np.ndarray,
+              tolerance: Optional[float] = None) -> np.ndarray:
+    """Values of the last right sample at or before each left time (see asof_indices), NaN rows where none."""
+    values_right = np.asarray(values_right, dtype=np.float64)
+    if len(values_right) == 0:
+        return np.full((len(t_left), *values_right.shape[1:]), np.nan)
+    indices = asof_indices(t_left, t_right, tolerance)
+    values = values_right[np.maximum(indices, 0)]
+    values[indices < 0] = np.nan
+    return values
+
+
+def interpolate(t_query: np.ndarray, t: np.ndarray, values: np.ndarray, max_gap: Optional[float] = None,
+                angle_columns: Sequence[int] = ()) -> np.ndarray:
+    """
+    @brief Linear interpolation of all columns of (N, C) values sampled at sorted times t.
+    @param max_gap: Leave NaN where the neighbouring samples are further apart than this many seconds.
+    @param angle_columns: Columns in degrees, interpolated the short way across the 0/360 seam.
+    @return (len(t_query), C) values, NaN outside [t[0], t[-1]].
+    """
+    t_query = np.asarray(t_query, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if len(t) == 0:
+        return np.full((len(t_query), values.shape[1]), np.nan)
+    if len(angle_columns):
+        values = values.copy()
+        values[:, angle_columns] = np.unwrap(values[:, angle_columns], period=360.0, axis=0)
+    upper = np.searchsorted(t, t_query, side='right')
+    lo = np.clip(upper - 1, 0, len(t) - 1)
+    hi = np.clip(upper, 0, len(t) - 1)
+    gap = t[hi] - t[lo]
+    weight = np.divide(t_query - t[lo], gap, out=np.zeros_like(t_query), where=gap > 0)
+    result = values[lo] + weight[:, None] * (values[hi] - values[lo])
+    valid = (t_query >= t[0]) & (t_query <= t[-1])
+    if max_gap is not None:
+        valid &= gap <= max_gap
+    result[~valid] = np.nan
+    if len(angle_columns):
+        result[:, angle_columns] = np.mod(result[:, angle_columns], 360.0)
+    return result
+
+
+def aligned_frames(db_path: str, rate: float = 10.0, start: Optional[str] = None, stop: Optional[str] = None,
+                   namespace: str = DEFAULT_NAMESPACE, max_gap: Optional[float] = 1.0,
+                   inputs: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    @brief Resample a run onto a fixed-rate time grid: states interpolated linearly on their monotonic
+           times (read_states), commands as-of (the command in force at each frame time) by their datetime.
+    @param rate: Frames per second.
+    @param max_gap: Seconds without telemetry (or since the last command) after which frames are NaN.
+    @param inputs: Append the commands, otherwise frames only hold the state.
+    @return (seconds, frames) with frames laid out as FRAME_FIELDS (STATE_FIELDS without inputs).
+    """
+    t_state, states = read_states(db_path, start, stop, namespace)
+    width = len(FRAME_FIELDS) if inputs else len(STATE_FIELDS)
+    if len(t_state) == 0:
+        return np.zeros(0), np.zeros((0, width))
+    grid = t_state[0] + np.arange(int(np.floor((t_state[-1] - t_state[0]) * rate)) + 1) / rate
+    frames = interpolate(grid, t_state, states, max_gap, ANGLE_COLUMNS)
+    if inputs:
+        t_in, commands = read_table(db_path, 'inputs', INPUT_COLUMNS, start, stop, namespace)
+        order = np.argsort(t_in, kind='stable')
+        frames = np.concatenate([frames, asof_join(grid, t_in[order], commands[order], max_gap)], axis=1)
+    return grid, frames
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a recorded run as aligned fixed-rate frames")
+    parser.add_argument("--db", type=str, default=DEFAULT_DB_PATH, help="Path to the DBPackage data.db")
+    parser.add_argument("--namespace", type=str, default=DEFAULT_NAMESPACE, help=f"Vehicle namespace (default: {DEFAULT_NAMESPACE})")
+    parser.add_argument("--start", type=str, default=None, help="First datetime of the run (YYYY-MM-DD HH:MM:SS)")
+    parser.add_argument("--stop", type=str, default=None, help="Last datetime of the run (YYYY-MM-DD HH:MM:SS)")
+    parser.add_argument("--rate", type=float, default=10.0, help="Frames per second (default: 10)")
+    parser.add_argument("--max_gap", type=float, default=1.0, help="Seconds without data after which frames are empty (default: 1)")
+    parser.add_argument("--no_inputs", action="store_true", help="Leave the commands out of the frames")
+    parser.add_argument("--output", type=str, default="frames.csv", help="Output .csv or .npy (time column first)")
+    args = parser.parse_args()
+
+    times, frames = aligned_frames(args.db, args.rate, args.start, args.stop, args.namespace, args.max_gap,
+                                   not args.no_inputs)
+    table = np.concatenate([times[:, None], frames], axis=1)
+    if args.output.endswith('.npy'):
+        np.save(args.output, table)
+    else:
+        fields = ['time'] + (STATE_FIELDS if args.no_inputs else FRAME_FIELDS)
+        np.savetxt(args.output, table, delimiter=',', header=','.join(fields), comments='', fmt='%.6f')
+    print(f"Wrote {len(times)} frames to {args.output}")
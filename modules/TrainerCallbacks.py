@@ -0,0 +1,145 @@
+import os
+import re
+import glob
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from stable_baselines3.common.callbacks import BaseCallback
+
+SUMMARY_HEADER = "timesteps,episode,total_reward,steps\n"
+
+
+def latest_checkpoint(checkpoint_dir: str, name_prefix: str = "auv_ppo") -> Optional[str]:
+    """Path of the checkpoint with the most timesteps written by CheckpointCallback, or None."""
+    best, best_steps = None, -1
+    for path in glob.glob(os.path.join(checkpoint_dir, f"{name_prefix}_*_steps.zip")):
+        match = re.search(r"_(\d+)_steps\.zip$", path)
+        if match and int(match.group(1)) > best_steps:
+            best, best_steps = path, int(match.group(1))
+    return best
+
+
+def checkpoint_vecnormalize(checkpoint: str) -> Optional[str]:
+    """VecNormalize statistics CheckpointCallback saved next to a checkpoint, or None."""
+    match = re.search(r"^(.*)_(\d+)_steps\.zip$", checkpoint)
+    if not match:
+        return None
+    path = f"{match.group(1)}_vecnormalize_{match.group(2)}_steps.pkl"
+    return path if os.path.exists(path) else None
+
+
+def append_summary(summary_csv: str, timesteps: int, results: List[Tuple[float, int]]) -> None:
+    """Append one evaluation round to the episode summary, writing the header for a new file."""
+    new_file = not os.path.exists(summary_csv)
+    with open(summary_csv, "a") as f:
+        if new_file:
+            f.write(SUMMARY_HEADER)
+        for episode, (total_reward, steps) in enumerate(results):
+            f.write(f"{timesteps},{episode},{total_reward:.2f},{steps}\n")
+
+
+def evaluate_model(model_path: str, env_kwargs: dict, episodes: int, deterministic: bool = True,
+                   vecnormalize_path: Optional[str] = None) -> List[Tuple[float, int]]:
+    """
+    @brief Run evaluation episodes of a saved model on its own env. Meant to run in a worker process,
+           so everything is imported and created here.
+    @param model_path: Saved PPO model.
+    @param env_kwargs: AUVEnv keyword arguments (URLs of a separate evaluation backend).
+    @param episodes: Number of episodes.
+    @param deterministic: Use the deterministic action.
+    @param vecnormalize_path: Observation normalization saved with the model. Statistics are frozen and
+                              rewards are reported unnormalized.
+    @return List of (total_reward, steps) per episode.
+    """
+    from stable_baselines3 import PPO
+    from stable_baselines3.common.vec_env import DummyVecEnv, VecNormalize
+    from EnvPackage import AUVEnv
+
+    env = DummyVecEnv([lambda: AUVEnv(**env_kwargs)])
+    if vecnormalize_path is not None and os.path.exists(vecnormalize_path):
+        env = VecNormalize.load(vecnormalize_path, env)
+        env.training = False
+        env.norm_reward = False
+    model = PPO.load(model_path, device="cpu")
+    results = []
+    for _ in range(episodes):
+        obs = env.reset()
+        done = False
+        total_reward = 0.0
+        steps = 0
+        while not done:
+            action, _ = model.predict(obs, deterministic=deterministic)
+            obs, rewards, dones, _ = env.step(action)
+            done = bool(dones[0])
+            total_reward += float(rewards[0])
+            steps += 1
+        results.append((total_reward, steps))
+    return results
+
+
+class AsyncEvalCallback(BaseCallback):
+    """
+    Every eval_freq steps, snapshot the model and evaluate the snapshot in a separate process against
+    a separate env backend, so data collection never waits for evaluation. Finished rounds are appended
+    to summary_csv as they complete; at most one round runs at a time and rounds that come due while
+    one is still running are skipped.
+    """
+    def __init__(self, eval_env_kwargs: dict, eval_freq: int, summary_csv: str, snapshot_dir: str,
+                 episodes: int = 5, verbose: int = 0):
+        super().__init__(verbose)
+        self.eval_env_kwargs = eval_env_kwargs
+        self.eval_freq = eval_freq
+        self.summary_csv = summary_csv
+        self.snapshot_dir = snapshot_dir
+        self.episodes = episodes
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.pending: Optional[Tuple[int, Future]] = None
+        self.last_eval = 0
+
+    def _init_callback(self) -> None:
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        # A learn() that crashed never reached _on_training_end, so the retry keeps its worker and pending round
+        if self.executor is None:
+            # spawn: a forked child would inherit torch threads and the training env's sockets
+            self.executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        self.last_eval = self.num_timesteps
+
+    def _collect(self, wait: bool = False) -> None:
+        if self.pending is None:
+            return
+        timesteps, future = self.pending
+        if not wait and not future.done():
+            return
+        self.pending = None
+        try:
+            results = future.result()
+        except Exception as e:
+            print(f"[WARN] Evaluation at {timesteps} timesteps failed: {e}")
+            return
+        append_summary(self.summary_csv, timesteps, results)
+        mean_reward = sum(r for r, _ in results) / max(1, len(results))
+        self.logger.record("eval/mean_reward", mean_reward)
+        if self.verbose:
+            print(f"[INFO] Eval at {timesteps} timesteps: mean reward {mean_reward:.2f}")
+
+    def _on_step(self) -> bool:
+        self._collect()
+        if self.num_timesteps - self.last_eval >= self.eval_freq:
+            self.last_eval = self.num_timesteps
+            if self.pending is None:
+                snapshot = os.path.join(self.snapshot_dir, f"eval_{self.num_timesteps}_steps")
+                self.model.save(snapshot)
+                vecnormalize_path = None
+                if self.model.get_vec_normalize_env() is not None:
+                    vecnormalize_path = snapshot + "_vecnormalize.pkl"
+                    self.model.get_vec_normalize_env().save(vecnormalize_path)
+                future = self.executor.submit(evaluate_model, snapshot, self.eval_env_kwargs, self.episodes,
+                                              True, vecnormalize_path)
+                self.pending = (self.num_timesteps, future)
+        return True
+
+    def _on_training_end(self) -> None:
+        self._collect(wait=True)
+        self.executor.shutdown(wait=True)
+        self.executor = None
@@ -1,8 +1,8 @@
 import cv2
-import pyautogui
 import numpy as np
 from flask import Flask, Response
 from threading import Thread
+import argparse
 import time
 
 # Unbuilt Unity game screen capture from within Unity
@@ -22,14 +22,27 @@ CAPTURE_REGIONS = [
 
 app = Flask(__name__)
 
-# Function to capture a screen region
+# Function to capture a screen region. pyautogui is imported on the first capture: it is slow to load
+# and needs a display, which --help or an import time report do not have
 def capture_screen(region):
+    import pyautogui
     x, y, width, height = region
     screenshot = pyautogui.screenshot(region=(x, y, width, height))
     frame = np.array(screenshot)
     frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
     return frame
 
+# Function to capture several regions from a single screenshot of their bounding box, so the frames are
+# of the same instant and the screen is grabbed once instead of once per region
+def capture_regions(regions):
+    left = min(x for x, _, _, _ in regions)
+    top = min(y for _, y, _, _ in regions)
+    right = max(x + width for x, _, width, _ in regions)
+    bottom = max(y + height for _, y, _, height in regions)
+    frame = capture_screen((left, top, right - left, bottom - top))
+    return [np.ascontiguousarray(frame[y - top:y - top + height, x - left:x - left + width])
+            for x, y, width, height in regions]
+
 # Function to generate video stream
 def generate_feed(region):
     while True:
@@ -53,8 +66,37 @@ def video_feed2():
 def video_feed3():
     return Response(generate_feed(CAPTURE_REGIONS[2]), mimetype='multipart/x-mixed-replace; boundary=frame')
 
+# Function to record every capture region at a fixed rate, independent of who is watching the streams
+def record_feeds(recorder, fps):
+    period = 1.0 / fps
+    next_tick = time.monotonic()
+    while True:
+        timestamp = time.time()
+        for i, frame in enumerate(capture_regions(CAPTURE_REGIONS)):
+            recorder.submit(f'cam{i + 1}', frame, timestamp)
+        next_tick += period
+        delay = next_tick - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            # Overran the tick, don't try to catch up with a burst of captures
+            next_tick = time.monotonic()
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Virtual camera streams")
+    parser.add_argument('--record', type=str, default=None, help='Directory to record the camera feeds to (default: off)')
+    parser.add_argument('--record_fps', type=float, default=20.0, help='Recording rate per camera (default: 20)')
+    args = parser.parse_args()
+
     time.sleep(10)
-    # Run the Flask app on port 5000
+    # Run the Flask app on port 5001
     thread = Thread(target=app.run, kwargs={'host': '0.0.0.0', 'port': 5001, 'debug': False})
-    thread.start()
\ No newline at end of file
+    thread.start()
+
+    if args.record:
+        from Recorder import RunRecorder
+        recorder = RunRecorder(root=args.record, fps=args.record_fps)
+        try:
+            record_feeds(recorder, args.record_fps)
+        except KeyboardInterrupt:
+            recorder.close()
\ No newline at end of file
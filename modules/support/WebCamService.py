@@ -4,10 +4,12 @@ import cv2
 class WebCam:
     '''webcam class has ip and camera number attributes so the cameras can exist
     across multiple files'''
-    def __init__(self, ip=None, camera_number=None):
+    def __init__(self, ip=None, camera_number=None, recorder=None):
         self.ip = ip
         self.camera_number = camera_number
         self.capture = None
+        # Optional Recorder.RunRecorder, every frame served is also queued for recording
+        self.recorder = recorder
 
     def get_frame(self, capture):
         while True:
@@ -16,6 +18,8 @@ class WebCam:
                 frame = self.crop_frame(frame)
             if not hasFrame:
                 raise Exception("Camera frame not obtained")
+            if self.recorder is not None:
+                self.recorder.submit(self.camera_number, frame)
 
             _, jpeg = cv2.imencode('.jpg', frame)
             
@@ -1,8 +1,10 @@
 import os
-import numpy as np
-from stable_baselines3 import PPO
-from stable_baselines3.common.logger import configure
-from EnvPackage import AUVEnv  # Make sure auv_env.py contains your AUVEnv class
+import argparse
+from TelemetryReader import DEFAULT_DB_PATH
+
+# stable_baselines3/torch, the env and the callbacks are imported in main(): they take most of a second to
+# load, which --help and argument errors should not pay. The spawned evaluation worker, which re-imports
+# this file, skips them too
 
 # === Configuration ===
 position_url = "http://localhost:5000/position"
@@ -12,45 +14,184 @@ inputs_url = "http://localhost:5000/inputs"
 
 log_dir = "ppo_logs"
 model_path = "auv_ppo_model"
+vecnormalize_path = model_path + "_vecnormalize.pkl"  # Running observation/return statistics, needed for inference
 summary_csv = "episode_summary.csv"
 train_timesteps = 100_000
 eval_episodes = 10
 
-os.makedirs(log_dir, exist_ok=True)
-
-# === Create environment ===
-env = AUVEnv(position_url, rotation_url, velocity_url, inputs_url)
-
-# === Setup Stable Baselines Logger ===
-logger = configure(folder=log_dir, format_strings=["stdout", "csv", "tensorboard"])
-
-# === Initialize PPO agent ===
-model = PPO("MlpPolicy", env, verbose=1)
-model.set_logger(logger)
-
-# === Train the model ===
-print(f"[INFO] Training model for {train_timesteps} timesteps...")
-model.learn(total_timesteps=train_timesteps)
-model.save(model_path)
-print(f"[INFO] Model saved to {model_path}")
-
-# === Evaluate and log results ===
-print(f"[INFO] Running evaluation over {eval_episodes} episodes...")
-with open(summary_csv, "w") as f:
-    f.write("episode,total_reward,steps\n")
-    for episode in range(eval_episodes):
-        obs, _ = env.reset()
-        done = False
-        total_reward = 0
-        steps = 0
-
-        while not done:
-            action, _ = model.predict(obs, deterministic=True)
-            obs, reward, done, _, _ = env.step(action)
-            total_reward += reward
-            steps += 1
-
-        f.write(f"{episode},{total_reward:.2f},{steps}\n")
+# Running mean/variance normalization of observations and returns (SB3 VecNormalize)
+normalize_obs = True
+normalize_reward = True
+clip_obs = 10.0
+
+# Behavioral cloning pretraining on recorded operator runs (skipped when the database has no armed commands)
+bc_db_path = DEFAULT_DB_PATH
+bc_epochs = 20
+bc_batch_size = 256
+bc_learning_rate = 1e-3
+bc_model_path = "auv_bc_model"
+
+# Checkpointing and resume
+checkpoint_dir = os.path.join(log_dir, "checkpoints")
+checkpoint_prefix = "auv_ppo"
+checkpoint_freq = 5_000
+resume = True
+max_restarts = 5  # Times training is resumed from the last checkpoint after a crash (e.g. simulator/bridge down)
+
+# Periodic evaluation in a separate process against a separate DBPackage/bridge/simulator (e.g. --eval_port
+# 5010). Without one there is no periodic evaluation, the simulator is busy training, and the final
+# evaluation runs on the first training env once training is done
+eval_freq = 10_000
+eval_round_episodes = 3
+eval_env_kwargs = None
+
+
+def env_urls(host: str, port: int, namespace: str = None) -> dict:
+    """AUVEnv URL arguments for the DBPackage at host:port, under namespace when the store is shared."""
+    base_url = f"http://{host}:{port}" + (f"/{namespace}" if namespace else "")
+    return {f"{name}_url": f"{base_url}/{name}" for name in ("position", "rotation", "velocity", "inputs")}
+
+
+def load_normalization(venv, path=None):
+    """Wrap venv in VecNormalize, restoring saved statistics from path when given."""
+    from stable_baselines3.common.vec_env import VecNormalize
+
+    if not (normalize_obs or normalize_reward):
+        return venv
+    if path is not None:
+        print(f"[INFO] Restoring normalization statistics from {path}")
+        return VecNormalize.load(path, venv)
+    return VecNormalize(venv, norm_obs=normalize_obs, norm_reward=normalize_reward, clip_obs=clip_obs)
+
+
+def main(num_envs: int = 1, host: str = None, port: int = 5000, port_step: int = 100, shared_store: bool = False,
+         eval_port: int = None, mux_url: str = None):
+    """
+    @param num_envs: Simulator/DBPackage/bridge sets to collect from in parallel (see start.py --pairs).
+    @param host: DBPackage host, None uses the configured URLs.
+    @param port: DBPackage port of the first set, set i is at port + i * port_step.
+    @param shared_store: All envs use the one DBPackage at port, env i under namespace env{i}.
+    @param eval_port: DBPackage port of a separate evaluation set, None uses eval_env_kwargs.
+    @param mux_url: CommandMux in front of the first set (e.g. http://127.0.0.1:5002), its commands go to
+                    /inputs/policy there instead of the DBPackage so the operator can take over.
+    """
+    from stable_baselines3 import PPO
+    from stable_baselines3.common.callbacks import CallbackList, CheckpointCallback
+    from stable_baselines3.common.logger import configure
+    from stable_baselines3.common.monitor import Monitor
+    from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv, VecNormalize
+    from EnvPackage import AUVEnv  # Make sure auv_env.py contains your AUVEnv class
+    from TrainerCallbacks import AsyncEvalCallback, evaluate_model, append_summary, latest_checkpoint, checkpoint_vecnormalize
+
+    os.makedirs(log_dir, exist_ok=True)
+
+    # === Create environment ===
+    # VecNormalize keeps one set of running statistics for all envs of the VecEnv (numerically stable
+    # parallel mean/variance update), so adding envs to the list keeps them synchronized
+    if host is None:
+        env_kwargs = [dict(position_url=position_url, rotation_url=rotation_url, velocity_url=velocity_url, inputs_url=inputs_url)]
+    else:
+        env_kwargs = [env_urls(host, port, f"env{i}") if shared_store else env_urls(host, port + i * port_step)
+                      for i in range(num_envs)]
+    if mux_url is not None:
+        env_kwargs[0]["inputs_url"] = f"{mux_url.rstrip('/')}/inputs/policy"
+    env_fns = [lambda kwargs=kwargs: Monitor(AUVEnv(**kwargs)) for kwargs in env_kwargs]
+    eval_kwargs = env_urls(host or "localhost", eval_port) if eval_port is not None else eval_env_kwargs
+
+    def make_vec_env():
+        # Each env mostly waits on HTTP round trips, so several are stepped in their own processes
+        return DummyVecEnv(env_fns) if len(env_fns) == 1 else SubprocVecEnv(env_fns)
+
+    base_env = make_vec_env()
+
+    # === Setup Stable Baselines Logger ===
+    logger = configure(folder=log_dir, format_strings=["stdout", "csv", "tensorboard"])
+
+    # === Initialize PPO agent (or resume from the last checkpoint) ===
+    checkpoint = latest_checkpoint(checkpoint_dir, checkpoint_prefix) if resume else None
+    env = load_normalization(base_env, checkpoint_vecnormalize(checkpoint) if checkpoint else None)
+    if checkpoint:
+        print(f"[INFO] Resuming from checkpoint {checkpoint}")
+        model = PPO.load(checkpoint, env=env)
+    else:
+        model = PPO("MlpPolicy", env, verbose=1)
+    model.set_logger(logger)
+
+    # === Pretrain the policy on operator demonstrations ===
+    if not checkpoint and bc_db_path and os.path.exists(bc_db_path):
+        from BCPretrain import build_bc_dataset, pretrain_policy
+        bc_obs, bc_actions = build_bc_dataset(bc_db_path)
+        if len(bc_obs):
+            if isinstance(env, VecNormalize) and env.norm_obs:
+                # Seed the running statistics with the demonstrations so BC and PPO see the same inputs
+                env.obs_rms.update(bc_obs)
+                bc_obs = env.normalize_obs(bc_obs)
+            print(f"[INFO] Pretraining policy on {len(bc_obs)} demonstration samples...")
+            pretrain_policy(model, bc_obs, bc_actions, epochs=bc_epochs, batch_size=bc_batch_size, learning_rate=bc_learning_rate)
+            model.save(bc_model_path)
+            print(f"[INFO] Pretrained model saved to {bc_model_path}, warm-starting PPO from it")
+        else:
+            print(f"[INFO] No demonstrations in {bc_db_path}, training PPO from scratch")
+
+    # === Train the model ===
+    # model.save stores the policy and optimizer state, save_vecnormalize adds normalization stats when used
+    callbacks = [CheckpointCallback(save_freq=checkpoint_freq, save_path=checkpoint_dir, name_prefix=checkpoint_prefix,
+                                    save_vecnormalize=True)]
+    if eval_kwargs is not None:
+        callbacks.append(AsyncEvalCallback(eval_kwargs, eval_freq, summary_csv, os.path.join(log_dir, "eval"),
+                                           episodes=eval_round_episodes, verbose=1))
+    callbacks = CallbackList(callbacks)
+    restarts = 0
+    while model.num_timesteps < train_timesteps:
+        remaining = train_timesteps - model.num_timesteps
+        print(f"[INFO] Training model for {remaining} timesteps...")
+        try:
+            model.learn(total_timesteps=remaining, callback=callbacks, reset_num_timesteps=False)
+        except Exception as e:
+            checkpoint = latest_checkpoint(checkpoint_dir, checkpoint_prefix)
+            if restarts >= max_restarts or checkpoint is None:
+                raise
+            restarts += 1
+            print(f"[WARN] Training crashed ({e}), resuming from {checkpoint} ({restarts}/{max_restarts})")
+            # The crash may have left envs mid-episode or subprocess workers dead, so start from fresh ones
+            try:
+                base_env.close()
+            except Exception as close_error:
+                # SubprocVecEnv.close stops at the first dead worker, stop the ones still running
+                print(f"[WARN] Closing the crashed envs failed ({close_error}), terminating their workers")
+                for process in getattr(base_env, "processes", []):
+                    process.terminate()
+            base_env = make_vec_env()
+            env = load_normalization(base_env, checkpoint_vecnormalize(checkpoint))
+            model = PPO.load(checkpoint, env=env)
+            model.set_logger(logger)
+    model.save(model_path)
+    if isinstance(env, VecNormalize):
+        env.save(vecnormalize_path)
+    print(f"[INFO] Model saved to {model_path}")
+
+    # === Evaluate and log results ===
+    print(f"[INFO] Running evaluation over {eval_episodes} episodes...")
+    base_env.close()
+    results = evaluate_model(model_path, eval_kwargs or env_kwargs[0], eval_episodes,
+                             vecnormalize_path=vecnormalize_path if isinstance(env, VecNormalize) else None)
+    append_summary(summary_csv, model.num_timesteps, results)
+    for episode, (total_reward, steps) in enumerate(results):
         print(f"[Episode {episode}] Reward: {total_reward:.2f}, Steps: {steps}")
 
-print(f"[INFO] Evaluation results saved to {summary_csv}")
+    print(f"[INFO] Evaluation results saved to {summary_csv}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the AUV PPO policy")
+    parser.add_argument("--host", type=str, default=None, help="DBPackage host (default: the configured URLs)")
+    parser.add_argument("--port", type=int, default=5000, help="DBPackage port of the first env (default: 5000)")
+    parser.add_argument("--num_envs", type=int, default=1, help="Parallel envs, each with its own DBPackage/bridge/simulator (default: 1)")
+    parser.add_argument("--port_step", type=int, default=100, help="DBPackage port offset between envs (default: 100)")
+    parser.add_argument("--shared_store", action="store_true", help="All envs share the DBPackage at --port, env i under namespace env{i}")
+    parser.add_argument("--eval_port", type=int, default=None, help="DBPackage port of a separate evaluation set (default: evaluate on the first training env after training)")
+    parser.add_argument("--mux_url", type=str, default=None, help="CommandMux of the first env, e.g. http://127.0.0.1:5002 (default: post to the DBPackage)")
+    args = parser.parse_args()
+
+    main(num_envs=args.num_envs, host=args.host, port=args.port, port_step=args.port_step, shared_store=args.shared_store,
+         eval_port=args.eval_port, mux_url=args.mux_url)
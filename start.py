@@ -1,34 +1,356 @@
 import argparse
 import os
 import sys
+import shlex
+import signal
+import socket
 import subprocess
 import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+import requests
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+@dataclass
+class ProcessSpec:
+    """
+    One supervised process. Readiness is a 200 from health_url, or an accepted TCP connection on
+    ready_port, or just being alive when neither is set.
+    """
+    name: str
+    kind: str  # db, sim, bridge, mux, cameras, trainer, policy, policy_loop; --affinity/--nice/--realtime select by kind
+    cmd: List[str]
+    depends_on: List[str] = field(default_factory=list)
+    health_url: Optional[str] = None
+    ready_port: Optional[int] = None
+    ready_timeout: float = 30.0
+    env: Dict[str, str] = field(default_factory=dict)
+    cpus: Optional[List[int]] = None
+    nice: Optional[int] = None
+    realtime: Optional[int] = None  # SCHED_FIFO priority (1-99)
+    restart: bool = True
+
+
+def parse_cpus(text: str) -> List[int]:
+    """'0,2-3' -> [0, 2, 3]"""
+    cpus = []
+    for part in text.split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            cpus.extend(range(int(first), int(last) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def apply_priority(spec: ProcessSpec) -> None:
+    """Runs in the child before exec, so every thread the component starts inherits the settings."""
+    try:
+        if spec.cpus and hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, spec.cpus)
+        if spec.nice is not None:
+            os.setpriority(os.PRIO_PROCESS, 0, spec.nice)
+        if spec.realtime and hasattr(os, 'sched_setscheduler'):
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(spec.realtime))
+    except OSError:
+        # Not permitted (negative nice and SCHED_FIFO need CAP_SYS_NICE); Supervisor._check_priority reports it
+        pass
+
+
+class Supervisor:
+    """
+    Starts processes in dependency order, waiting for each to become ready before starting the ones that
+    depend on it, then restarts any that fail (non-zero exit) with exponential backoff. The backoff resets
+    once a process has stayed up for stable_time seconds. A process that exits with code 0 is done.
+    """
+    def __init__(self, specs: List[ProcessSpec], backoff: float = 1.0, max_backoff: float = 30.0,
+                 stable_time: float = 30.0, poll_interval: float = 0.5):
+        self.specs = {spec.name: spec for spec in specs}
+        self.order = self.start_order(specs)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stable_time = stable_time
+        self.poll_interval = poll_interval
+        self.processes: Dict[str, subprocess.Popen] = {}
+        self.started_at: Dict[str, float] = {}
+        self.delays: Dict[str, float] = {}
+        self.restart_at: Dict[str, float] = {}
+        self.restarts: Dict[str, int] = {name: 0 for name in self.specs}
+        self.finished: Set[str] = set()
+
+    @staticmethod
+    def start_order(specs: List[ProcessSpec]) -> List[str]:
+        """Topological order of the specs, keeping the given order among independent ones."""
+        names = [spec.name for spec in specs]
+        deps = {spec.name: list(spec.depends_on) for spec in specs}
+        for name, needed in deps.items():
+            for dep in needed:
+                if dep not in deps:
+                    raise ValueError(f"{name} depends on unknown process {dep}")
+        order: List[str] = []
+        while len(order) < len(names):
+            ready = [n for n in names if n not in order and all(d in order for d in deps[n])]
+            if not ready:
+                raise ValueError(f"Dependency cycle between {[n for n in names if n not in order]}")
+            order.append(ready[0])
+        return order
+
+    def _launch(self, spec: ProcessSpec) -> subprocess.Popen:
+        process = subprocess.Popen(spec.cmd, cwd=ROOT, env={**os.environ, **spec.env},
+                                   preexec_fn=(lambda: apply_priority(spec)) if os.name == 'posix' else None)
+        self.processes[spec.name] = process
+        self.started_at[spec.name] = time.monotonic()
+        self._check_priority(spec, process.pid)
+        return process
+
+    @staticmethod
+    def _check_priority(spec: ProcessSpec, pid: int) -> None:
+        try:
+            if spec.cpus and hasattr(os, 'sched_getaffinity') and os.sched_getaffinity(pid) != set(spec.cpus):
+                print(f"[WARN] Could not pin {spec.name} to CPUs {spec.cpus}")
+            if spec.nice is not None and os.getpriority(os.PRIO_PROCESS, pid) != spec.nice:
+                print(f"[WARN] Could not set nice {spec.nice} for {spec.name} (negative values need privileges)")
+            if spec.realtime and hasattr(os, 'sched_getscheduler') and os.sched_getscheduler(pid) != os.SCHED_FIFO:
+                print(f"[WARN] Could not set SCHED_FIFO {spec.realtime} for {spec.name} (needs CAP_SYS_NICE)")
+        except (OSError, AttributeError):
+            # The process already exited, or the platform has no scheduler API
+            pass
+
+    def _is_ready(self, spec: ProcessSpec) -> bool:
+        try:
+            if spec.health_url:
+                return requests.get(spec.health_url, timeout=1).status_code == 200
+            if spec.ready_port:
+                with socket.create_connection(('127.0.0.1', spec.ready_port), timeout=1):
+                    return True
+        except (requests.exceptions.RequestException, OSError):
+            return False
+        return True
+
+    def _wait_ready(self, spec: ProcessSpec) -> bool:
+        process = self.processes[spec.name]
+        deadline = time.monotonic() + spec.ready_timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                return False
+            if self._is_ready(spec):
+                return True
+            time.sleep(0.2)
+        return False
+
+    def start(self) -> None:
+        for name in self.order:
+            spec = self.specs[name]
+            print(f"[INFO] Starting {name}: {' '.join(spec.cmd)}")
+            self._launch(spec)
+            if not self._wait_ready(spec):
+                raise RuntimeError(f"{name} did not become ready within {spec.ready_timeout} s")
+            elapsed = time.monotonic() - self.started_at[name]
+            print(f"[INFO] {name} ready in {elapsed:.2f} s (pid {self.processes[name].pid})")
+
+    def poll(self) -> None:
+        """Restart failed processes whose backoff has elapsed."""
+        now = time.monotonic()
+        for name in self.order:
+            spec = self.specs[name]
+            process = self.processes.get(name)
+            if name in self.restart_at:
+                if now >= self.restart_at[name]:
+                    del self.restart_at[name]
+                    self.restarts[name] += 1
+                    print(f"[INFO] Restarting {name} (restart {self.restarts[name]})")
+                    self._launch(spec)
+                continue
+            if process is None or process.poll() is None:
+                if process is not None and now - self.started_at[name] >= self.stable_time:
+                    self.delays.pop(name, None)
+                continue
+            if process.returncode == 0:
+                if name not in self.finished:
+                    self.finished.add(name)
+                    print(f"[INFO] {name} finished")
+                continue
+            if not spec.restart:
+                continue
+            delay = self.delays.get(name, self.backoff)
+            self.delays[name] = min(delay * 2, self.max_backoff)
+            self.restart_at[name] = now + delay
+            print(f"[WARN] {name} exited with code {process.returncode}, restarting in {delay:.1f} s")
+
+    def run(self) -> None:
+        while True:
+            self.poll()
+            time.sleep(self.poll_interval)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Terminate in reverse start order, killing processes that do not exit within timeout."""
+        for name in reversed(self.order):
+            process = self.processes.get(name)
+            if process is None or process.poll() is not None:
+                continue
+            process.terminate()
+            try:
+                process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+
+# Module behind each kind of process, for --import_report
+REPORT_MODULES = {
+    'db': 'DBPackage',
+    'bridge': 'HardwareInterface',
+    'mux': 'CommandMux',
+    'cameras': 'Virtual_Cameras',
+    'trainer': 'trainer',
+    'env': 'EnvPackage',
+    'policy': 'PolicyServer',
+    'policy_loop': 'PolicyClient',
+}
+
+
+def import_report(top: int = 5) -> None:
+    """
+    Import every component module in a fresh interpreter under python -X importtime and print its total
+    import time with the direct imports that cost the most.
+    """
+    for kind, module in REPORT_MODULES.items():
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                cwd=os.path.join(ROOT, 'modules'), capture_output=True, text=True)
+        total, children, direct = None, [], []
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            depth = (len(name) - len(name.lstrip()) - 1) // 2
+            if depth == 0:
+                if name.strip() == module:
+                    total, direct = int(cumulative), children
+                children = []
+            elif depth == 1:
+                children.append((int(cumulative), name.strip()))
+        if result.returncode != 0 or total is None:
+            error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'unknown error'
+            print(f"{kind:8s} {module:20s} failed: {error}")
+            continue
+        print(f"{kind:8s} {module:20s} {total / 1e3:8.1f} ms")
+        for cumulative, name in sorted(direct, reverse=True)[:top]:
+            print(f"{'':30s}{cumulative / 1e3:8.1f} ms  {name}")
+
+
+def build_specs(args) -> List[ProcessSpec]:
+    python = sys.executable
+    specs: List[ProcessSpec] = []
+    for i in range(args.pairs):
+        # With --shared_store every set uses db0 and its bridge writes under namespace env{i}
+        db_port = args.port if args.shared_store else args.port + i * args.port_step
+        if i == 0 or not args.shared_store:
+            db_env = {'AUV_DB_URI': f'sqlite:///data_{i}.db'} if i else {}
+            specs.append(ProcessSpec(f'db{i}', 'db', [python, 'modules/DBPackage.py', '--host', args.ip, '--port', str(db_port)],
+                                     health_url=f'http://{args.ip}:{db_port}/health', env=db_env))
+        bridge_deps = ['db0' if args.shared_store else f'db{i}']
+        if args.sim_cmd:
+            unity_port = args.unity_port + i
+            specs.append(ProcessSpec(f'sim{i}', 'sim', shlex.split(args.sim_cmd.format(index=i, unity_port=unity_port)),
+                                     ready_port=unity_port, ready_timeout=120.0))
+            bridge_deps.append(f'sim{i}')
+        if args.start_hardware:
+            metrics_port = args.bridge_metrics_port + i
+            specs.append(ProcessSpec(f'bridge{i}', 'bridge',
+                                     [python, 'modules/HardwareInterface.py', '--unity_port', str(args.unity_port + i),
+                                      '--inputs_url', args.ip, '--inputs_port', str(db_port), '--metrics_port', str(metrics_port)]
+                                     + (['--namespace', f'env{i}'] if args.shared_store else []),
+                                     depends_on=bridge_deps, health_url=f'http://127.0.0.1:{metrics_port}/health'))
+    if args.start_mux:
+        specs.append(ProcessSpec('mux', 'mux', [python, 'modules/CommandMux.py', '--host', args.ip, '--port', str(args.mux_port),
+                                                '--inputs_url', f'http://{args.ip}:{args.port}' + ('/env0' if args.shared_store else '') + '/inputs'],
+                                 depends_on=['db0'], health_url=f'http://{args.ip}:{args.mux_port}/metrics'))
+        print(f"[INFO] Operator commands go through the mux: python controller.py --url http://{args.ip}:{args.mux_port}/inputs/operator")
+    if args.start_cameras:
+        # Virtual_Cameras waits 10 s before serving on port 5001
+        specs.append(ProcessSpec('cameras', 'cameras', [python, 'modules/Virtual_Cameras.py'], ready_port=5001, ready_timeout=60.0))
+    if args.start_ai:
+        specs.append(ProcessSpec('trainer', 'trainer',
+                                 [python, 'modules/trainer.py', '--host', args.ip, '--port', str(args.port),
+                                  '--num_envs', str(args.pairs), '--port_step', str(args.port_step)]
+                                 + (['--shared_store'] if args.shared_store else [])
+                                 # The mux writes the first set's inputs, so the policy has to post to it as well
+                                 + (['--mux_url', f'http://{args.ip}:{args.mux_port}'] if args.start_mux else []),
+                                 depends_on=[s.name for s in specs if s.kind in ('db', 'bridge', 'mux')]))
+
+    if args.start_policy:
+        # The server exports the saved model before it serves, which takes a few seconds with the SB3 import
+        specs.append(ProcessSpec('policy', 'policy',
+                                 [python, 'modules/PolicyServer.py', '--model', args.policy_model, '--host', args.ip,
+                                  '--port', str(args.policy_port)],
+                                 health_url=f'http://{args.ip}:{args.policy_port}/stats', ready_timeout=120.0))
+        inputs_url = (f'http://{args.ip}:{args.mux_port}/inputs/policy' if args.start_mux
+                      else f'http://{args.ip}:{args.port}' + ('/env0' if args.shared_store else '') + '/inputs')
+        specs.append(ProcessSpec('policy_loop', 'policy_loop',
+                                 [python, 'modules/PolicyClient.py',
+                                  '--state_url', f'http://{args.ip}:{args.port}' + ('/env0' if args.shared_store else ''),
+                                  '--act_url', f'http://{args.ip}:{args.policy_port}/act', '--inputs_url', inputs_url,
+                                  '--rate', str(args.policy_rate)],
+                                 depends_on=['db0', 'policy'] + (['mux'] if args.start_mux else [])))
+
+    # Per kind CPU affinity and priority, e.g. --affinity bridge=2 --realtime bridge=50 --nice trainer=10
+    for option, attr, parse in (('affinity', 'cpus', parse_cpus), ('nice', 'nice', int), ('realtime', 'realtime', int)):
+        for item in getattr(args, option) or []:
+            kind, value = item.split('=', 1)
+            for spec in specs:
+                if spec.kind == kind:
+                    setattr(spec, attr, parse(value))
+    return specs
+
 
 def main():
     parser = argparse.ArgumentParser(description="Run the Unity game and Flask server.")
     parser.add_argument('--ip', type=str, default='127.0.0.1', help='IP address to bind to (default: 127.0.0.1)')
     parser.add_argument('--port', type=int, default=5000, help='Port to bind to (default: 5000)')
     parser.add_argument('--start_hardware', action='store_true', help='Flag to start the hardware interface')
-    parser.add_argument('--start_ai', action='store_true', help='Flag to start the AI package')
+    parser.add_argument('--start_ai', action='store_true', help='Flag to start PPO training (modules/trainer.py)')
+    parser.add_argument('--start_mux', action='store_true', help='Flag to start the command multiplexer (sources post to it instead of the DBPackage)')
+    parser.add_argument('--mux_port', type=int, default=5002, help='Port for the command multiplexer (default: 5002)')
+    parser.add_argument('--start_policy', action='store_true', help='Flag to drive the first set with a trained policy (modules/PolicyServer.py and modules/PolicyClient.py)')
+    parser.add_argument('--policy_model', type=str, default='auv_ppo_model', help='Saved PPO model for --start_policy (default: auv_ppo_model)')
+    parser.add_argument('--policy_port', type=int, default=5003, help='Port for the policy server (default: 5003)')
+    parser.add_argument('--policy_rate', type=float, default=10.0, help='Control rate of the policy loop in Hz (default: 10)')
+    parser.add_argument('--start_cameras', action='store_true', help='Flag to start the virtual camera streams')
+    parser.add_argument('--pairs', type=int, default=1, help='Simulator/DBPackage/bridge sets for parallel training (default: 1)')
+    parser.add_argument('--port_step', type=int, default=100, help='DBPackage port offset between sets (default: 100)')
+    parser.add_argument('--shared_store', action='store_true', help='Run one DBPackage for all sets, set i under namespace env{i}, instead of one per set')
+    parser.add_argument('--unity_port', type=int, default=9999, help='Unity RPC port of the first simulator, one more per set (default: 9999)')
+    parser.add_argument('--bridge_metrics_port', type=int, default=9101, help='Metrics port of the first bridge, one more per set (default: 9101)')
+    parser.add_argument('--sim_cmd', type=str, default=None, help='Command starting one simulator, {index} and {unity_port} are substituted, e.g. "python benchmarks/fake_unity.py --port {unity_port}" for the stand-in (default: simulators are started by hand)')
+    parser.add_argument('--affinity', action='append', metavar='KIND=CPUS', help='Pin a kind of process (db, sim, bridge, mux, cameras, trainer, policy, policy_loop) to CPUs, e.g. bridge=2-3')
+    parser.add_argument('--nice', action='append', metavar='KIND=N', help='Nice value for a kind of process, e.g. trainer=10')
+    parser.add_argument('--realtime', action='append', metavar='KIND=PRIO', help='SCHED_FIFO priority for a kind of process, e.g. bridge=50')
+    parser.add_argument('--max_backoff', type=float, default=30.0, help='Longest wait before restarting a crashed process (default: 30 s)')
+    parser.add_argument('--import_report', action='store_true', help='Print the import time of every component and exit')
     args = parser.parse_args()
 
-    subprocesses = [
-        ['python', 'modules/DBPackage.py', '--host', args.ip, '--port', str(args.port)],
-        ['python', 'modules/AIPackage.py', '--host', args.ip, '--port', str(args.port)],
-        ['python', 'modules/HardwareInterface.py'],
-        ['python', 'modules/Virtual_Cameras.py']
-    ]
-
-    if args.start_hardware:
-        subprocess.Popen(subprocesses[2])
-    if args.start_ai:
-        subprocess.Popen(subprocesses[1])
+    if args.start_policy and args.start_ai:
+        # Both would send the first set's 'policy' commands
+        parser.error('--start_policy and --start_ai both drive the first set, start one of them')
 
-    subprocess.Popen(subprocesses[0])
-    # subprocess.Popen(subprocesses[3])
+    if args.import_report:
+        import_report()
+        return
 
-    while True:
-        time.sleep(1)
+    supervisor = Supervisor(build_specs(args), max_backoff=args.max_backoff)
+    # Stop the children on SIGTERM as well as Ctrl+C
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        supervisor.start()
+        supervisor.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("[INFO] Stopping processes...")
+        supervisor.stop()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
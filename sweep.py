@@ -0,0 +1,273 @@
+import argparse
+import csv
+import itertools
+import json
+import logging
+import math
+import multiprocessing
+import os
+import random
+import shlex
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modules'))
+from start import ROOT, ProcessSpec, Supervisor
+
+# Hyperparameter sweep: every trial trains its own PPO model against its own DBPackage/simulator/bridge set,
+# trials run in a process pool sized to the cores, and trials that fall below the median of the others at
+# a rung are stopped early. The search space is a JSON file, see configs/sweep.json:
+#
+#   {"timesteps": 20000, "rungs": 4,
+#    "params": {"learning_rate": {"log_uniform": [1e-5, 1e-3]}, "n_steps": [512, 1024],
+#               "reward.rotation": {"uniform": [0.0, 0.3]}}}
+#
+# A list is a set of choices, {"uniform": [a, b]}, {"log_uniform": [a, b]} and {"int": [a, b]} are ranges.
+# Parameters named reward.<term> are AUVEnv reward weights, all others are PPO arguments.
+#
+# Trials are ranked by a score that does not depend on the tuned weights: the mean return of deterministic
+# evaluation episodes under Scoring's default REWARD_WEIGHTS. The training reward is reported alongside.
+
+RESULT_FIELDS = ['trial', 'status', 'score', 'train_reward', 'timesteps', 'seconds', 'params', 'error']
+
+# Per worker: its slot (ports are offset by it, so concurrent trials never share a backend) and the
+# shared rung scores for early stopping, set by init_worker
+_slot = None
+_rung_scores = None
+_rung_lock = None
+
+
+def sample_params(space: Dict[str, Any], rng: random.Random) -> Dict[str, Any]:
+    params = {}
+    for name, spec in space.items():
+        if isinstance(spec, list):
+            params[name] = rng.choice(spec)
+        elif 'uniform' in spec:
+            params[name] = rng.uniform(*spec['uniform'])
+        elif 'log_uniform' in spec:
+            low, high = spec['log_uniform']
+            params[name] = math.exp(rng.uniform(math.log(low), math.log(high)))
+        elif 'int' in spec:
+            params[name] = rng.randint(*spec['int'])
+        else:
+            raise ValueError(f"Unknown search space entry for {name}: {spec}")
+    return params
+
+
+def build_trials(space: Dict[str, Any], trials: int, grid: bool, seed: int) -> List[Dict[str, Any]]:
+    """Every combination of the choices with grid, otherwise trials random samples."""
+    if grid:
+        ranges = [name for name, spec in space.items() if not isinstance(spec, list)]
+        if ranges:
+            raise ValueError(f"--grid needs lists of choices, {ranges} are ranges")
+        names = list(space)
+        return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+    rng = random.Random(seed)
+    return [sample_params(space, rng) for _ in range(trials)]
+
+
+def init_worker(slots, rung_scores, rung_lock) -> None:
+    global _slot, _rung_scores, _rung_lock
+    _slot = slots.get()
+    _rung_scores = rung_scores
+    _rung_lock = rung_lock
+
+
+def should_stop(rung: int, score: float, min_trials: int) -> bool:
+    """Median stopping rule: record the score and stop when it is below the median of the trials at this rung."""
+    with _rung_lock:
+        scores = list(_rung_scores.get(rung, []))
+        _rung_scores[rung] = scores + [score]
+    if len(scores) < min_trials:
+        return False
+    scores.sort()
+    middle = len(scores) // 2
+    median = scores[middle] if len(scores) % 2 else (scores[middle - 1] + scores[middle]) / 2
+    return score < median
+
+
+def backend_specs(slot: int, options: Dict[str, Any], db_uri: str) -> List[ProcessSpec]:
+    """DBPackage, simulator and bridge of one worker slot, like one set of start.py --pairs."""
+    python = sys.executable
+    db_port = options['port'] + slot * options['port_step']
+    unity_port = options['unity_port'] + slot
+    metrics_port = options['bridge_metrics_port'] + slot
+    sim_cmd = shlex.split(options['sim_cmd'].format(index=slot, unity_port=unity_port))
+    return [
+        ProcessSpec(f'db{slot}', 'db', [python, 'modules/DBPackage.py', '--host', '127.0.0.1', '--port', str(db_port)],
+                    health_url=f'http://127.0.0.1:{db_port}/health', env={'AUV_DB_URI': db_uri}),
+        ProcessSpec(f'sim{slot}', 'sim', sim_cmd, ready_port=unity_port, ready_timeout=120.0),
+        ProcessSpec(f'bridge{slot}', 'bridge',
+                    [python, 'modules/HardwareInterface.py', '--unity_port', str(unity_port), '--inputs_url', '127.0.0.1',
+                     '--inputs_port', str(db_port), '--metrics_port', str(metrics_port), '--log_rate', '0'],
+                    depends_on=[f'db{slot}', f'sim{slot}'], health_url=f'http://127.0.0.1:{metrics_port}/health'),
+    ]
+
+
+def tracking_score(model, env, env_kwargs: Dict[str, Any], episodes: int) -> float:
+    """
+    @brief Mean return of deterministic episodes under the default REWARD_WEIGHTS, so trials that tune the
+           reward weights are still compared on the same scale.
+    @param env: The trial's (possibly VecNormalize wrapped) training env, for its observation statistics.
+    @param env_kwargs: AUVEnv arguments of the trial's backend.
+    """
+    from stable_baselines3.common.vec_env import VecNormalize
+    from EnvPackage import AUVEnv
+    from Scoring import score_trajectory
+
+    eval_env = AUVEnv(**{**env_kwargs, 'reward_weights': None})
+    returns = []
+    for _ in range(episodes):
+        obs, _ = eval_env.reset()
+        states, done = [], False
+        while not done:
+            policy_obs = env.normalize_obs(obs) if isinstance(env, VecNormalize) else obs
+            action, _ = model.predict(policy_obs, deterministic=True)
+            obs, _, terminated, truncated, _ = eval_env.step(action)
+            states.append(obs[:9])
+            done = terminated or truncated
+        returns.append(float(score_trajectory(states, eval_env.expert_path)['reward'].sum()))
+    # The evaluation moved the vehicle, the next learn() starts a fresh training episode
+    model._last_obs = None
+    return sum(returns) / len(returns)
+
+
+def run_trial(trial: int, params: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    """Train one configuration on this worker's backend, scoring it with tracking_score at every rung."""
+    result = {'trial': trial, 'status': 'failed', 'score': float('nan'), 'train_reward': float('nan'), 'timesteps': 0,
+              'seconds': 0.0, 'params': json.dumps(params), 'error': ''}
+    trial_dir = os.path.abspath(os.path.join(options['output_dir'], f'trial_{trial:03d}'))
+    os.makedirs(trial_dir, exist_ok=True)
+    start = time.monotonic()
+    supervisor = Supervisor(backend_specs(_slot, options, f"sqlite:///{os.path.join(trial_dir, 'data.db')}"))
+    try:
+        supervisor.start()
+        # Heavy imports only in the workers, and one torch thread each so the trials do not oversubscribe the cores
+        import torch
+        from stable_baselines3 import PPO
+        from stable_baselines3.common.monitor import Monitor
+        from stable_baselines3.common.vec_env import DummyVecEnv
+        from EnvPackage import AUVEnv
+        from trainer import env_urls, load_normalization
+
+        torch.set_num_threads(options['threads_per_trial'])
+        os.chdir(trial_dir)
+        reward_weights = {name.split('.', 1)[1]: value for name, value in params.items() if name.startswith('reward.')}
+        ppo_kwargs = {name: value for name, value in params.items() if not name.startswith('reward.')}
+        env_kwargs = dict(env_urls('127.0.0.1', options['port'] + _slot * options['port_step']),
+                          path_library=options['path_library'], reward_weights=reward_weights,
+                          log_level=logging.WARNING, step_log_rate=0)
+        env = load_normalization(DummyVecEnv([lambda: Monitor(AUVEnv(**env_kwargs))]))
+        model = PPO("MlpPolicy", env, verbose=0, seed=options['seed'] + trial, **ppo_kwargs)
+
+        rung_steps = max(1, options['timesteps'] // options['rungs'])
+        result['status'] = 'complete'
+        for rung in range(options['rungs']):
+            model.learn(total_timesteps=rung_steps, reset_num_timesteps=False)
+            rewards = [info['r'] for info in model.ep_info_buffer]
+            result['timesteps'] = model.num_timesteps
+            result['train_reward'] = float(sum(rewards) / len(rewards)) if rewards else float('nan')
+            result['score'] = tracking_score(model, env, env_kwargs, options['eval_episodes'])
+            print(f"[INFO] Trial {trial} rung {rung}: {result['timesteps']} steps, score {result['score']:.2f} "
+                  f"(training reward {result['train_reward']:.2f})")
+            last_rung = rung == options['rungs'] - 1
+            if not last_rung and should_stop(rung, result['score'], options['min_trials']):
+                result['status'] = 'stopped'
+                break
+        model.save(os.path.join(trial_dir, 'model'))
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+        with open(os.path.join(trial_dir, 'error.txt'), 'w') as f:
+            f.write(traceback.format_exc())
+    finally:
+        os.chdir(ROOT)
+        supervisor.stop()
+        result['seconds'] = round(time.monotonic() - start, 1)
+    return result
+
+
+def write_results(path: str, results: List[Dict[str, Any]]) -> None:
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        writer.writerows(sorted(results, key=lambda r: r['trial']))
+
+
+def print_table(results: List[Dict[str, Any]]) -> None:
+    """Results best first, failed and unscored trials last."""
+    ranked = sorted(results, key=lambda r: -r['score'] if r['score'] == r['score'] else float('inf'))
+    print(f"{'trial':>5} {'status':>8} {'score':>10} {'steps':>8} {'seconds':>8}  params")
+    for r in ranked:
+        print(f"{r['trial']:5d} {r['status']:>8} {r['score']:10.2f} {r['timesteps']:8d} {r['seconds']:8.1f}  "
+              f"{r['params'] if r['status'] != 'failed' else r['error']}")
+
+
+def default_workers(processes_per_trial: int) -> int:
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    return max(1, cores // processes_per_trial)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a PPO hyperparameter sweep across a process pool")
+    parser.add_argument('space', type=str, help='Search space JSON file, e.g. configs/sweep.json')
+    parser.add_argument('--sim_cmd', type=str, required=True, help='Command starting one headless simulator, {index} and {unity_port} are substituted, e.g. "python benchmarks/fake_unity.py --port {unity_port}"')
+    parser.add_argument('--path_library', type=str, default=None, help='Expert path library for the envs (default: expert_paths/path_1.json)')
+    parser.add_argument('--trials', type=int, default=16, help='Random configurations to try (default: 16)')
+    parser.add_argument('--grid', action='store_true', help='Try every combination of the choices instead of random samples')
+    parser.add_argument('--workers', type=int, default=None, help='Concurrent trials (default: cores / --processes_per_trial)')
+    parser.add_argument('--processes_per_trial', type=int, default=3, help='Cores one trial keeps busy: trainer, bridge and simulator (default: 3)')
+    parser.add_argument('--threads_per_trial', type=int, default=1, help='Torch threads per trial (default: 1)')
+    parser.add_argument('--timesteps', type=int, default=None, help='Timesteps per trial (default: the space file, else 20000)')
+    parser.add_argument('--rungs', type=int, default=None, help='Early stopping checkpoints per trial (default: the space file, else 4)')
+    parser.add_argument('--eval_episodes', type=int, default=2, help='Evaluation episodes scoring every rung (default: 2)')
+    parser.add_argument('--min_trials', type=int, default=3, help='Trials that must reach a rung before it stops any (default: 3)')
+    parser.add_argument('--port', type=int, default=6000, help='DBPackage port of the first worker (default: 6000)')
+    parser.add_argument('--port_step', type=int, default=10, help='DBPackage port offset between workers (default: 10)')
+    parser.add_argument('--unity_port', type=int, default=10999, help='Unity RPC port of the first worker, one more per worker (default: 10999)')
+    parser.add_argument('--bridge_metrics_port', type=int, default=9201, help='Bridge metrics port of the first worker, one more per worker (default: 9201)')
+    parser.add_argument('--output_dir', type=str, default='sweeps', help='Trial directories and sweep_results.csv (default: sweeps)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for sampling and training (default: 0)')
+    args = parser.parse_args()
+
+    with open(args.space) as f:
+        space = json.load(f)
+    trials = build_trials(space['params'], args.trials, args.grid, args.seed)
+    workers = min(args.workers or default_workers(args.processes_per_trial), len(trials))
+    options = {
+        'sim_cmd': args.sim_cmd, 'path_library': args.path_library, 'threads_per_trial': args.threads_per_trial,
+        'timesteps': args.timesteps or space.get('timesteps', 20000), 'rungs': args.rungs or space.get('rungs', 4),
+        'eval_episodes': args.eval_episodes, 'min_trials': args.min_trials, 'port': args.port, 'port_step': args.port_step, 'unity_port': args.unity_port,
+        'bridge_metrics_port': args.bridge_metrics_port, 'output_dir': os.path.abspath(args.output_dir), 'seed': args.seed,
+    }
+    os.makedirs(options['output_dir'], exist_ok=True)
+    results_csv = os.path.join(options['output_dir'], 'sweep_results.csv')
+    print(f"[INFO] Running {len(trials)} trials on {workers} workers")
+
+    # spawn: the workers import torch themselves instead of inheriting a forked parent
+    context = multiprocessing.get_context('spawn')
+    manager = context.Manager()
+    slots = manager.Queue()
+    for slot in range(workers):
+        slots.put(slot)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker,
+                             initargs=(slots, manager.dict(), manager.Lock())) as pool:
+        futures = [pool.submit(run_trial, trial, params, options) for trial, params in enumerate(trials)]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(f"[INFO] Trial {result['trial']} {result['status']}: score {result['score']:.2f} "
+                  f"after {result['timesteps']} steps ({len(results)}/{len(trials)})")
+            # Rewritten after every trial so an interrupted sweep keeps what finished
+            write_results(results_csv, results)
+    manager.shutdown()
+
+    print_table(results)
+    print(f"[INFO] Results saved to {results_csv}")
+
+
+if __name__ == "__main__":
+    main()
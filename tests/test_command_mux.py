@@ -0,0 +1,41 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'modules'))
+
+from CommandMux import COMMAND_FIELDS, CommandMux
+
+
+def operator_command(value: float, arm: int) -> dict:
+    return dict({k: value for k in COMMAND_FIELDS}, Arm=arm)
+
+
+def test_handover_to_policy_keeps_armed():
+    mux = CommandMux()
+    mux.submit("operator", operator_command(255, 1), timestamp=0.0)
+    command, source = mux.select(now=0.1)
+    assert source == "operator" and command["Arm"] == 1
+
+    # Operator centres the stick, the policy takes over and sends Arm 0 as AUVEnv does
+    mux.submit("operator", operator_command(127.5, 1), timestamp=0.2)
+    mux.submit("policy", dict({k: 0.5 for k in COMMAND_FIELDS}, Arm=0), timestamp=0.2)
+    command, source = mux.select(now=0.25)
+    assert source == "policy"
+    assert command["Arm"] == 1
+    assert command["X"] == 0.5
+
+
+def test_stale_sources_keep_armed():
+    mux = CommandMux()
+    mux.submit("operator", operator_command(255, 1), timestamp=0.0)
+    command, source = mux.select(now=100.0)
+    assert source == "none"
+    assert command["Arm"] == 1
+    assert all(command[k] == 0.0 for k in COMMAND_FIELDS)
+
+
+def test_operator_disarms():
+    mux = CommandMux()
+    mux.submit("operator", operator_command(255, 1), timestamp=0.0)
+    mux.submit("operator", operator_command(127.5, 0), timestamp=0.1)
+    assert mux.select(now=0.2)[0]["Arm"] == 0